@@ -6,6 +6,16 @@ from flask_migrate import Migrate
 
 from config import config
 from models import db
+from utils.pdf_cache import PDFCache
+from utils.pdf_jobs import PDFJobQueue
+from utils.pdf_styles import init_registry
+from utils.response_cache import ResponseCache
+from utils.access import ProjectAccessCache
+from utils.auth import TokenRevocations
+from utils.prerender import PrerenderScheduler
+from signals import project_content_changed
+from commands import register_commands
+from utils.risk import validate_risk_matrix
 
 # Import routes
 from routes.auth import auth_bp
@@ -25,14 +35,65 @@ def create_app(config_name='default'):
 
     # Initialize extensions
     db.init_app(app)
-    CORS(app)
-    JWTManager(app)
+    CORS(app, expose_headers=['X-Total-Count', 'X-Next-Cursor'])
+    jwt = JWTManager(app)
     Migrate(app, db)
 
     # Create upload and pdf directories
     os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
     os.makedirs(app.config['PDF_FOLDER'], exist_ok=True)
 
+    # Fail fast on a malformed risk matrix
+    validate_risk_matrix(app.config['RISK_MATRIX'])
+
+    # PDF fonts and styles, built once per process
+    init_registry(app.config['PDF_FONT_PATH'])
+
+    # PDF render cache
+    app.extensions['pdf_cache'] = PDFCache(
+        os.path.join(app.config['PDF_FOLDER'], 'cache'),
+        app.config['PDF_CACHE_MAX_BYTES']
+    )
+
+    # PDF job queue
+    app.extensions['pdf_jobs'] = PDFJobQueue(
+        os.path.join(app.config['PDF_FOLDER'], 'jobs'),
+        app.extensions['pdf_cache'],
+        max_workers=app.config['PDF_JOB_WORKERS'],
+        timeout=app.config['PDF_JOB_TIMEOUT'],
+        memory_limit=app.config['PDF_JOB_MEMORY_LIMIT'],
+        font_path=app.config['PDF_FONT_PATH'],
+        retention=app.config['PDF_JOB_RETENTION']
+    )
+
+    # Cached catalog responses, shared versions across worker processes
+    app.extensions['response_cache'] = ResponseCache(
+        app.config['RESPONSE_CACHE_FOLDER'],
+        app.config['RESPONSE_CACHE_MAX_ENTRIES']
+    )
+
+    # Accessible project ids per user, invalidated through the same shared versions
+    app.extensions['project_access'] = ProjectAccessCache(
+        app.extensions['response_cache'],
+        app.config['PROJECT_ACCESS_MAX_USERS']
+    )
+
+    # Users whose tokens were revoked, checked on every authenticated request
+    app.extensions['token_revocations'] = TokenRevocations(
+        app.extensions['response_cache'],
+        max(app.config['JWT_ACCESS_TOKEN_EXPIRES'], app.config['JWT_REFRESH_TOKEN_EXPIRES'])
+    )
+
+    @jwt.token_in_blocklist_loader
+    def token_revoked(jwt_header, jwt_payload):
+        return app.extensions['token_revocations'].is_revoked(jwt_payload)
+
+    # Re-render PDFs of active projects in the background after edits
+    if app.config['PDF_PRERENDER_DELAY']:
+        prerender = PrerenderScheduler(app, app.config['PDF_PRERENDER_DELAY'])
+        project_content_changed.connect(prerender.on_project_content_changed, sender=app)
+        app.extensions['pdf_prerender'] = prerender
+
     # Register blueprints
     app.register_blueprint(auth_bp, url_prefix='/api/auth')
     app.register_blueprint(users_bp, url_prefix='/api/users')
@@ -43,6 +104,9 @@ def create_app(config_name='default'):
     app.register_blueprint(unterweisung_bp, url_prefix='/api/unterweisung')
     app.register_blueprint(pdf_bp, url_prefix='/api/pdf')
 
+    # CLI commands
+    register_commands(app)
+
     # Health check endpoint
     @app.route('/api/health')
     def health():
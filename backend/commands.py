@@ -0,0 +1,43 @@
+import click
+from utils.risk import reclassify_all, RECLASSIFY_BATCH_SIZE
+from utils.risk_summary import rebuild_risk_summaries, REBUILD_BATCH_SIZE
+from utils.search import rebuild_search_index
+from utils.sync import prune_changes
+
+
+def register_commands(app):
+    """Register maintenance commands with the flask CLI"""
+
+    @app.cli.command('reclassify-risk')
+    @click.option('--batch-size', default=RECLASSIFY_BATCH_SIZE, show_default=True, help='Rows updated per transaction')
+    def reclassify_risk(batch_size):
+        """Recompute every stored risikobewertung with the configured RISK_MATRIX"""
+        for progress in reclassify_all(batch_size):
+            if progress.get('done'):
+                break
+            click.echo(
+                f"{progress['processed']}/{progress['total']} rows, {progress['changed']} changed, "
+                f"{progress['rows_per_second'] or '-'} rows/s"
+            )
+        rebuild_risk_summaries()
+        click.echo(f"Done in {progress['elapsed']}s, {progress['overrides_changed']} project overrides changed")
+
+    @app.cli.command('rebuild-search-index')
+    def rebuild_search_index_command():
+        """Create or rebuild the full-text index used by /api/gbu/search"""
+        backend = rebuild_search_index()
+        click.echo(f'Search index rebuilt ({backend})')
+
+    @app.cli.command('rebuild-risk-summary')
+    @click.option('--batch-size', default=REBUILD_BATCH_SIZE, show_default=True, help='Projects refreshed per transaction')
+    def rebuild_risk_summary(batch_size):
+        """Recompute the project risk summaries read by the dashboards"""
+        processed = rebuild_risk_summaries(batch_size)
+        click.echo(f'Risk summaries of {processed} projects rebuilt')
+
+    @app.cli.command('prune-sync-changes')
+    @click.option('--days', type=int, help='Keep changes of this many days, SYNC_CHANGES_RETENTION_DAYS if unset')
+    def prune_sync_changes(days):
+        """Delete old entries of the change log behind ?since= on the project GBUs"""
+        deleted = prune_changes(days if days is not None else app.config['SYNC_CHANGES_RETENTION_DAYS'])
+        click.echo(f'{deleted} changes pruned')
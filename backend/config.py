@@ -1,3 +1,4 @@
+import json
 import os
 from dotenv import load_dotenv
 from datetime import timedelta
@@ -25,6 +26,28 @@ class Config:
 
     # PDF Configuration
     PDF_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'pdfs')
+    PDF_CACHE_MAX_BYTES = int(os.environ.get('PDF_CACHE_MAX_BYTES', 512 * 1024 * 1024))  # 512MB render cache
+    PDF_SPOOL_MAX_BYTES = int(os.environ.get('PDF_SPOOL_MAX_BYTES', 8 * 1024 * 1024))  # renders above 8MB spill to disk
+    PDF_PARALLEL_MIN_ROWS = int(os.environ.get('PDF_PARALLEL_MIN_ROWS', 1000))  # render GBU Bereiche in parallel from here on
+    PDF_FONT_PATH = os.environ.get('PDF_FONT_PATH')  # Unicode TTF font, DejaVu Sans is looked up if unset
+
+    # PDF job queue
+    PDF_JOB_WORKERS = int(os.environ.get('PDF_JOB_WORKERS', 2))
+    PDF_JOB_TIMEOUT = int(os.environ.get('PDF_JOB_TIMEOUT', 300))  # seconds per job
+    PDF_JOB_MEMORY_LIMIT = int(os.environ.get('PDF_JOB_MEMORY_LIMIT', 1024 * 1024 * 1024))  # 1GB per worker, 0 disables
+    PDF_JOB_RETENTION = int(os.environ.get('PDF_JOB_RETENTION', 24 * 60 * 60))  # keep job records for a day
+    PDF_PRERENDER_DELAY = int(os.environ.get('PDF_PRERENDER_DELAY', 30))  # seconds without edits before active projects re-render, 0 disables
+
+    # Risk matrix: [upper bound of schadenschwere x wahrscheinlichkeit, rating], last entry open-ended
+    RISK_MATRIX = json.loads(os.environ.get('RISK_MATRIX', '[[2, "niedrig"], [4, "mittel"], [null, "hoch"]]'))
+
+    # Response cache for rarely changing catalog data
+    RESPONSE_CACHE_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache')
+    RESPONSE_CACHE_MAX_ENTRIES = int(os.environ.get('RESPONSE_CACHE_MAX_ENTRIES', 256))  # cached responses per process
+    PROJECT_ACCESS_MAX_USERS = int(os.environ.get('PROJECT_ACCESS_MAX_USERS', 1024))  # cached access sets per process
+
+    # Delta sync of the GBU editor
+    SYNC_CHANGES_RETENTION_DAYS = int(os.environ.get('SYNC_CHANGES_RETENTION_DAYS', 30))  # older watermarks get a full reload
 
 class DevelopmentConfig(Config):
     """Development configuration"""
@@ -40,6 +63,7 @@ class TestingConfig(Config):
     """Testing configuration"""
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    PDF_PRERENDER_DELAY = 0
 
 config = {
     'development': DevelopmentConfig,
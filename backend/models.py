@@ -1,5 +1,6 @@
 from datetime import datetime
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event, insert
 from werkzeug.security import generate_password_hash, check_password_hash
 
 db = SQLAlchemy()
@@ -61,6 +62,13 @@ class Project(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    __table_args__ = (
+        db.Index('idx_status', 'status'),
+        db.Index('idx_season', 'season'),
+        db.Index('idx_dates', 'start_date', 'end_date'),
+        db.Index('idx_name', 'name'),
+    )
+
     # Relationships
     creator = db.relationship('User', back_populates='created_projects', foreign_keys=[created_by])
     assignments = db.relationship('ProjectAssignment', back_populates='project', cascade='all, delete-orphan')
@@ -69,6 +77,7 @@ class Project(db.Model):
     gefaehrdungen = db.relationship('Gefaehrdung', back_populates='project', cascade='all, delete-orphan')
     participants = db.relationship('Participant', back_populates='project', cascade='all, delete-orphan')
     unterweisungen = db.relationship('Unterweisung', back_populates='project', cascade='all, delete-orphan')
+    risk_summary = db.relationship('ProjectRiskSummary', back_populates='project', cascade='all, delete-orphan')
 
     def to_dict(self):
         return {
@@ -167,14 +176,17 @@ class GBUTemplate(db.Model):
     season = db.Column(db.Enum('fruehling', 'sommer', 'herbst', 'winter', 'alle', name='template_season'), default='alle')
     indoor_outdoor = db.Column(db.Enum('indoor', 'outdoor', 'both', 'alle', name='template_indoor_outdoor'), default='alle')
     is_global = db.Column(db.Boolean, default=True)
+    version = db.Column(db.Integer, nullable=False, default=1)  # bumped whenever its gefaehrdungen change
     created_by = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     # Relationships
     creator = db.relationship('User')
-    gefaehrdungen = db.relationship('Gefaehrdung', back_populates='gbu_template', cascade='all, delete-orphan')
+    gefaehrdungen = db.relationship('Gefaehrdung', back_populates='gbu_template', cascade='all, delete-orphan',
+                                    order_by='(Gefaehrdung.sort_order, Gefaehrdung.id)')
     project_gbus = db.relationship('ProjectGBU', back_populates='gbu_template', cascade='all, delete-orphan')
+    snapshots = db.relationship('GBUTemplateSnapshot', back_populates='gbu_template', cascade='all, delete-orphan')
 
     def to_dict(self):
         return {
@@ -184,6 +196,7 @@ class GBUTemplate(db.Model):
             'season': self.season,
             'indoor_outdoor': self.indoor_outdoor,
             'is_global': self.is_global,
+            'version': self.version,
             'created_by': self.created_by,
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None,
@@ -217,10 +230,16 @@ class Gefaehrdung(db.Model):
     sonstige_bemerkungen = db.Column(db.Text)
     gesetzliche_regelungen = db.Column(db.Text)
     mängel_behoben = db.Column(db.Boolean, default=False)
-    sort_order = db.Column(db.Integer, default=0)
+    sort_order = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    # Keys of the paged gefaehrdung listings
+    __table_args__ = (
+        db.Index('idx_template_listing', 'gbu_template_id', 'bereich_id', 'sort_order', 'id'),
+        db.Index('idx_project_listing', 'project_id', 'bereich_id', 'sort_order', 'id'),
+    )
+
     # Relationships
     gbu_template = db.relationship('GBUTemplate', back_populates='gefaehrdungen')
     project = db.relationship('Project', back_populates='gefaehrdungen')
@@ -266,11 +285,14 @@ class ProjectGBU(db.Model):
     gbu_template_id = db.Column(db.Integer, db.ForeignKey('gbu_templates.id'), nullable=False)
     added_by = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     added_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Template version the project sees, NULL for links from before overlays
+    template_version = db.Column(db.Integer)
 
     # Relationships
     project = db.relationship('Project', back_populates='gbus')
     gbu_template = db.relationship('GBUTemplate', back_populates='project_gbus')
     adder = db.relationship('User')
+    overrides = db.relationship('ProjectGBUOverride', back_populates='project_gbu', cascade='all, delete-orphan')
 
     def to_dict(self):
         return {
@@ -279,6 +301,103 @@ class ProjectGBU(db.Model):
             'gbu_template_id': self.gbu_template_id,
             'added_by': self.added_by,
             'added_at': self.added_at.isoformat() if self.added_at else None,
+            'template_version': self.template_version,
+        }
+
+class GBUTemplateSnapshot(db.Model):
+    __tablename__ = 'gbu_template_snapshots'
+
+    id = db.Column(db.Integer, primary_key=True)
+    gbu_template_id = db.Column(db.Integer, db.ForeignKey('gbu_templates.id'), nullable=False)
+    version = db.Column(db.Integer, nullable=False)
+    gefaehrdungen = db.Column(db.JSON, nullable=False)  # the template's rows at this version, as Gefaehrdung.to_dict
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (db.UniqueConstraint('gbu_template_id', 'version', name='unique_template_version'),)
+
+    # Relationships
+    gbu_template = db.relationship('GBUTemplate', back_populates='snapshots')
+
+class ProjectGBUOverride(db.Model):
+    __tablename__ = 'project_gbu_overrides'
+
+    id = db.Column(db.Integer, primary_key=True)
+    project_gbu_id = db.Column(db.Integer, db.ForeignKey('project_gbus.id'), nullable=False)
+    # A row of the pinned template version, which may since have been deleted from the template
+    gefaehrdung_id = db.Column(db.Integer, nullable=False, index=True)
+    overrides = db.Column(db.JSON)  # only the fields that differ from the template row
+    removed = db.Column(db.Boolean, default=False)
+    updated_by = db.Column(db.Integer, db.ForeignKey('users.id'))
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (db.UniqueConstraint('project_gbu_id', 'gefaehrdung_id', name='unique_override'),)
+
+    # Relationships
+    project_gbu = db.relationship('ProjectGBU', back_populates='overrides')
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'project_gbu_id': self.project_gbu_id,
+            'gefaehrdung_id': self.gefaehrdung_id,
+            'overrides': self.overrides or {},
+            'removed': self.removed,
+            'updated_by': self.updated_by,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
+        }
+
+class GefaehrdungChange(db.Model):
+    __tablename__ = 'gefaehrdung_changes'
+
+    id = db.Column(db.BigInteger().with_variant(db.Integer, 'sqlite'), primary_key=True)
+    seq = db.Column(db.BigInteger, nullable=False)  # sync watermark, ascends in commit order
+    gefaehrdung_id = db.Column(db.Integer)  # NULL asks every client for a full reload
+    project_id = db.Column(db.Integer, db.ForeignKey('projects.id', ondelete='CASCADE'))  # project row or project override
+    gbu_template_id = db.Column(db.Integer)  # template row, seen by projects overlaying the template
+    deleted = db.Column(db.Boolean, default=False)
+    changed_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('idx_project_seq', 'project_id', 'seq'),
+        db.Index('idx_template_seq', 'gbu_template_id', 'seq'),
+        db.Index('idx_seq', 'seq'),
+    )
+
+class SyncSequence(db.Model):
+    __tablename__ = 'sync_sequence'
+
+    id = db.Column(db.Integer, primary_key=True)
+    value = db.Column(db.BigInteger, nullable=False, default=0)  # last watermark handed out
+    pruned_seq = db.Column(db.BigInteger, nullable=False, default=0)  # changes up to here were deleted
+
+@event.listens_for(SyncSequence.__table__, 'after_create')
+def _seed_sync_sequence(table, connection, **kw):
+    """Insert the single row with the table, as schema.sql does, so writers only ever update it"""
+    connection.execute(insert(table).values(id=1, value=0, pruned_seq=0))
+
+class ProjectRiskSummary(db.Model):
+    __tablename__ = 'project_risk_summary'
+
+    id = db.Column(db.Integer, primary_key=True)
+    project_id = db.Column(db.Integer, db.ForeignKey('projects.id'), nullable=False)
+    bereich_id = db.Column(db.Integer, db.ForeignKey('bereiche.id'))
+    risikobewertung = db.Column(db.String(50))
+    gefaehrdungen_count = db.Column(db.Integer, nullable=False, default=0)
+    offene_maengel_count = db.Column(db.Integer, nullable=False, default=0)  # rows without mängel_behoben
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    # Relationships
+    project = db.relationship('Project', back_populates='risk_summary')
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'project_id': self.project_id,
+            'bereich_id': self.bereich_id,
+            'risikobewertung': self.risikobewertung,
+            'gefaehrdungen_count': self.gefaehrdungen_count,
+            'offene_maengel_count': self.offene_maengel_count,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
         }
 
 class Participant(db.Model):
@@ -1,6 +1,7 @@
 from flask import Blueprint, request, jsonify
-from flask_jwt_extended import create_access_token, create_refresh_token, jwt_required, get_jwt_identity
+from flask_jwt_extended import create_access_token, create_refresh_token, jwt_required
 from models import db, User, AuditLog
+from utils.auth import current_user, token_claims
 from datetime import datetime
 
 auth_bp = Blueprint('auth', __name__)
@@ -22,8 +23,9 @@ def login():
         return jsonify({'error': 'Account is deactivated'}), 403
 
     # Create tokens
-    access_token = create_access_token(identity=user.id)
-    refresh_token = create_refresh_token(identity=user.id)
+    claims = token_claims(user)
+    access_token = create_access_token(identity=user.id, additional_claims=claims)
+    refresh_token = create_refresh_token(identity=user.id, additional_claims=claims)
 
     # Log the login
     log = AuditLog(
@@ -46,16 +48,22 @@ def login():
 @jwt_required(refresh=True)
 def refresh():
     """Refresh access token"""
-    current_user_id = get_jwt_identity()
-    access_token = create_access_token(identity=current_user_id)
+    user = current_user()
+    if not user:
+        return jsonify({'error': 'User not found'}), 404
+
+    if not user.active:
+        return jsonify({'error': 'Account is deactivated'}), 403
+
+    # Claims come from the row, so a changed role shows in the new token
+    access_token = create_access_token(identity=user.id, additional_claims=token_claims(user))
     return jsonify({'access_token': access_token}), 200
 
 @auth_bp.route('/me', methods=['GET'])
 @jwt_required()
 def get_current_user():
     """Get current user information"""
-    current_user_id = get_jwt_identity()
-    user = User.query.get(current_user_id)
+    user = current_user()
 
     if not user:
         return jsonify({'error': 'User not found'}), 404
@@ -66,8 +74,7 @@ def get_current_user():
 @jwt_required()
 def change_password():
     """Change password"""
-    current_user_id = get_jwt_identity()
-    user = User.query.get(current_user_id)
+    user = current_user()
 
     if not user:
         return jsonify({'error': 'User not found'}), 404
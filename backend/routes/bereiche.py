@@ -1,11 +1,15 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from models import db, Bereich, BereichAssignment, User, Project, AuditLog
+from utils.auth import current_role
+from utils.access import invalidate_project_access, project_access_denied, project_access_required
+from utils.response_cache import cached_response, invalidate_cached_responses
 
 bereiche_bp = Blueprint('bereiche', __name__)
 
 @bereiche_bp.route('/', methods=['GET'])
 @jwt_required()
+@cached_response('bereiche')
 def get_bereiche():
     """Get all bereiche"""
     bereiche = Bereich.query.order_by(Bereich.sort_order).all()
@@ -25,9 +29,9 @@ def get_bereich(bereich_id):
 def create_bereich():
     """Create a new bereich (admin only)"""
     current_user_id = get_jwt_identity()
-    user = User.query.get(current_user_id)
+    role = current_role()
 
-    if user.role != 'admin':
+    if role != 'admin':
         return jsonify({'error': 'Admin access required'}), 403
 
     data = request.get_json()
@@ -54,6 +58,7 @@ def create_bereich():
     )
     db.session.add(log)
     db.session.commit()
+    invalidate_cached_responses('bereiche')
 
     return jsonify(bereich.to_dict()), 201
 
@@ -62,12 +67,16 @@ def create_bereich():
 def assign_bereich_to_bereichsleiter(project_id):
     """Assign a bereich to a bereichsleiter for a project"""
     current_user_id = get_jwt_identity()
-    user = User.query.get(current_user_id)
+    role = current_role()
 
     # Only admin, projektleiter, and technischer_leiter can assign
-    if user.role not in ['admin', 'projektleiter', 'technischer_leiter']:
+    if role not in ['admin', 'projektleiter', 'technischer_leiter']:
         return jsonify({'error': 'Insufficient permissions'}), 403
 
+    denied = project_access_denied(project_id)
+    if denied:
+        return denied
+
     project = Project.query.get(project_id)
     if not project:
         return jsonify({'error': 'Project not found'}), 404
@@ -92,9 +101,11 @@ def assign_bereich_to_bereichsleiter(project_id):
 
     if existing:
         # Update existing assignment
+        previous_bereichsleiter_id = existing.bereichsleiter_id
         existing.bereichsleiter_id = data['bereichsleiter_id']
         existing.assigned_by = current_user_id
         db.session.commit()
+        invalidate_project_access(previous_bereichsleiter_id, existing.bereichsleiter_id)
         return jsonify(existing.to_dict()), 200
 
     assignment = BereichAssignment(
@@ -106,6 +117,7 @@ def assign_bereich_to_bereichsleiter(project_id):
 
     db.session.add(assignment)
     db.session.commit()
+    invalidate_project_access(assignment.bereichsleiter_id)
 
     # Log the assignment
     log = AuditLog(
@@ -122,7 +134,7 @@ def assign_bereich_to_bereichsleiter(project_id):
     return jsonify(assignment.to_dict()), 201
 
 @bereiche_bp.route('/project/<int:project_id>/assignments', methods=['GET'])
-@jwt_required()
+@project_access_required
 def get_project_bereich_assignments(project_id):
     """Get all bereich assignments for a project"""
     project = Project.query.get(project_id)
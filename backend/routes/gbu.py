@@ -1,14 +1,48 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from models import db, GBUTemplate, Gefaehrdung, ProjectGBU, Project, User, AuditLog
+from sqlalchemy import case, func, select, update, delete
+from models import db, GBUTemplate, Gefaehrdung, ProjectGBU, ProjectGBUOverride, Project, AuditLog
+from routes.users import admin_required
+from signals import notify_project_content_changed
+from utils.access import accessible_project_ids, project_access_denied, project_access_required, template_write_denied
+from utils.gbu_data import (
+    load_project_gbus, load_project_gbu_changes, load_gefaehrdungen_page, load_snapshot_rows, copy_template_gefaehrdungen,
+    lock_projects_for_insert, merged_gefaehrdung_dict, overlaid_gefaehrdung_ids, save_override, snapshot_template,
+    template_gefaehrdungen_changed, reorder_sort_orders, LISTABLE_COLUMNS, LIST_PAGE_SIZE, LIST_MAX_PAGE_SIZE
+)
+from utils.risk import calculate_risikobewertung, reclassify_all, risk_matrix, RECLASSIFY_BATCH_SIZE
+from utils.response_cache import cached_response, invalidate_cached_responses
+from utils.risk_summary import RiskSummaryDelta, refresh_risk_summaries, rebuild_risk_summaries
+from utils.search import search_gefaehrdungen, search_terms
+from utils.sync import (
+    current_sync_seq, needs_full_resync, record_gefaehrdung_changes, record_project_changes,
+    record_template_added
+)
 from datetime import datetime
+import json
 
 gbu_bp = Blueprint('gbu', __name__)
 
+# Columns the template catalog can be sorted by
+TEMPLATE_SORT_KEYS = ('id', 'name', 'season', 'created_at', 'updated_at', 'gefaehrdungen_count')
+
+# Fields of a gefaehrdung that batch operations may set
+GEFAEHRDUNG_FIELDS = (
+    'bereich_id', 'tätigkeit', 'gefährdung', 'gefährdungsfaktoren', 'belastungsfaktoren',
+    'schadenschwere', 'wahrscheinlichkeit', 's_substitution', 't_technisch',
+    'o_organisatorisch', 'p_persoenlich', 'massnahmen', 's_massnahmen', 't_massnahmen',
+    'o_massnahmen', 'p_massnahmen', 'überprüfung_wirksamkeit', 'überprüfung_meldung',
+    'sonstige_bemerkungen', 'gesetzliche_regelungen', 'mängel_behoben', 'sort_order'
+)
+
+# Values of the search scope parameter
+SEARCH_SCOPES = ('all', 'templates', 'projects')
+
 @gbu_bp.route('/templates', methods=['GET'])
 @jwt_required()
+@cached_response('templates')
 def get_templates():
-    """Get all GBU templates"""
+    """Get GBU templates with gefaehrdungen counts, optionally filtered by name, sorted and paginated"""
     season = request.args.get('season')
     indoor_outdoor = request.args.get('indoor_outdoor')
 
@@ -20,15 +54,48 @@ def get_templates():
     if indoor_outdoor:
         query = query.filter((GBUTemplate.indoor_outdoor == indoor_outdoor) | (GBUTemplate.indoor_outdoor == 'alle'))
 
-    templates = query.all()
+    name = request.args.get('name')
+    if name:
+        query = query.filter(GBUTemplate.name.icontains(name, autoescape=True))
+
+    sort = request.args.get('sort', 'id')
+    if sort.lstrip('-') not in TEMPLATE_SORT_KEYS:
+        return jsonify({'error': f'Sort must be one of {", ".join(TEMPLATE_SORT_KEYS)}, prefix - for descending'}), 400
+
+    try:
+        page = int(request.args['page']) if 'page' in request.args else None
+        per_page = min(int(request.args.get('per_page', 50)), 200)
+    except ValueError:
+        return jsonify({'error': 'Page and per_page must be integers'}), 400
+    if (page is not None and page < 1) or per_page < 1:
+        return jsonify({'error': 'Page and per_page must be positive'}), 400
+
+    headers = {}
+    if page is not None:
+        headers['X-Total-Count'] = str(query.order_by(None).count())
+
+    # Count gefaehrdungen per template in one grouped subquery
+    counts = db.session.query(
+        Gefaehrdung.gbu_template_id.label('template_id'),
+        func.count(Gefaehrdung.id).label('gefaehrdungen_count')
+    ).filter(Gefaehrdung.gbu_template_id.isnot(None)).group_by(Gefaehrdung.gbu_template_id).subquery()
+    gefaehrdungen_count = func.coalesce(counts.c.gefaehrdungen_count, 0)
+
+    sort_column = gefaehrdungen_count if sort.lstrip('-') == 'gefaehrdungen_count' else getattr(GBUTemplate, sort.lstrip('-'))
+    query = query.add_columns(gefaehrdungen_count) \
+        .outerjoin(counts, counts.c.template_id == GBUTemplate.id) \
+        .order_by(sort_column.desc() if sort.startswith('-') else sort_column, GBUTemplate.id)
+
+    if page is not None:
+        query = query.limit(per_page).offset((page - 1) * per_page)
+
     result = []
-    for template in templates:
+    for template, count in query:
         template_dict = template.to_dict()
-        # Include gefaehrdungen count
-        template_dict['gefaehrdungen_count'] = len(template.gefaehrdungen)
+        template_dict['gefaehrdungen_count'] = count
         result.append(template_dict)
 
-    return jsonify(result), 200
+    return jsonify(result), 200, headers
 
 @gbu_bp.route('/templates/<int:template_id>', methods=['GET'])
 @jwt_required()
@@ -43,6 +110,69 @@ def get_template(template_id):
 
     return jsonify(template_dict), 200
 
+@gbu_bp.route('/templates/<int:template_id>/gefaehrdungen', methods=['GET'])
+@jwt_required()
+def get_template_gefaehrdungen(template_id):
+    """List a template's gefaehrdungen page by page, ?fields= selects the columns"""
+    if not db.session.query(GBUTemplate.id).filter(GBUTemplate.id == template_id).first():
+        return jsonify({'error': 'Template not found'}), 404
+
+    fields, limit, after, error = _listing_args()
+    if error:
+        return error
+
+    page, next_key = load_gefaehrdungen_page(fields, limit, after, template_id=template_id)
+    return jsonify(page), 200, _listing_headers(next_key)
+
+@gbu_bp.route('/search', methods=['GET'])
+@jwt_required()
+def search():
+    """Search gefaehrdungen of templates and projects by keywords, best matches first"""
+    terms = search_terms(request.args.get('q'))
+    if not terms:
+        return jsonify({'error': 'Query q must contain at least one word'}), 400
+
+    scope = request.args.get('scope', 'all')
+    if scope not in SEARCH_SCOPES:
+        return jsonify({'error': f'Scope must be one of {", ".join(SEARCH_SCOPES)}'}), 400
+
+    try:
+        page = int(request.args.get('page', 1))
+        per_page = min(int(request.args.get('per_page', 50)), 200)
+        template_id = int(request.args['template_id']) if 'template_id' in request.args else None
+        project_id = int(request.args['project_id']) if 'project_id' in request.args else None
+    except ValueError:
+        return jsonify({'error': 'Page, per_page, template_id and project_id must be integers'}), 400
+    if page < 1 or per_page < 1:
+        return jsonify({'error': 'Page and per_page must be positive'}), 400
+
+    filters = []
+    if scope == 'templates':
+        filters.append(Gefaehrdung.gbu_template_id.isnot(None))
+    elif scope == 'projects':
+        filters.append(Gefaehrdung.project_id.isnot(None))
+    if template_id is not None:
+        filters.append(Gefaehrdung.gbu_template_id == template_id)
+    if project_id is not None:
+        filters.append(Gefaehrdung.project_id == project_id)
+    project_ids = accessible_project_ids()
+    if project_ids is not None:
+        # Users find template rows and rows of assigned projects or projects they created
+        filters.append(Gefaehrdung.project_id.is_(None) | Gefaehrdung.project_id.in_(project_ids))
+
+    query, score = search_gefaehrdungen(terms, filters)
+    total = query.order_by(None).count()
+    rows = query.order_by(score.desc(), Gefaehrdung.id) \
+        .limit(per_page).offset((page - 1) * per_page).all()
+
+    result = []
+    for gefaehrdung, rank in rows:
+        gefaehrdung_dict = gefaehrdung.to_dict()
+        gefaehrdung_dict['score'] = round(rank, 4) if rank else 0
+        result.append(gefaehrdung_dict)
+
+    return jsonify(result), 200, {'X-Total-Count': str(total)}
+
 @gbu_bp.route('/templates', methods=['POST'])
 @jwt_required()
 def create_template():
@@ -76,6 +206,7 @@ def create_template():
     )
     db.session.add(log)
     db.session.commit()
+    invalidate_cached_responses('templates')
 
     return jsonify(template.to_dict()), 201
 
@@ -89,16 +220,12 @@ def create_gefaehrdung():
     if not data or not data.get('tätigkeit'):
         return jsonify({'error': 'Tätigkeit required'}), 400
 
+    denied = project_access_denied(data.get('project_id')) or template_write_denied(data.get('gbu_template_id'))
+    if denied:
+        return denied
+
     # Calculate risikobewertung based on schadenschwere and wahrscheinlichkeit
-    risikobewertung = None
-    if data.get('schadenschwere') and data.get('wahrscheinlichkeit'):
-        risk_value = data['schadenschwere'] * data['wahrscheinlichkeit']
-        if risk_value <= 2:
-            risikobewertung = 'niedrig'
-        elif risk_value <= 4:
-            risikobewertung = 'mittel'
-        else:
-            risikobewertung = 'hoch'
+    risikobewertung = calculate_risikobewertung(data.get('schadenschwere'), data.get('wahrscheinlichkeit'))
 
     gefaehrdung = Gefaehrdung(
         gbu_template_id=data.get('gbu_template_id'),
@@ -125,10 +252,18 @@ def create_gefaehrdung():
         sonstige_bemerkungen=data.get('sonstige_bemerkungen'),
         gesetzliche_regelungen=data.get('gesetzliche_regelungen'),
         mängel_behoben=data.get('mängel_behoben', False),
-        sort_order=data.get('sort_order', 0)
+        sort_order=data.get('sort_order') or 0
     )
 
+    overlay_project_ids = template_gefaehrdungen_changed([gefaehrdung.gbu_template_id])
+    summary = RiskSummaryDelta()
+    summary.row_changed(gefaehrdung.project_id, after=gefaehrdung)
+    summary.template_rows_changed(after=[gefaehrdung])
+    summary.apply()
+    lock_projects_for_insert([gefaehrdung.project_id])
     db.session.add(gefaehrdung)
+    db.session.flush()
+    record_gefaehrdung_changes([gefaehrdung])
     db.session.commit()
 
     # Log the creation
@@ -142,6 +277,7 @@ def create_gefaehrdung():
     )
     db.session.add(log)
     db.session.commit()
+    _template_rows_changed([gefaehrdung.gbu_template_id], {gefaehrdung.project_id} | overlay_project_ids)
 
     return jsonify(gefaehrdung.to_dict()), 201
 
@@ -155,7 +291,13 @@ def update_gefaehrdung(gefaehrdung_id):
     if not gefaehrdung:
         return jsonify({'error': 'Gefaehrdung not found'}), 404
 
+    denied = project_access_denied(gefaehrdung.project_id) or template_write_denied(gefaehrdung.gbu_template_id)
+    if denied:
+        return denied
+
     data = request.get_json()
+    before = gefaehrdung.to_dict()
+    overlay_project_ids = template_gefaehrdungen_changed([gefaehrdung.gbu_template_id])
 
     # Update fields
     if 'tätigkeit' in data:
@@ -172,14 +314,9 @@ def update_gefaehrdung(gefaehrdung_id):
         gefaehrdung.wahrscheinlichkeit = data['wahrscheinlichkeit']
 
     # Recalculate risikobewertung
-    if gefaehrdung.schadenschwere and gefaehrdung.wahrscheinlichkeit:
-        risk_value = gefaehrdung.schadenschwere * gefaehrdung.wahrscheinlichkeit
-        if risk_value <= 2:
-            gefaehrdung.risikobewertung = 'niedrig'
-        elif risk_value <= 4:
-            gefaehrdung.risikobewertung = 'mittel'
-        else:
-            gefaehrdung.risikobewertung = 'hoch'
+    risikobewertung = calculate_risikobewertung(gefaehrdung.schadenschwere, gefaehrdung.wahrscheinlichkeit)
+    if risikobewertung:
+        gefaehrdung.risikobewertung = risikobewertung
 
     if 's_substitution' in data:
         gefaehrdung.s_substitution = data['s_substitution']
@@ -212,7 +349,13 @@ def update_gefaehrdung(gefaehrdung_id):
     if 'bereich_id' in data:
         gefaehrdung.bereich_id = data['bereich_id']
 
+    summary = RiskSummaryDelta()
+    summary.row_changed(gefaehrdung.project_id, before, gefaehrdung)
+    summary.template_rows_changed([before], [gefaehrdung])
+    summary.apply()
+    record_gefaehrdung_changes([gefaehrdung])
     db.session.commit()
+    _template_rows_changed([gefaehrdung.gbu_template_id], {gefaehrdung.project_id} | overlay_project_ids)
 
     return jsonify(gefaehrdung.to_dict()), 200
 
@@ -226,39 +369,303 @@ def delete_gefaehrdung(gefaehrdung_id):
     if not gefaehrdung:
         return jsonify({'error': 'Gefaehrdung not found'}), 404
 
+    denied = project_access_denied(gefaehrdung.project_id) or template_write_denied(gefaehrdung.gbu_template_id)
+    if denied:
+        return denied
+
+    project_id, template_id = gefaehrdung.project_id, gefaehrdung.gbu_template_id
+    overlay_project_ids = template_gefaehrdungen_changed([template_id])
+    summary = RiskSummaryDelta()
+    summary.row_changed(project_id, before=gefaehrdung)
+    summary.template_rows_changed(before=[gefaehrdung])
+    summary.apply()
     db.session.delete(gefaehrdung)
+    db.session.flush()
+    record_gefaehrdung_changes([gefaehrdung], deleted=True)
     db.session.commit()
+    _template_rows_changed([template_id], {project_id} | overlay_project_ids)
 
     return jsonify({'message': 'Gefaehrdung deleted successfully'}), 200
 
-@gbu_bp.route('/project/<int:project_id>/gbus', methods=['GET'])
+@gbu_bp.route('/gefaehrdungen/batch', methods=['POST'])
 @jwt_required()
+def batch_gefaehrdungen():
+    """Create, update and delete many gefaehrdungen in one transaction"""
+    current_user_id = get_jwt_identity()
+    data = request.get_json()
+
+    if not data or not isinstance(data.get('operations'), list):
+        return jsonify({'error': 'Operations required'}), 400
+
+    creates, updates, deletes = [], {}, set()
+    for index, operation in enumerate(data['operations']):
+        if not isinstance(operation, dict):
+            return jsonify({'error': f'Operation {index}: must be an object'}), 400
+
+        op = operation.get('op')
+        fields = operation.get('data') or {}
+        if not isinstance(fields, dict):
+            return jsonify({'error': f'Operation {index}: data must be an object'}), 400
+        if fields.get('sort_order', 0) is None:
+            fields['sort_order'] = 0
+
+        if op == 'create':
+            if not fields.get('tätigkeit'):
+                return jsonify({'error': f'Operation {index}: Tätigkeit required'}), 400
+            creates.append(fields)
+        elif op in ('update', 'delete'):
+            if not isinstance(operation.get('id'), int):
+                return jsonify({'error': f'Operation {index}: ID required'}), 400
+            if op == 'delete':
+                deletes.add(operation['id'])
+            elif 'tätigkeit' in fields and not fields['tätigkeit']:
+                return jsonify({'error': f'Operation {index}: Tätigkeit required'}), 400
+            else:
+                updates.setdefault(operation['id'], {}).update(fields)
+        else:
+            return jsonify({'error': f'Operation {index}: op must be create, update or delete'}), 400
+
+    # Rows deleted in the same batch need no update
+    for gefaehrdung_id in deletes:
+        updates.pop(gefaehrdung_id, None)
+
+    # Current values of every touched row in one query
+    ids = set(updates) | deletes
+    existing = {}
+    if ids:
+        rows = db.session.query(
+            Gefaehrdung.id, Gefaehrdung.project_id, Gefaehrdung.gbu_template_id, Gefaehrdung.bereich_id,
+            Gefaehrdung.schadenschwere, Gefaehrdung.wahrscheinlichkeit, Gefaehrdung.risikobewertung,
+            Gefaehrdung.mängel_behoben
+        ).filter(Gefaehrdung.id.in_(ids))
+        existing = {row.id: row for row in rows}
+
+    missing = sorted(ids - set(existing))
+    if missing:
+        return jsonify({'error': 'Gefaehrdungen not found', 'ids': missing}), 404
+
+    denied = project_access_denied(*(fields.get('project_id') for fields in creates),
+                                   *(row.project_id for row in existing.values())) \
+        or template_write_denied(*(fields.get('gbu_template_id') for fields in creates),
+                                 *(row.gbu_template_id for row in existing.values()))
+    if denied:
+        return denied
+
+    created = []
+    for fields in creates:
+        gefaehrdung = Gefaehrdung(
+            gbu_template_id=fields.get('gbu_template_id'),
+            project_id=fields.get('project_id'),
+            **{field: fields[field] for field in GEFAEHRDUNG_FIELDS if field in fields}
+        )
+        gefaehrdung.risikobewertung = calculate_risikobewertung(gefaehrdung.schadenschwere, gefaehrdung.wahrscheinlichkeit)
+        created.append(gefaehrdung)
+
+    now = datetime.utcnow()
+    update_rows = []
+    for gefaehrdung_id, fields in updates.items():
+        row = {field: fields[field] for field in GEFAEHRDUNG_FIELDS if field in fields}
+        current = existing[gefaehrdung_id]
+        risikobewertung = calculate_risikobewertung(
+            row.get('schadenschwere', current.schadenschwere),
+            row.get('wahrscheinlichkeit', current.wahrscheinlichkeit)
+        )
+        if risikobewertung:
+            row['risikobewertung'] = risikobewertung
+        row['id'] = gefaehrdung_id
+        row['updated_at'] = now
+        update_rows.append(row)
+
+    # Templates are locked before their rows and the sync sequence, in the order snapshot_template takes them
+    project_ids = {g.project_id for g in created} | {existing[gefaehrdung_id].project_id for gefaehrdung_id in ids}
+    template_ids = {g.gbu_template_id for g in created} | {existing[gefaehrdung_id].gbu_template_id for gefaehrdung_id in ids}
+    project_ids |= template_gefaehrdungen_changed(template_ids)
+
+    # Summary deltas from the old and new values, the project locks come before the insert locks
+    summary = RiskSummaryDelta()
+    updated_values = [{**existing[row['id']]._asdict(), **row} for row in update_rows]
+    for gefaehrdung in created:
+        summary.row_changed(gefaehrdung.project_id, after=gefaehrdung)
+    for values in updated_values:
+        summary.row_changed(values['project_id'], existing[values['id']], values)
+    for gefaehrdung_id in deletes:
+        summary.row_changed(existing[gefaehrdung_id].project_id, before=existing[gefaehrdung_id])
+    summary.template_rows_changed(list(existing.values()), created + updated_values)
+    summary.apply()
+
+    lock_projects_for_insert(g.project_id for g in created)
+    db.session.add_all(created)
+
+    # Bulk UPDATE by primary key, executed as one executemany per set of changed fields
+    if update_rows:
+        db.session.execute(update(Gefaehrdung), update_rows)
+    if deletes:
+        db.session.execute(delete(Gefaehrdung).where(Gefaehrdung.id.in_(deletes)))
+
+    log = AuditLog(
+        user_id=current_user_id,
+        action='batch_gefaehrdungen',
+        entity_type='gefaehrdung',
+        details=f'Batch: {len(created)} created, {len(update_rows)} updated, {len(deletes)} deleted',
+        ip_address=request.remote_addr
+    )
+    db.session.add(log)
+    db.session.flush()
+
+    # Serialize before the commit expires the rows
+    result = {
+        'created': [g.to_dict() for g in created],
+        'updated': [g.to_dict() for g in Gefaehrdung.query.filter(Gefaehrdung.id.in_(updates))] if updates else [],
+        'deleted': sorted(deletes)
+    }
+    # Last before the commit, the sync sequence stays locked until then
+    record_gefaehrdung_changes(created + [existing[gefaehrdung_id] for gefaehrdung_id in updates])
+    record_gefaehrdung_changes([existing[gefaehrdung_id] for gefaehrdung_id in deletes], deleted=True)
+    db.session.commit()
+    _template_rows_changed(template_ids, project_ids)
+
+    return jsonify(result), 200
+
+@gbu_bp.route('/risk-matrix', methods=['GET'])
+@jwt_required()
+def get_risk_matrix():
+    """Get the configured risk matrix"""
+    return jsonify([{'max_value': upper_bound, 'risikobewertung': rating} for upper_bound, rating in risk_matrix()]), 200
+
+@gbu_bp.route('/risk-matrix/reclassify', methods=['POST'])
+@admin_required
+def reclassify_risk():
+    """Recompute all stored risk ratings, streaming progress as JSON lines (admin only)"""
+    current_user_id = get_jwt_identity()
+    ip_address = request.remote_addr
+    batch_size = request.args.get('batch_size', RECLASSIFY_BATCH_SIZE, type=int)
+    if batch_size < 1:
+        return jsonify({'error': 'batch_size must be positive'}), 400
+
+    def generate():
+        for progress in reclassify_all(batch_size):
+            yield json.dumps(progress) + '\n'
+        rebuild_risk_summaries()
+
+        log = AuditLog(
+            user_id=current_user_id,
+            action='reclassify_risk',
+            entity_type='gefaehrdung',
+            details=f'Reclassified {progress["processed"]} gefaehrdungen, {progress["changed"]} changed',
+            ip_address=ip_address
+        )
+        db.session.add(log)
+        db.session.commit()
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+@gbu_bp.route('/project/<int:project_id>/gbus', methods=['GET'])
+@project_access_required
 def get_project_gbus(project_id):
-    """Get all GBUs for a project"""
-    project = Project.query.get(project_id)
-    if not project:
+    """Get all GBUs for a project, or with ?since=<watermark> only what changed after it"""
+    include_removed = request.args.get('include_removed', 'false').lower() == 'true'
+    try:
+        since = int(request.args['since']) if 'since' in request.args else None
+    except ValueError:
+        return jsonify({'error': 'since must be an integer'}), 400
+
+    # Read before the rows, so changes committed in between are sent again next time
+    watermark = current_sync_seq()
+
+    if since is not None and 0 <= since <= watermark and not needs_full_resync(since):
+        changes = load_project_gbu_changes(project_id, since, watermark, include_removed=include_removed)
+        if changes is None:
+            return jsonify({'error': 'Project not found'}), 404
+        changes['watermark'] = watermark
+        changes['full'] = False
+        return jsonify(changes), 200
+
+    project_gbus = load_project_gbus(project_id, include_removed=include_removed)
+    if project_gbus is None:
         return jsonify({'error': 'Project not found'}), 404
 
-    # Get template-based GBUs
-    project_gbus = ProjectGBU.query.filter_by(project_id=project_id).all()
-    templates = []
-    for pg in project_gbus:
-        template = GBUTemplate.query.get(pg.gbu_template_id)
-        if template:
-            template_dict = template.to_dict()
-            template_dict['gefaehrdungen'] = [g.to_dict() for g in template.gefaehrdungen]
-            templates.append(template_dict)
+    project_gbus['watermark'] = watermark
+    project_gbus['full'] = True
+    return jsonify(project_gbus), 200
+
+@gbu_bp.route('/project/<int:project_id>/gefaehrdungen', methods=['GET'])
+@project_access_required
+def get_project_gefaehrdungen(project_id):
+    """List a project's gefaehrdungen with overlaid template rows page by page, ?fields= selects the columns"""
+    if not db.session.query(Project.id).filter(Project.id == project_id).first():
+        return jsonify({'error': 'Project not found'}), 404
 
-    # Get project-specific gefaehrdungen
-    project_gefaehrdungen = Gefaehrdung.query.filter_by(project_id=project_id).all()
+    fields, limit, after, error = _listing_args()
+    if error:
+        return error
 
-    return jsonify({
-        'templates': templates,
-        'project_gefaehrdungen': [g.to_dict() for g in project_gefaehrdungen]
-    }), 200
+    page, next_key = load_gefaehrdungen_page(fields, limit, after, project_id=project_id)
+    return jsonify(page), 200, _listing_headers(next_key)
+
+@gbu_bp.route('/project/<int:project_id>/reorder', methods=['POST'])
+@project_access_required
+def reorder_project_gefaehrdungen(project_id):
+    """Reorder a project's gefaehrdungen of one Bereich with a single UPDATE
+
+    Only the project's own rows can be reordered, overlaid template rows keep
+    the order of their template.
+    """
+    current_user_id = get_jwt_identity()
+    if not db.session.query(Project.id).filter(Project.id == project_id).first():
+        return jsonify({'error': 'Project not found'}), 404
+
+    data = request.get_json()
+    ids = data.get('ids') if data else None
+    if not isinstance(ids, list) or not all(isinstance(gefaehrdung_id, int) for gefaehrdung_id in ids):
+        return jsonify({'error': 'IDs required'}), 400
+    if len(set(ids)) != len(ids):
+        return jsonify({'error': 'IDs must be unique'}), 400
+    bereich_id = data.get('bereich_id')
+
+    bereich_filter = Gefaehrdung.bereich_id.is_(None) if bereich_id is None else Gefaehrdung.bereich_id == bereich_id
+    current = dict(db.session.query(Gefaehrdung.id, Gefaehrdung.sort_order)
+                   .filter(Gefaehrdung.project_id == project_id, bereich_filter)
+                   .with_for_update())
+    template_row_ids = overlaid_gefaehrdung_ids(project_id, set(ids) - set(current))
+    if template_row_ids:
+        return jsonify({
+            'error': 'Template gefaehrdungen keep the order of their template, list only the project\'s own rows',
+            'template_ids': sorted(template_row_ids)
+        }), 400
+    if set(ids) != set(current):
+        return jsonify({
+            'error': 'IDs must list every gefaehrdung of the project in this Bereich',
+            'missing': sorted(set(current) - set(ids)),
+            'unknown': sorted(set(ids) - set(current))
+        }), 409
+
+    sort_orders = reorder_sort_orders(current, ids)
+    if sort_orders:
+        db.session.execute(
+            update(Gefaehrdung)
+            .where(Gefaehrdung.id.in_(sort_orders))
+            .values(sort_order=case(sort_orders, value=Gefaehrdung.id), updated_at=datetime.utcnow())
+            .execution_options(synchronize_session=False)
+        )
+        record_project_changes(project_id, sort_orders)
+
+        log = AuditLog(
+            user_id=current_user_id,
+            action='reorder_gefaehrdungen',
+            entity_type='project',
+            entity_id=project_id,
+            details=f'Reordered {len(ids)} gefaehrdungen, {len(sort_orders)} moved',
+            ip_address=request.remote_addr
+        )
+        db.session.add(log)
+    db.session.commit()
+    if sort_orders:
+        notify_project_content_changed(project_id)
+
+    return jsonify({'sort_orders': {str(gefaehrdung_id): value for gefaehrdung_id, value in sort_orders.items()}}), 200
 
 @gbu_bp.route('/project/<int:project_id>/add-template', methods=['POST'])
-@jwt_required()
+@project_access_required
 def add_template_to_project(project_id):
     """Add a GBU template to a project"""
     current_user_id = get_jwt_identity()
@@ -284,19 +691,120 @@ def add_template_to_project(project_id):
     if existing:
         return jsonify({'error': 'Template already added to this project'}), 409
 
+    # The project overlays the template as it is now instead of copying its rows,
+    # later template changes show only once it rebases
     project_gbu = ProjectGBU(
         project_id=project_id,
         gbu_template_id=data['template_id'],
-        added_by=current_user_id
+        added_by=current_user_id,
+        template_version=snapshot_template(template.id)
     )
 
     db.session.add(project_gbu)
+    summary = RiskSummaryDelta()
+    summary.add_rows(project_id, Gefaehrdung.gbu_template_id == template.id)
+    summary.apply()
+    record_template_added(project_id, template.id)
     db.session.commit()
+    notify_project_content_changed(project_id)
 
     return jsonify(project_gbu.to_dict()), 201
 
-@gbu_bp.route('/project/<int:project_id>/copy-template/<int:template_id>', methods=['POST'])
+@gbu_bp.route('/project-gbus/<int:project_gbu_id>/gefaehrdungen/<int:gefaehrdung_id>', methods=['PUT'])
+@jwt_required()
+def override_template_gefaehrdung(project_gbu_id, gefaehrdung_id):
+    """Change fields of a template gefaehrdung for one project only"""
+    project_gbu, row, error = _load_overlay_row(project_gbu_id, gefaehrdung_id)
+    if error:
+        return error
+
+    data = request.get_json() or {}
+    if 'tätigkeit' in data and not data['tätigkeit']:
+        return jsonify({'error': 'Tätigkeit required'}), 400
+
+    before = _project_view_row(project_gbu, row)
+    override = save_override(project_gbu.id, row, data, get_jwt_identity())
+    after = merged_gefaehrdung_dict(row, project_gbu.id, override)
+    _overlay_row_changed(project_gbu, before, after)
+    record_project_changes(project_gbu.project_id, [row['id']])
+    db.session.commit()
+    notify_project_content_changed(project_gbu.project_id)
+
+    return jsonify(after), 200
+
+@gbu_bp.route('/project-gbus/<int:project_gbu_id>/gefaehrdungen/<int:gefaehrdung_id>', methods=['DELETE'])
+@jwt_required()
+def remove_template_gefaehrdung(project_gbu_id, gefaehrdung_id):
+    """Hide a template gefaehrdung in one project"""
+    project_gbu, row, error = _load_overlay_row(project_gbu_id, gefaehrdung_id)
+    if error:
+        return error
+
+    before = _project_view_row(project_gbu, row)
+    save_override(project_gbu.id, row, {}, get_jwt_identity(), removed=True)
+    _overlay_row_changed(project_gbu, before)
+    record_project_changes(project_gbu.project_id, [row['id']])
+    db.session.commit()
+    notify_project_content_changed(project_gbu.project_id)
+
+    return jsonify({'message': 'Gefaehrdung removed from project'}), 200
+
+@gbu_bp.route('/project-gbus/<int:project_gbu_id>/gefaehrdungen/<int:gefaehrdung_id>/restore', methods=['POST'])
+@jwt_required()
+def restore_template_gefaehrdung(project_gbu_id, gefaehrdung_id):
+    """Drop a project's overrides of a template gefaehrdung"""
+    project_gbu, row, error = _load_overlay_row(project_gbu_id, gefaehrdung_id)
+    if error:
+        return error
+
+    before = _project_view_row(project_gbu, row)
+    ProjectGBUOverride.query.filter_by(project_gbu_id=project_gbu.id, gefaehrdung_id=row['id']).delete()
+    after = merged_gefaehrdung_dict(row, project_gbu.id)
+    _overlay_row_changed(project_gbu, before, after)
+    record_project_changes(project_gbu.project_id, [row['id']])
+    db.session.commit()
+    notify_project_content_changed(project_gbu.project_id)
+
+    return jsonify(after), 200
+
+@gbu_bp.route('/project-gbus/<int:project_gbu_id>/rebase', methods=['POST'])
 @jwt_required()
+def rebase_project_gbu(project_gbu_id):
+    """Accept the current template version, also turns a pre-overlay link into an overlay"""
+    project_gbu = ProjectGBU.query.get(project_gbu_id)
+    if not project_gbu:
+        return jsonify({'error': 'Project GBU not found'}), 404
+
+    denied = project_access_denied(project_gbu.project_id)
+    if denied:
+        return denied
+
+    pinned_rows = load_snapshot_rows([(project_gbu, project_gbu.gbu_template)]).get(project_gbu.id, [])
+    version = snapshot_template(project_gbu.gbu_template_id)
+    current_ids = set(db.session.scalars(
+        select(Gefaehrdung.id).where(Gefaehrdung.gbu_template_id == project_gbu.gbu_template_id)
+    ))
+    gone_ids = [row['id'] for row in pinned_rows if row['id'] not in current_ids]
+    if gone_ids:
+        ProjectGBUOverride.query.filter(ProjectGBUOverride.project_gbu_id == project_gbu.id,
+                                        ProjectGBUOverride.gefaehrdung_id.in_(gone_ids)) \
+            .delete(synchronize_session=False)
+    project_gbu.template_version = version
+    # The whole link changes, so its one project is recounted, before the sync sequence is locked
+    refresh_risk_summaries([project_gbu.project_id])
+
+    # The template's current rows join the project's view, replacing those of the pinned version
+    record_template_added(project_gbu.project_id, project_gbu.gbu_template_id)
+    if gone_ids:
+        # Logged rows that no longer exist are sent as deleted
+        record_project_changes(project_gbu.project_id, gone_ids)
+    db.session.commit()
+    notify_project_content_changed(project_gbu.project_id)
+
+    return jsonify(project_gbu.to_dict()), 200
+
+@gbu_bp.route('/project/<int:project_id>/copy-template/<int:template_id>', methods=['POST'])
+@project_access_required
 def copy_template_to_project(project_id, template_id):
     """Copy a GBU template's gefaehrdungen to a project"""
     current_user_id = get_jwt_identity()
@@ -309,37 +817,124 @@ def copy_template_to_project(project_id, template_id):
     if not template:
         return jsonify({'error': 'Template not found'}), 404
 
-    # Copy all gefaehrdungen from template to project
-    copied_gefaehrdungen = []
-    for original in template.gefaehrdungen:
-        gefaehrdung = Gefaehrdung(
-            project_id=project_id,
-            bereich_id=original.bereich_id,
-            tätigkeit=original.tätigkeit,
-            gefährdung=original.gefährdung,
-            gefährdungsfaktoren=original.gefährdungsfaktoren,
-            belastungsfaktoren=original.belastungsfaktoren,
-            schadenschwere=original.schadenschwere,
-            wahrscheinlichkeit=original.wahrscheinlichkeit,
-            risikobewertung=original.risikobewertung,
-            s_substitution=original.s_substitution,
-            t_technisch=original.t_technisch,
-            o_organisatorisch=original.o_organisatorisch,
-            p_persoenlich=original.p_persoenlich,
-            massnahmen=original.massnahmen,
-            s_massnahmen=original.s_massnahmen,
-            t_massnahmen=original.t_massnahmen,
-            o_massnahmen=original.o_massnahmen,
-            p_massnahmen=original.p_massnahmen,
-            überprüfung_wirksamkeit=original.überprüfung_wirksamkeit,
-            überprüfung_meldung=original.überprüfung_meldung,
-            sonstige_bemerkungen=original.sonstige_bemerkungen,
-            gesetzliche_regelungen=original.gesetzliche_regelungen,
-            sort_order=original.sort_order
-        )
-        db.session.add(gefaehrdung)
-        copied_gefaehrdungen.append(gefaehrdung)
+    return _copy_templates(project_id, [template_id])
+
+@gbu_bp.route('/project/<int:project_id>/copy-templates', methods=['POST'])
+@project_access_required
+def copy_templates_to_project(project_id):
+    """Copy the gefaehrdungen of several GBU templates to a project"""
+    if not db.session.query(Project.id).filter(Project.id == project_id).first():
+        return jsonify({'error': 'Project not found'}), 404
 
+    data = request.get_json()
+    template_ids = data.get('template_ids') if data else None
+    if not template_ids or not isinstance(template_ids, list) \
+            or not all(isinstance(template_id, int) for template_id in template_ids):
+        return jsonify({'error': 'Template IDs required'}), 400
+
+    template_ids = list(dict.fromkeys(template_ids))
+    found = {row.id for row in db.session.query(GBUTemplate.id).filter(GBUTemplate.id.in_(template_ids))}
+    missing = [template_id for template_id in template_ids if template_id not in found]
+    if missing:
+        return jsonify({'error': 'Templates not found', 'ids': missing}), 404
+
+    return _copy_templates(project_id, template_ids)
+
+def _load_overlay_row(project_gbu_id, gefaehrdung_id):
+    """Load a template link and one of its template rows as the link sees them, or an error response
+
+    The row is a Gefaehrdung.to_dict of the version the link pinned.
+    """
+    project_gbu = ProjectGBU.query.get(project_gbu_id)
+    if not project_gbu:
+        return None, None, (jsonify({'error': 'Project GBU not found'}), 404)
+
+    denied = project_access_denied(project_gbu.project_id)
+    if denied:
+        return None, None, denied
+
+    if project_gbu.template_version is None:
+        return None, None, (jsonify({'error': 'Template is not overlaid in this project'}), 409)
+
+    pinned_rows = load_snapshot_rows([(project_gbu, project_gbu.gbu_template)]).get(project_gbu.id)
+    if pinned_rows is not None:
+        row = next((row for row in pinned_rows if row['id'] == gefaehrdung_id), None)
+    else:
+        gefaehrdung = Gefaehrdung.query.get(gefaehrdung_id)
+        row = gefaehrdung.to_dict() if gefaehrdung and gefaehrdung.gbu_template_id == project_gbu.gbu_template_id \
+            else None
+    if row is None:
+        return None, None, (jsonify({'error': 'Gefaehrdung not found'}), 404)
+
+    return project_gbu, row, None
+
+def _project_view_row(project_gbu, row):
+    """A template row as the link's project sees it now, with its current override"""
+    override = ProjectGBUOverride.query.filter_by(project_gbu_id=project_gbu.id, gefaehrdung_id=row['id']).first()
+    return merged_gefaehrdung_dict(row, project_gbu.id, override)
+
+def _overlay_row_changed(project_gbu, before, after=None):
+    """Move a changed template row of one project in its risk summary"""
+    summary = RiskSummaryDelta()
+    summary.row_changed(project_gbu.project_id, before, after)
+    summary.apply()
+
+def _listing_args():
+    """Parse ?fields=, ?limit= and ?after= of a gefaehrdung listing, or an error response"""
+    fields = [field for field in request.args.get('fields', '').split(',') if field] or list(LISTABLE_COLUMNS)
+    unknown = [field for field in fields if field not in LISTABLE_COLUMNS]
+    if unknown:
+        return None, None, None, (jsonify({'error': f'Unknown fields: {", ".join(unknown)}',
+                                           'fields': list(LISTABLE_COLUMNS)}), 400)
+
+    try:
+        limit = min(int(request.args.get('limit', LIST_PAGE_SIZE)), LIST_MAX_PAGE_SIZE)
+        after = None
+        if 'after' in request.args:
+            # An empty first part stands for rows without a Bereich
+            after = tuple(int(part) if part or index else None
+                          for index, part in enumerate(request.args['after'].split(',')))
+    except ValueError:
+        return None, None, None, (jsonify({'error': 'limit and after must be integers'}), 400)
+    if limit < 1:
+        return None, None, None, (jsonify({'error': 'limit must be positive'}), 400)
+    if after is not None and len(after) != 3:
+        return None, None, None, (jsonify({'error': 'after must be the X-Next-Cursor of the previous page'}), 400)
+
+    return fields, limit, after, None
+
+def _listing_headers(next_key):
+    """X-Next-Cursor for the ?after= of the next page, absent on the last page"""
+    return {'X-Next-Cursor': ','.join('' if part is None else str(part) for part in next_key)} if next_key else {}
+
+def _template_rows_changed(template_ids, project_ids):
+    """After a commit: refresh the template catalog if template rows changed and notify projects"""
+    if any(template_id is not None for template_id in template_ids):
+        invalidate_cached_responses('templates')
+    for project_id in project_ids:
+        if project_id is not None:
+            notify_project_content_changed(project_id)
+
+def _copy_templates(project_id, template_ids):
+    """Copy templates set-based and answer as requested by ?return=rows|ids|count"""
+    response_format = request.args.get('return', 'rows')
+    if response_format not in ('rows', 'ids', 'count'):
+        return jsonify({'error': 'return must be rows, ids or count'}), 400
+
+    copied_ids = copy_template_gefaehrdungen(project_id, template_ids)
+    if copied_ids:
+        summary = RiskSummaryDelta()
+        summary.add_rows(project_id, Gefaehrdung.id.in_(copied_ids))
+        summary.apply()
+    record_project_changes(project_id, copied_ids)
     db.session.commit()
+    notify_project_content_changed(project_id)
+
+    if response_format == 'count':
+        return jsonify({'count': len(copied_ids)}), 201
+    if response_format == 'ids':
+        return jsonify({'count': len(copied_ids), 'ids': copied_ids}), 201
 
+    copied_gefaehrdungen = Gefaehrdung.query.filter(Gefaehrdung.id.in_(copied_ids)) \
+        .order_by(Gefaehrdung.id).all() if copied_ids else []
     return jsonify([g.to_dict() for g in copied_gefaehrdungen]), 201
@@ -1,6 +1,9 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from models import db, Participant, Project, User, AuditLog
+from signals import notify_project_content_changed
+from utils.access import project_access_denied, project_access_required
+from utils.signature_cache import build_thumbnail
 from datetime import datetime
 import csv
 import io
@@ -8,7 +11,7 @@ import io
 participants_bp = Blueprint('participants', __name__)
 
 @participants_bp.route('/project/<int:project_id>', methods=['GET'])
-@jwt_required()
+@project_access_required
 def get_project_participants(project_id):
     """Get all participants for a project"""
     project = Project.query.get(project_id)
@@ -28,6 +31,10 @@ def create_participant():
     if not data or not data.get('project_id'):
         return jsonify({'error': 'Project ID required'}), 400
 
+    denied = project_access_denied(data['project_id'])
+    if denied:
+        return denied
+
     project = Project.query.get(data['project_id'])
     if not project:
         return jsonify({'error': 'Project not found'}), 404
@@ -43,6 +50,7 @@ def create_participant():
 
     db.session.add(participant)
     db.session.commit()
+    notify_project_content_changed(participant.project_id)
 
     return jsonify(participant.to_dict()), 201
 
@@ -54,6 +62,10 @@ def update_participant(participant_id):
     if not participant:
         return jsonify({'error': 'Participant not found'}), 404
 
+    denied = project_access_denied(participant.project_id)
+    if denied:
+        return denied
+
     data = request.get_json()
 
     if 'first_name' in data:
@@ -68,6 +80,7 @@ def update_participant(participant_id):
         participant.company = data['company']
 
     db.session.commit()
+    notify_project_content_changed(participant.project_id)
 
     return jsonify(participant.to_dict()), 200
 
@@ -79,13 +92,19 @@ def delete_participant(participant_id):
     if not participant:
         return jsonify({'error': 'Participant not found'}), 404
 
+    denied = project_access_denied(participant.project_id)
+    if denied:
+        return denied
+
+    project_id = participant.project_id
     db.session.delete(participant)
     db.session.commit()
+    notify_project_content_changed(project_id)
 
     return jsonify({'message': 'Participant deleted successfully'}), 200
 
 @participants_bp.route('/project/<int:project_id>/import-csv', methods=['POST'])
-@jwt_required()
+@project_access_required
 def import_participants_csv(project_id):
     """Import participants from CSV file"""
     current_user_id = get_jwt_identity()
@@ -142,6 +161,7 @@ def import_participants_csv(project_id):
         )
         db.session.add(log)
         db.session.commit()
+        notify_project_content_changed(project_id)
 
         return jsonify({
             'message': f'Successfully imported {imported_count} participants',
@@ -160,6 +180,10 @@ def sign_participant(participant_id):
     if not participant:
         return jsonify({'error': 'Participant not found'}), 404
 
+    denied = project_access_denied(participant.project_id)
+    if denied:
+        return denied
+
     data = request.get_json()
 
     if not data or not data.get('signature_data'):
@@ -171,6 +195,10 @@ def sign_participant(participant_id):
 
     db.session.commit()
 
+    # Pre-render the thumbnail printed on the Teilnehmerliste
+    build_thumbnail(participant.id, participant.signed_at, participant.signature_data)
+    notify_project_content_changed(participant.project_id)
+
     return jsonify(participant.to_dict()), 200
 
 @participants_bp.route('/<int:participant_id>/mark-analog-signed', methods=['POST'])
@@ -181,9 +209,14 @@ def mark_analog_signed(participant_id):
     if not participant:
         return jsonify({'error': 'Participant not found'}), 404
 
+    denied = project_access_denied(participant.project_id)
+    if denied:
+        return denied
+
     participant.signature_type = 'analog'
     participant.signed_at = datetime.utcnow()
 
     db.session.commit()
+    notify_project_content_changed(participant.project_id)
 
     return jsonify(participant.to_dict()), 200
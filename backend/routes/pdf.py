@@ -1,66 +1,174 @@
-from flask import Blueprint, request, jsonify, send_file
+from flask import Blueprint, Response, request, jsonify, send_file, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from models import db, Project, Gefaehrdung, Participant, Unterweisung, Bereich
-from utils.pdf_generator import PDFGenerator
-import os
+from models import db, Project, Unterweisung
+from routes.users import admin_required
+from datetime import datetime
+from utils.access import accessible_projects_filter, project_access_denied, project_access_required
+from utils.pdf_cache import get_pdf_cache
+from utils.pdf_documents import DOCUMENT_KINDS, load_document, render_cached
+from utils.pdf_jobs import get_pdf_jobs
+from utils.pdf_export import stream_zip
 
 pdf_bp = Blueprint('pdf', __name__)
 
 @pdf_bp.route('/project/<int:project_id>/gbu', methods=['GET'])
-@jwt_required()
+@project_access_required
 def generate_gbu_pdf(project_id):
     """Generate GBU overview PDF for a project"""
-    project = Project.query.get(project_id)
-    if not project:
+    document = load_document('gbu', project_id)
+    if not document:
         return jsonify({'error': 'Project not found'}), 404
 
-    # Get all gefaehrdungen for the project
-    gefaehrdungen = Gefaehrdung.query.filter_by(project_id=project_id).all()
-
-    # Group by bereich
-    gefaehrdungen_by_bereich = {}
-    for gef in gefaehrdungen:
-        bereich = Bereich.query.get(gef.bereich_id) if gef.bereich_id else None
-        bereich_name = bereich.name if bereich else 'Sonstige'
-
-        if bereich_name not in gefaehrdungen_by_bereich:
-            gefaehrdungen_by_bereich[bereich_name] = []
-        gefaehrdungen_by_bereich[bereich_name].append(gef)
-
-    # Generate PDF
-    pdf_gen = PDFGenerator()
-    pdf_path = pdf_gen.generate_gbu_overview(project, gefaehrdungen_by_bereich)
-
-    return send_file(pdf_path, as_attachment=True, download_name=f'GBU_{project.name}.pdf')
+    return send_file(render_cached(document), mimetype='application/pdf', as_attachment=True, download_name=document.filename)
 
 @pdf_bp.route('/project/<int:project_id>/participants', methods=['GET'])
-@jwt_required()
+@project_access_required
 def generate_participants_pdf(project_id):
     """Generate participants list PDF for signatures"""
-    project = Project.query.get(project_id)
-    if not project:
+    document = load_document('participants', project_id)
+    if not document:
         return jsonify({'error': 'Project not found'}), 404
 
-    participants = Participant.query.filter_by(project_id=project_id).all()
-
-    # Generate PDF
-    pdf_gen = PDFGenerator()
-    pdf_path = pdf_gen.generate_participants_list(project, participants)
-
-    return send_file(pdf_path, as_attachment=True, download_name=f'Teilnehmerliste_{project.name}.pdf')
+    return send_file(render_cached(document), mimetype='application/pdf', as_attachment=True, download_name=document.filename)
 
 @pdf_bp.route('/unterweisung/<int:unterweisung_id>', methods=['GET'])
 @jwt_required()
 def generate_unterweisung_pdf(unterweisung_id):
     """Generate unterweisung PDF"""
-    unterweisung = Unterweisung.query.get(unterweisung_id)
-    if not unterweisung:
+    denied = project_access_denied(_document_project_id('unterweisung', unterweisung_id))
+    if denied:
+        return denied
+
+    document = load_document('unterweisung', unterweisung_id)
+    if not document:
         return jsonify({'error': 'Unterweisung not found'}), 404
 
-    project = Project.query.get(unterweisung.project_id)
+    return send_file(render_cached(document), mimetype='application/pdf', as_attachment=True, download_name=document.filename)
+
+@pdf_bp.route('/jobs', methods=['POST'])
+@jwt_required()
+def submit_pdf_job():
+    """Queue a PDF for rendering in the background"""
+    current_user_id = get_jwt_identity()
+    data = request.get_json()
+
+    if not data or data.get('kind') not in DOCUMENT_KINDS or not data.get('id'):
+        return jsonify({'error': f'Kind ({", ".join(DOCUMENT_KINDS)}) and ID required'}), 400
+
+    denied = project_access_denied(_document_project_id(data['kind'], data['id']))
+    if denied:
+        return denied
+
+    document = load_document(data['kind'], data['id'])
+    if not document:
+        return jsonify({'error': 'Document source not found'}), 404
+
+    job = get_pdf_jobs().submit(document, current_user_id)
+
+    return jsonify(_job_dict(job)), 202
+
+@pdf_bp.route('/jobs/<string:job_id>', methods=['GET'])
+@jwt_required()
+def get_pdf_job(job_id):
+    """Get the status of a PDF job"""
+    job = get_pdf_jobs().get(job_id)
+    if not job or job['user_id'] != get_jwt_identity():
+        return jsonify({'error': 'Job not found'}), 404
+
+    return jsonify(_job_dict(job)), 200
+
+@pdf_bp.route('/jobs/<string:job_id>/download', methods=['GET'])
+@jwt_required()
+def download_pdf_job(job_id):
+    """Download the PDF of a finished job"""
+    job = get_pdf_jobs().get(job_id)
+    if not job or job['user_id'] != get_jwt_identity():
+        return jsonify({'error': 'Job not found'}), 404
+
+    if job['status'] != 'done':
+        return jsonify({'error': 'Job not finished', 'status': job['status']}), 409
+
+    pdf_path = get_pdf_cache().get(job['key'])
+    if not pdf_path:
+        return jsonify({'error': 'PDF expired, please submit the job again'}), 410
+
+    return send_file(pdf_path, as_attachment=True, download_name=job['filename'])
+
+@pdf_bp.route('/export', methods=['GET'])
+@jwt_required()
+def export_projects_zip():
+    """Export GBU, Teilnehmerliste and Unterweisung PDFs of many projects as one ZIP"""
+    query = Project.query
+    access_filter = accessible_projects_filter(Project.id)
+    if access_filter is not None:
+        # Users export only assigned projects or projects they created
+        query = query.filter(access_filter)
+
+    if request.args.get('status'):
+        query = query.filter(Project.status == request.args['status'])
+    if request.args.get('season'):
+        query = query.filter(Project.season == request.args['season'])
+
+    try:
+        if request.args.get('start_date_from'):
+            query = query.filter(Project.start_date >= datetime.strptime(request.args['start_date_from'], '%Y-%m-%d'))
+        if request.args.get('start_date_to'):
+            query = query.filter(Project.start_date <= datetime.strptime(request.args['start_date_to'], '%Y-%m-%d'))
+    except ValueError:
+        return jsonify({'error': 'Dates must be given as YYYY-MM-DD'}), 400
+
+    projects = query.with_entities(Project.id, Project.name).order_by(Project.start_date, Project.id).all()
+    if not projects:
+        return jsonify({'error': 'No projects match the filter'}), 404
+
+    unterweisungen = db.session.query(Unterweisung.id, Unterweisung.project_id).filter(
+        Unterweisung.project_id.in_([project.id for project in projects])
+    ).order_by(Unterweisung.id).all()
+    unterweisung_ids = {}
+    for unterweisung_id, project_id in unterweisungen:
+        unterweisung_ids.setdefault(project_id, []).append(unterweisung_id)
+
+    def items():
+        """Load documents one at a time, only as render_many has room for them"""
+        for project in projects:
+            folder = f'{project.id}_{project.name}'
+            sources = [('gbu', project.id), ('participants', project.id)]
+            sources += [('unterweisung', unterweisung_id) for unterweisung_id in unterweisung_ids.get(project.id, [])]
+            for kind, object_id in sources:
+                document = load_document(kind, object_id)
+                # Skip documents whose source was deleted since the listing
+                if document:
+                    yield folder, document
+
+    entries = get_pdf_jobs().render_many(items())
+    filename = f'GBU_Export_{datetime.now().strftime("%Y%m%d_%H%M")}.zip'
+
+    # Documents load while the archive streams, which needs the request's app context
+    return Response(
+        stream_with_context(stream_zip(entries)),
+        mimetype='application/zip',
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+    )
+
+@pdf_bp.route('/cache/stats', methods=['GET'])
+@admin_required
+def get_cache_stats():
+    """Get PDF render cache statistics (admin only)"""
+    return jsonify(get_pdf_cache().stats()), 200
 
-    # Generate PDF
-    pdf_gen = PDFGenerator()
-    pdf_path = pdf_gen.generate_unterweisung(unterweisung, project)
+def _document_project_id(kind, object_id):
+    """Project a document belongs to, None if its source does not exist"""
+    if kind == 'unterweisung':
+        return db.session.query(Unterweisung.project_id).filter(Unterweisung.id == object_id).scalar()
+    return object_id
 
-    return send_file(pdf_path, as_attachment=True, download_name=f'Unterweisung_{project.name if project else unterweisung_id}.pdf')
+def _job_dict(job):
+    return {
+        'id': job['id'],
+        'kind': job['kind'],
+        'filename': job['filename'],
+        'status': job['status'],
+        'error': job['error'],
+        'created_at': job['created_at'],
+        'finished_at': job['finished_at'],
+    }
@@ -1,59 +1,162 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from models import db, Project, ProjectAssignment, User, AuditLog
-from datetime import datetime
+from signals import notify_project_content_changed
+from utils.auth import current_role
+from utils.access import (
+    accessible_projects_filter, invalidate_project_access, project_access_denied, project_access_required
+)
+from utils.risk_summary import load_risk_summaries
+from sqlalchemy import and_, func, or_
+from datetime import date, datetime
+import base64
+import json
 
 projects_bp = Blueprint('projects', __name__)
 
+# Sort keys of the project list, each paired with id for the cursor
+PROJECT_SORT_KEYS = {
+    'id': Project.id,
+    'name': Project.name,
+    'start_date': Project.start_date,
+    'created_at': Project.created_at,
+}
+
+# Enum columns filterable by a comma separated list of values
+PROJECT_ENUM_FILTERS = {
+    'status': Project.status,
+    'season': Project.season,
+    'indoor_outdoor': Project.indoor_outdoor,
+}
+
+PROJECT_PAGE_SIZE = 100
+PROJECT_MAX_PAGE_SIZE = 500
+
 @projects_bp.route('/', methods=['GET'])
 @jwt_required()
 def get_projects():
-    """Get all projects accessible to the current user"""
-    current_user_id = get_jwt_identity()
-    user = User.query.get(current_user_id)
-
-    if user.role == 'admin':
-        # Admin sees all projects
-        projects = Project.query.all()
+    """Get the accessible projects, filtered, sorted and paginated by cursor
+
+    Filters are ?status=, ?season=, ?indoor_outdoor=, ?from=/?to= for projects
+    overlapping a date range and ?name= for a name prefix. The first page
+    carries X-Total-Count, every page but the last an X-Next-Cursor for ?after=.
+    """
+    query, error = _filtered_projects(Project.query)
+    if error:
+        return error
+
+    sort = request.args.get('sort', 'id')
+    descending = sort.startswith('-')
+    column = PROJECT_SORT_KEYS.get(sort.lstrip('-'))
+    if column is None:
+        return jsonify({'error': f'Sort must be one of {", ".join(PROJECT_SORT_KEYS)}, prefix - for descending'}), 400
+
+    try:
+        limit = min(int(request.args.get('limit', PROJECT_PAGE_SIZE)), PROJECT_MAX_PAGE_SIZE)
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+    if limit < 1:
+        return jsonify({'error': 'limit must be positive'}), 400
+
+    headers = {}
+    if 'after' in request.args:
+        after = _decode_cursor(request.args['after'], column)
+        if after is None:
+            return jsonify({'error': 'after must be the X-Next-Cursor of the previous page'}), 400
+        query = query.filter(_after_cursor(column, descending, *after))
     else:
-        # Users see only assigned projects or projects they created
-        projects = Project.query.join(ProjectAssignment).filter(
-            (ProjectAssignment.user_id == current_user_id) | (Project.created_by == current_user_id)
-        ).distinct().all()
+        # Counted on the filter indexes without loading rows, once per listing
+        headers['X-Total-Count'] = str(query.with_entities(func.count(Project.id)).order_by(None).scalar())
 
-    return jsonify([project.to_dict() for project in projects]), 200
+    order = [column] if column is Project.id else [column, Project.id]
+    projects = query.order_by(*(key.desc() if descending else key for key in order)).limit(limit + 1).all()
+    if len(projects) > limit:
+        projects = projects[:limit]
+        headers['X-Next-Cursor'] = _encode_cursor(getattr(projects[-1], column.key), projects[-1].id)
 
-@projects_bp.route('/<int:project_id>', methods=['GET'])
+    return jsonify([project.to_dict() for project in projects]), 200, headers
+
+@projects_bp.route('/status-counts', methods=['GET'])
 @jwt_required()
+def get_project_status_counts():
+    """Count the accessible projects per status in one grouped query, same filters as the list"""
+    query, error = _filtered_projects(db.session.query(Project.status, func.count(Project.id)))
+    if error:
+        return error
+
+    counts = {status: 0 for status in Project.status.type.enums}
+    counts.update(query.group_by(Project.status))
+    return jsonify({'total': sum(counts.values()), 'status': counts}), 200
+
+@projects_bp.route('/<int:project_id>', methods=['GET'])
+@project_access_required
 def get_project(project_id):
     """Get project by ID"""
-    current_user_id = get_jwt_identity()
-    user = User.query.get(current_user_id)
     project = Project.query.get(project_id)
 
     if not project:
         return jsonify({'error': 'Project not found'}), 404
 
-    # Check access
-    if user.role != 'admin' and project.created_by != current_user_id:
-        assignment = ProjectAssignment.query.filter_by(
-            project_id=project_id,
-            user_id=current_user_id
-        ).first()
-        if not assignment:
-            return jsonify({'error': 'Access denied'}), 403
-
     return jsonify(project.to_dict()), 200
 
+@projects_bp.route('/<int:project_id>/risk-summary', methods=['GET'])
+@project_access_required
+def get_project_risk_summary(project_id):
+    """Get risk counts and open mängel of a project, in total and per Bereich"""
+    if not db.session.query(Project.id).filter(Project.id == project_id).first():
+        return jsonify({'error': 'Project not found'}), 404
+
+    return jsonify(load_risk_summaries([project_id])[project_id]), 200
+
+@projects_bp.route('/risk-summary', methods=['GET'])
+@jwt_required()
+def get_risk_summaries():
+    """Get risk summaries of the accessible projects, optionally only ?ids=1,2,3
+
+    Paged by project id with ?limit= and ?after=, every page but the last
+    carries an X-Next-Cursor. ?ids= takes at most PROJECT_MAX_PAGE_SIZE ids.
+    """
+    query = db.session.query(Project.id)
+    access_filter = accessible_projects_filter(Project.id)
+    if access_filter is not None:
+        query = query.filter(access_filter)
+
+    try:
+        limit = min(int(request.args.get('limit', PROJECT_PAGE_SIZE)), PROJECT_MAX_PAGE_SIZE)
+        after = int(request.args['after']) if 'after' in request.args else None
+    except ValueError:
+        return jsonify({'error': 'limit and after must be integers'}), 400
+    if limit < 1:
+        return jsonify({'error': 'limit must be positive'}), 400
+
+    if request.args.get('ids'):
+        try:
+            ids = {int(project_id) for project_id in request.args['ids'].split(',')}
+        except ValueError:
+            return jsonify({'error': 'ids must be a comma separated list of integers'}), 400
+        if len(ids) > PROJECT_MAX_PAGE_SIZE:
+            return jsonify({'error': f'At most {PROJECT_MAX_PAGE_SIZE} ids per request'}), 400
+        query = query.filter(Project.id.in_(ids))
+    if after is not None:
+        query = query.filter(Project.id > after)
+
+    project_ids = [row.id for row in query.order_by(Project.id).limit(limit + 1)]
+    headers = {}
+    if len(project_ids) > limit:
+        project_ids = project_ids[:limit]
+        headers['X-Next-Cursor'] = str(project_ids[-1])
+
+    return jsonify(list(load_risk_summaries(project_ids).values())), 200, headers
+
 @projects_bp.route('/', methods=['POST'])
 @jwt_required()
 def create_project():
     """Create a new project"""
     current_user_id = get_jwt_identity()
-    user = User.query.get(current_user_id)
+    role = current_role()
 
     # Only admin, projektleiter, and technischer_leiter can create projects
-    if user.role not in ['admin', 'projektleiter', 'technischer_leiter']:
+    if role not in ['admin', 'projektleiter', 'technischer_leiter']:
         return jsonify({'error': 'Insufficient permissions'}), 403
 
     data = request.get_json()
@@ -90,6 +193,7 @@ def create_project():
 
     db.session.add(project)
     db.session.commit()
+    invalidate_project_access(current_user_id)
 
     # Log the creation
     log = AuditLog(
@@ -110,14 +214,18 @@ def create_project():
 def update_project(project_id):
     """Update project"""
     current_user_id = get_jwt_identity()
-    user = User.query.get(current_user_id)
+    role = current_role()
     project = Project.query.get(project_id)
 
     if not project:
         return jsonify({'error': 'Project not found'}), 404
 
+    denied = project_access_denied(project_id)
+    if denied:
+        return denied
+
     # Only admin, creator, or projektleiter/technischer_leiter can update
-    if user.role not in ['admin', 'projektleiter', 'technischer_leiter'] and project.created_by != current_user_id:
+    if role not in ['admin', 'projektleiter', 'technischer_leiter'] and project.created_by != current_user_id:
         return jsonify({'error': 'Insufficient permissions'}), 403
 
     data = request.get_json()
@@ -143,6 +251,7 @@ def update_project(project_id):
         project.status = data['status']
 
     db.session.commit()
+    notify_project_content_changed(project.id)
 
     # Log the update
     log = AuditLog(
@@ -163,14 +272,14 @@ def update_project(project_id):
 def delete_project(project_id):
     """Delete project"""
     current_user_id = get_jwt_identity()
-    user = User.query.get(current_user_id)
+    role = current_role()
     project = Project.query.get(project_id)
 
     if not project:
         return jsonify({'error': 'Project not found'}), 404
 
     # Only admin can delete
-    if user.role != 'admin':
+    if role != 'admin':
         return jsonify({'error': 'Admin access required'}), 403
 
     # Log the deletion before deleting
@@ -194,14 +303,18 @@ def delete_project(project_id):
 def assign_user_to_project(project_id):
     """Assign a user to a project"""
     current_user_id = get_jwt_identity()
-    user = User.query.get(current_user_id)
+    role = current_role()
     project = Project.query.get(project_id)
 
     if not project:
         return jsonify({'error': 'Project not found'}), 404
 
+    denied = project_access_denied(project_id)
+    if denied:
+        return denied
+
     # Only admin, projektleiter, and technischer_leiter can assign users
-    if user.role not in ['admin', 'projektleiter', 'technischer_leiter']:
+    if role not in ['admin', 'projektleiter', 'technischer_leiter']:
         return jsonify({'error': 'Insufficient permissions'}), 403
 
     data = request.get_json()
@@ -229,6 +342,7 @@ def assign_user_to_project(project_id):
 
     db.session.add(assignment)
     db.session.commit()
+    invalidate_project_access(assignment.user_id)
 
     # Log the assignment
     log = AuditLog(
@@ -245,7 +359,7 @@ def assign_user_to_project(project_id):
     return jsonify(assignment.to_dict()), 201
 
 @projects_bp.route('/<int:project_id>/assignments', methods=['GET'])
-@jwt_required()
+@project_access_required
 def get_project_assignments(project_id):
     """Get all users assigned to a project"""
     project = Project.query.get(project_id)
@@ -268,12 +382,16 @@ def get_project_assignments(project_id):
 def unassign_user_from_project(project_id, user_id):
     """Remove a user from a project"""
     current_user_id = get_jwt_identity()
-    user = User.query.get(current_user_id)
+    role = current_role()
 
     # Only admin, projektleiter, and technischer_leiter can unassign users
-    if user.role not in ['admin', 'projektleiter', 'technischer_leiter']:
+    if role not in ['admin', 'projektleiter', 'technischer_leiter']:
         return jsonify({'error': 'Insufficient permissions'}), 403
 
+    denied = project_access_denied(project_id)
+    if denied:
+        return denied
+
     assignment = ProjectAssignment.query.filter_by(
         project_id=project_id,
         user_id=user_id
@@ -284,5 +402,76 @@ def unassign_user_from_project(project_id, user_id):
 
     db.session.delete(assignment)
     db.session.commit()
+    invalidate_project_access(user_id)
 
     return jsonify({'message': 'User unassigned successfully'}), 200
+
+def _filtered_projects(query):
+    """Restrict a project query to the accessible projects and the filters of the query string
+
+    Returns the query and None, or None and an error response. Enum filters
+    use idx_status and idx_season, the date range idx_dates and the name
+    prefix idx_name.
+    """
+    access_filter = accessible_projects_filter(Project.id)
+    if access_filter is not None:
+        # Users see only assigned projects or projects they created
+        query = query.filter(access_filter)
+
+    for name, column in PROJECT_ENUM_FILTERS.items():
+        if not request.args.get(name):
+            continue
+        values = request.args[name].split(',')
+        unknown = [value for value in values if value not in column.type.enums]
+        if unknown:
+            return None, (jsonify({'error': f'Unknown {name}: {", ".join(unknown)}',
+                                   name: list(column.type.enums)}), 400)
+        query = query.filter(column.in_(values))
+
+    try:
+        date_from = date.fromisoformat(request.args['from']) if request.args.get('from') else None
+        date_to = date.fromisoformat(request.args['to']) if request.args.get('to') else None
+    except ValueError:
+        return None, (jsonify({'error': 'from and to must be dates as YYYY-MM-DD'}), 400)
+    # Projects overlapping the range, a project without end_date lasts its start day
+    if date_to:
+        query = query.filter(Project.start_date <= date_to)
+    if date_from:
+        query = query.filter(func.coalesce(Project.end_date, Project.start_date) >= date_from)
+
+    name = request.args.get('name')
+    if name:
+        query = query.filter(Project.name.startswith(name, autoescape=True))
+
+    return query, None
+
+def _encode_cursor(value, project_id):
+    """Opaque cursor of the sort value and id of a page's last project"""
+    if isinstance(value, date):
+        value = value.isoformat()
+    return base64.urlsafe_b64encode(json.dumps([value, project_id]).encode('utf-8')).decode('ascii')
+
+def _decode_cursor(cursor, column):
+    """The sort value and id of a cursor for this sort column, None if malformed"""
+    try:
+        value, project_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        if value is not None:
+            python_type = column.type.python_type
+            value = python_type.fromisoformat(value) if issubclass(python_type, date) else python_type(value)
+        return value, int(project_id)
+    except (ValueError, TypeError, UnicodeError):
+        return None
+
+def _after_cursor(column, descending, value, project_id):
+    """Rows after the cursor in (column, id) order
+
+    MySQL and SQLite sort NULL below every value, so NULL sort values come
+    first in ascending and last in descending order.
+    """
+    if descending:
+        if value is None:
+            return and_(column.is_(None), Project.id < project_id)
+        return or_(column < value, and_(column == value, Project.id < project_id), column.is_(None))
+    if value is None:
+        return or_(column.isnot(None), Project.id > project_id)
+    return or_(column > value, and_(column == value, Project.id > project_id))
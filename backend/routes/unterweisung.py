@@ -1,11 +1,13 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from models import db, Unterweisung, UnterweisungItem, Project, User, AuditLog
+from signals import notify_project_content_changed
+from utils.access import project_access_denied, project_access_required
 
 unterweisung_bp = Blueprint('unterweisung', __name__)
 
 @unterweisung_bp.route('/project/<int:project_id>', methods=['GET'])
-@jwt_required()
+@project_access_required
 def get_project_unterweisungen(project_id):
     """Get all unterweisungen for a project"""
     project = Project.query.get(project_id)
@@ -29,6 +31,10 @@ def get_unterweisung(unterweisung_id):
     if not unterweisung:
         return jsonify({'error': 'Unterweisung not found'}), 404
 
+    denied = project_access_denied(unterweisung.project_id)
+    if denied:
+        return denied
+
     u_dict = unterweisung.to_dict()
     u_dict['items'] = [item.to_dict() for item in unterweisung.items]
 
@@ -44,6 +50,10 @@ def create_unterweisung():
     if not data or not data.get('project_id'):
         return jsonify({'error': 'Project ID required'}), 400
 
+    denied = project_access_denied(data['project_id'])
+    if denied:
+        return denied
+
     project = Project.query.get(data['project_id'])
     if not project:
         return jsonify({'error': 'Project not found'}), 404
@@ -89,6 +99,7 @@ def create_unterweisung():
     )
     db.session.add(log)
     db.session.commit()
+    notify_project_content_changed(unterweisung.project_id)
 
     u_dict = unterweisung.to_dict()
     u_dict['items'] = [item.to_dict() for item in unterweisung.items]
@@ -105,6 +116,10 @@ def update_unterweisung(unterweisung_id):
     if not unterweisung:
         return jsonify({'error': 'Unterweisung not found'}), 404
 
+    denied = project_access_denied(unterweisung.project_id)
+    if denied:
+        return denied
+
     data = request.get_json()
 
     if 'title' in data:
@@ -141,6 +156,7 @@ def update_unterweisung(unterweisung_id):
             db.session.add(item)
 
     db.session.commit()
+    notify_project_content_changed(unterweisung.project_id)
 
     u_dict = unterweisung.to_dict()
     u_dict['items'] = [item.to_dict() for item in unterweisung.items]
@@ -155,13 +171,19 @@ def delete_unterweisung(unterweisung_id):
     if not unterweisung:
         return jsonify({'error': 'Unterweisung not found'}), 404
 
+    denied = project_access_denied(unterweisung.project_id)
+    if denied:
+        return denied
+
+    project_id = unterweisung.project_id
     db.session.delete(unterweisung)
     db.session.commit()
+    notify_project_content_changed(project_id)
 
     return jsonify({'message': 'Unterweisung deleted successfully'}), 200
 
 @unterweisung_bp.route('/project/<int:project_id>/generate', methods=['POST'])
-@jwt_required()
+@project_access_required
 def generate_unterweisung(project_id):
     """Auto-generate unterweisung from project gefaehrdungen"""
     current_user_id = get_jwt_identity()
@@ -209,6 +231,7 @@ def generate_unterweisung(project_id):
         db.session.add(item)
 
     db.session.commit()
+    notify_project_content_changed(project_id)
 
     u_dict = unterweisung.to_dict()
     u_dict['items'] = [item.to_dict() for item in unterweisung.items]
@@ -1,6 +1,8 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from models import db, User, AuditLog
+from utils.access import invalidate_project_access
+from utils.auth import current_role, revoke_stale_role, revoke_user_tokens
 from functools import wraps
 
 users_bp = Blueprint('users', __name__)
@@ -10,9 +12,7 @@ def admin_required(fn):
     @wraps(fn)
     @jwt_required()
     def wrapper(*args, **kwargs):
-        current_user_id = get_jwt_identity()
-        user = User.query.get(current_user_id)
-        if not user or user.role != 'admin':
+        if current_role() != 'admin':
             return jsonify({'error': 'Admin access required'}), 403
         return fn(*args, **kwargs)
     return wrapper
@@ -99,6 +99,9 @@ def update_user(user_id):
             return jsonify({'error': 'Email already exists'}), 409
         user.email = data['email']
 
+    role_changed = 'role' in data and data['role'] != user.role
+    deactivated = 'active' in data and user.active and not data['active']
+
     if 'role' in data:
         valid_roles = ['admin', 'bereichsleiter', 'technischer_leiter', 'projektleiter', 'user']
         if data['role'] not in valid_roles:
@@ -115,6 +118,13 @@ def update_user(user_id):
         user.active = data['active']
 
     db.session.commit()
+    if 'role' in data:
+        invalidate_project_access(user.id)
+    if deactivated:
+        revoke_user_tokens(user.id)
+    elif role_changed:
+        # Clients refresh to a token with the new role
+        revoke_stale_role(user.id, user.role)
 
     # Log the update
     current_user_id = get_jwt_identity()
@@ -146,6 +156,7 @@ def delete_user(user_id):
 
     user.active = False
     db.session.commit()
+    revoke_user_tokens(user.id)
 
     # Log the deactivation
     log = AuditLog(
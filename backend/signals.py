@@ -0,0 +1,11 @@
+from blinker import Namespace
+from flask import current_app
+
+_signals = Namespace()
+
+# Sent with project_id whenever data printed in a project's PDFs changes
+project_content_changed = _signals.signal('project-content-changed')
+
+
+def notify_project_content_changed(project_id):
+    project_content_changed.send(current_app._get_current_object(), project_id=project_id)
@@ -0,0 +1,92 @@
+from contextlib import contextmanager
+import pytest
+from flask_jwt_extended import create_access_token
+from sqlalchemy import event
+from app import create_app
+from config import config
+from models import db, User, Project, GBUTemplate, Gefaehrdung, ProjectGBU
+from utils.gbu_data import snapshot_template
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    """The app on TestingConfig's in-memory database, with its folders in a temp directory"""
+    for name in ('UPLOAD_FOLDER', 'PDF_FOLDER', 'RESPONSE_CACHE_FOLDER'):
+        monkeypatch.setattr(config['testing'], name, str(tmp_path / name.lower()))
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def admin(app):
+    user = User(username='admin', email='admin@example.com', role='admin')
+    user.set_password('admin')
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+
+@pytest.fixture
+def admin_headers(admin):
+    return {'Authorization': f'Bearer {create_access_token(identity=str(admin.id), additional_claims={"role": "admin"})}'}
+
+
+@pytest.fixture
+def project(admin):
+    project = Project(name='Stadtfest', status='aktiv', created_by=admin.id)
+    db.session.add(project)
+    db.session.commit()
+    return project
+
+
+@pytest.fixture
+def make_template(admin):
+    """Factory for a template with one gefaehrdung per tätigkeit, overlaid on project if given
+
+    Returns the template, its rows and the project link or None.
+    """
+    def make(name, tätigkeiten, project=None, bereich_id=None):
+        template = GBUTemplate(name=name, created_by=admin.id)
+        db.session.add(template)
+        db.session.flush()
+        rows = [
+            Gefaehrdung(gbu_template_id=template.id, bereich_id=bereich_id, tätigkeit=tätigkeit,
+                        schadenschwere=2, wahrscheinlichkeit=2, risikobewertung='mittel', sort_order=index)
+            for index, tätigkeit in enumerate(tätigkeiten)
+        ]
+        db.session.add_all(rows)
+        link = None
+        if project is not None:
+            link = ProjectGBU(project_id=project.id, gbu_template_id=template.id, added_by=admin.id,
+                              template_version=snapshot_template(template.id))
+            db.session.add(link)
+        db.session.commit()
+        return template, rows, link
+    return make
+
+
+@pytest.fixture
+def count_queries(app):
+    """Context manager collecting the SQL statements run inside it"""
+    @contextmanager
+    def counter():
+        statements = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(db.engine, 'before_cursor_execute', record)
+        try:
+            yield statements
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', record)
+    return counter
@@ -0,0 +1,170 @@
+from flask_jwt_extended import create_access_token
+from models import db, Gefaehrdung, ProjectAssignment, ProjectGBUOverride, SyncSequence, User
+from utils.pdf_generator import PDFGenerator
+from utils.report_data import NO_BEREICH, load_gefaehrdungen_by_bereich
+
+
+def _get_project_gbus(client, headers, count_queries, project_id):
+    db.session.expire_all()
+    with count_queries() as statements:
+        response = client.get(f'/api/gbu/project/{project_id}/gbus', headers=headers)
+    assert response.status_code == 200
+    return response.json, len(statements)
+
+
+def test_project_gbus_query_count_does_not_grow_with_templates(client, admin_headers, project, make_template,
+                                                               count_queries):
+    project_id = project.id
+    db.session.add_all([Gefaehrdung(project_id=project_id, tätigkeit=f'Eigene {index}') for index in range(3)])
+    _, rows, link = make_template('Vorlage 0', ['Aufbau', 'Abbau', 'Transport'], project)
+    db.session.add(ProjectGBUOverride(project_gbu_id=link.id, gefaehrdung_id=rows[0].id,
+                                      overrides={'tätigkeit': 'Aufbau Tag 1'}))
+    db.session.commit()
+
+    # Builds the cached access set of the user, later requests check it without a query
+    client.get(f'/api/gbu/project/{project_id}/gbus', headers=admin_headers)
+    data, single_template_queries = _get_project_gbus(client, admin_headers, count_queries, project_id)
+    assert len(data['templates']) == 1
+
+    for index in range(1, 15):
+        _, rows, link = make_template(f'Vorlage {index}', [f'Tätigkeit {index}.{row}' for row in range(4)], project)
+        db.session.add(ProjectGBUOverride(project_gbu_id=link.id, gefaehrdung_id=rows[1].id, overrides={}, removed=True))
+    db.session.commit()
+
+    data, queries = _get_project_gbus(client, admin_headers, count_queries, project_id)
+
+    # Watermark, project check, links, template rows, overrides, project rows
+    assert queries == single_template_queries == 6
+    assert len(data['templates']) == 15
+    assert sum(len(template['gefaehrdungen']) for template in data['templates']) == 3 + 14 * 3
+    assert data['templates'][0]['gefaehrdungen'][0]['tätigkeit'] == 'Aufbau Tag 1'
+    assert len(data['project_gefaehrdungen']) == 3
+
+
+def test_listing_cursor_round_trips_rows_without_bereich(client, admin_headers, project):
+    project_id = project.id
+    response = client.post('/api/gbu/gefaehrdungen/batch', headers=admin_headers, json={'operations': [
+        {'op': 'create', 'data': {'project_id': project_id, 'tätigkeit': f'Eigene {index}', 'sort_order': None}}
+        for index in range(3)
+    ]})
+    assert response.status_code == 200
+
+    ids, after = [], None
+    while True:
+        response = client.get(f'/api/gbu/project/{project_id}/gefaehrdungen?limit=2&fields=tätigkeit'
+                              + (f'&after={after}' if after else ''), headers=admin_headers)
+        assert response.status_code == 200
+        ids += [row['id'] for row in response.json]
+        after = response.headers.get('X-Next-Cursor')
+        if not after:
+            break
+        assert after.startswith(',')
+
+    assert ids == sorted(ids) and len(ids) == 3
+
+
+def test_template_edits_show_in_a_project_only_after_rebase(client, admin_headers, project, make_template):
+    project_id = project.id
+    template, rows, _ = make_template('Bühnenbau', ['Aufbau', 'Abbau'])
+    template_id, row_ids = template.id, [row.id for row in rows]
+    response = client.post(f'/api/gbu/project/{project_id}/add-template', headers=admin_headers,
+                           json={'template_id': template_id})
+    assert response.status_code == 201
+    project_gbu_id = response.json['id']
+    client.put(f'/api/gbu/project-gbus/{project_gbu_id}/gefaehrdungen/{row_ids[1]}', headers=admin_headers,
+               json={'massnahmen': 'Absperren'})
+
+    assert client.put(f'/api/gbu/gefaehrdungen/{row_ids[0]}', headers=admin_headers,
+                      json={'tätigkeit': 'Aufbau neu', 'schadenschwere': 3, 'wahrscheinlichkeit': 3}).status_code == 200
+    assert client.delete(f'/api/gbu/gefaehrdungen/{row_ids[1]}', headers=admin_headers).status_code == 200
+    watermark = client.get(f'/api/gbu/project/{project_id}/gbus', headers=admin_headers).json['watermark']
+
+    def project_view():
+        data = client.get(f'/api/gbu/project/{project_id}/gbus', headers=admin_headers).json
+        listing = client.get(f'/api/gbu/project/{project_id}/gefaehrdungen?fields=tätigkeit,massnahmen',
+                             headers=admin_headers).json
+        summary = client.get(f'/api/projects/{project_id}/risk-summary', headers=admin_headers).json
+        rows = data['templates'][0]['gefaehrdungen']
+        assert [(row['id'], row['tätigkeit'], row['massnahmen']) for row in rows] \
+            == [(row['id'], row['tätigkeit'], row['massnahmen']) for row in listing]
+        return data['templates'][0]['outdated'], rows, summary['totals']['risikobewertung']
+
+    # The project keeps the version it added, including its override of the row deleted since
+    outdated, rows, ratings = project_view()
+    assert outdated
+    assert [(row['tätigkeit'], row['massnahmen']) for row in rows] == [('Aufbau', None), ('Abbau', 'Absperren')]
+    assert ratings['mittel'] == 2 and ratings['hoch'] == 0
+    report = load_gefaehrdungen_by_bereich(project_id, PDFGenerator.GEFAEHRDUNG_COLUMNS)
+    assert [row.tätigkeit for row in report[NO_BEREICH]] == ['Aufbau', 'Abbau']
+    assert client.get(f'/api/gbu/project/{project_id}/gbus?since={watermark}',
+                      headers=admin_headers).json['gefaehrdungen'] == []
+
+    assert client.post(f'/api/gbu/project-gbus/{project_gbu_id}/rebase', headers=admin_headers).status_code == 200
+
+    outdated, rows, ratings = project_view()
+    assert not outdated
+    assert [row['tätigkeit'] for row in rows] == ['Aufbau neu']
+    assert ratings['mittel'] == 0 and ratings['hoch'] == 1
+    changes = client.get(f'/api/gbu/project/{project_id}/gbus?since={watermark}', headers=admin_headers).json
+    assert [row['tätigkeit'] for row in changes['gefaehrdungen']] == ['Aufbau neu']
+    assert changes['deleted'] == [row_ids[1]]
+    assert ProjectGBUOverride.query.filter_by(project_gbu_id=project_gbu_id).count() == 0
+
+
+def test_project_users_change_template_rows_only_through_overrides(client, admin, project, make_template):
+    user = User(username='pl', email='pl@example.com', role='projektleiter')
+    user.set_password('pl')
+    db.session.add(user)
+    db.session.flush()
+    db.session.add(ProjectAssignment(project_id=project.id, user_id=user.id, assigned_by=admin.id))
+    db.session.commit()
+    headers = {'Authorization': f'Bearer {create_access_token(identity=str(user.id), additional_claims={"role": user.role})}'}
+    _, rows, link = make_template('Bühnenbau', ['Aufbau'], project)
+    row_id, link_id, template_id = rows[0].id, link.id, link.gbu_template_id
+
+    assert client.put(f'/api/gbu/gefaehrdungen/{row_id}', headers=headers, json={'tätigkeit': 'X'}).status_code == 403
+    assert client.delete(f'/api/gbu/gefaehrdungen/{row_id}', headers=headers).status_code == 403
+    assert client.post('/api/gbu/gefaehrdungen', headers=headers,
+                       json={'gbu_template_id': template_id, 'tätigkeit': 'X'}).status_code == 403
+    assert client.post('/api/gbu/gefaehrdungen/batch', headers=headers, json={'operations': [
+        {'op': 'update', 'id': row_id, 'data': {'tätigkeit': 'X'}}
+    ]}).status_code == 403
+    assert db.session.get(Gefaehrdung, row_id).tätigkeit == 'Aufbau'
+
+    response = client.put(f'/api/gbu/project-gbus/{link_id}/gefaehrdungen/{row_id}', headers=headers,
+                          json={'tätigkeit': 'Aufbau Tag 1'})
+    assert response.status_code == 200 and response.json['tätigkeit'] == 'Aufbau Tag 1'
+
+
+def test_batch_rejects_operation_data_that_is_not_an_object(client, admin_headers, project):
+    for data in ([1], 'x'):
+        response = client.post('/api/gbu/gefaehrdungen/batch', headers=admin_headers,
+                               json={'operations': [{'op': 'update', 'id': 1, 'data': data}]})
+        assert response.status_code == 400
+        assert response.json['error'] == 'Operation 0: data must be an object'
+
+
+def test_reorder_rejects_overlaid_template_rows(client, admin_headers, project, make_template):
+    project_id = project.id
+    own = Gefaehrdung(project_id=project_id, tätigkeit='Eigene')
+    db.session.add(own)
+    _, rows, _ = make_template('Bühnenbau', ['Aufbau'], project)
+    db.session.commit()
+    own_id, template_row_id = own.id, rows[0].id
+
+    response = client.post(f'/api/gbu/project/{project_id}/reorder', headers=admin_headers,
+                           json={'bereich_id': None, 'ids': [template_row_id, own_id]})
+    assert response.status_code == 400
+    assert response.json['template_ids'] == [template_row_id]
+
+    response = client.post(f'/api/gbu/project/{project_id}/reorder', headers=admin_headers,
+                           json={'bereich_id': None, 'ids': [own_id]})
+    assert response.status_code == 200
+
+
+def test_sync_sequence_row_comes_with_the_table(client, admin_headers, project):
+    assert SyncSequence.query.count() == 1
+    response = client.post('/api/gbu/gefaehrdungen', headers=admin_headers,
+                           json={'project_id': project.id, 'tätigkeit': 'Aufbau'})
+    assert response.status_code == 201
+    assert db.session.get(SyncSequence, 1).value == 1
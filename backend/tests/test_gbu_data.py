@@ -0,0 +1,100 @@
+import pytest
+from sqlalchemy import event
+from models import db, Bereich, Gefaehrdung, ProjectGBUOverride
+from utils.gbu_data import copy_template_gefaehrdungen, load_gefaehrdungen_page, template_gefaehrdungen_changed
+from utils.risk import reclassify_all
+
+
+@pytest.mark.parametrize('insert_returning', [True, False])
+def test_copy_returns_only_the_copied_rows(app, project, make_template, monkeypatch, insert_returning):
+    monkeypatch.setattr(db.session.get_bind().dialect, 'insert_returning', insert_returning)
+    template, rows, _ = make_template('Bühnenbau', ['Aufbau', 'Abbau', 'Transport'])
+    make_template('Strom', ['Verkabelung'])
+    own = Gefaehrdung(project_id=project.id, tätigkeit='Eigene')
+    db.session.add(own)
+    db.session.commit()
+
+    copied_ids = copy_template_gefaehrdungen(project.id, [template.id])
+
+    copied = Gefaehrdung.query.filter(Gefaehrdung.id.in_(copied_ids)).order_by(Gefaehrdung.id).all()
+    assert [g.tätigkeit for g in copied] == ['Aufbau', 'Abbau', 'Transport']
+    assert all(g.project_id == project.id and g.gbu_template_id is None for g in copied)
+    assert own.id not in copied_ids
+
+
+def _page_through(limit, **scope):
+    ids, after = [], None
+    while True:
+        page, after = load_gefaehrdungen_page(['tätigkeit'], limit, after, **scope)
+        ids += [row['id'] for row in page]
+        if after is None:
+            return ids
+
+
+def test_listing_pages_follow_bereich_sort_order_and_id(app, project, make_template):
+    bühne, catering = Bereich(name='Bühne'), Bereich(name='Catering')
+    db.session.add_all([bühne, catering])
+    db.session.flush()
+    own = [
+        Gefaehrdung(project_id=project.id, bereich_id=catering.id, tätigkeit='Ausschank', sort_order=1),
+        Gefaehrdung(project_id=project.id, tätigkeit='Ohne Bereich', sort_order=5),
+        Gefaehrdung(project_id=project.id, bereich_id=bühne.id, tätigkeit='Rigging', sort_order=2),
+        Gefaehrdung(project_id=project.id, tätigkeit='Auch ohne Bereich', sort_order=5),
+    ]
+    db.session.add_all(own)
+    _, rows, link = make_template('Bühnenbau', ['Aufbau', 'Abbau', 'Transport', 'Lager'], project, bühne.id)
+    db.session.add(ProjectGBUOverride(project_gbu_id=link.id, gefaehrdung_id=rows[2].id, overrides={}, removed=True))
+    db.session.commit()
+
+    expected = [own[1].id, own[3].id, rows[0].id, rows[1].id, own[2].id, rows[3].id, own[0].id]
+    for limit in (1, 2, 3, 100):
+        assert _page_through(limit, project_id=project.id) == expected
+    assert _page_through(2, template_id=link.gbu_template_id) == [row.id for row in rows]
+
+
+def test_listing_queries_are_served_by_the_listing_indexes(app, project, make_template):
+    _, _, link = make_template('Bühnenbau', ['Aufbau', 'Abbau'], project)
+    db.session.add(Gefaehrdung(project_id=project.id, tätigkeit='Eigene'))
+    db.session.commit()
+    project_id, template_id = project.id, link.gbu_template_id
+
+    plans = []
+
+    def explain(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT'):
+            plans.append(' '.join(row[-1] for row in conn.exec_driver_sql(f'EXPLAIN QUERY PLAN {statement}',
+                                                                           parameters)))
+
+    event.listen(db.engine, 'before_cursor_execute', explain)
+    try:
+        load_gefaehrdungen_page(['tätigkeit'], 10, (None, 0, 0), project_id=project_id)
+        load_gefaehrdungen_page(['tätigkeit'], 10, (None, 0, 0), template_id=template_id)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', explain)
+
+    # Pinned links, own rows, overlaid rows, then the template listing
+    _, own_rows, _, template_rows = plans
+    assert 'idx_project_listing' in own_rows and 'TEMP B-TREE' not in own_rows
+    assert 'idx_template_listing' in template_rows and 'TEMP B-TREE' not in template_rows
+
+
+def test_reclassify_rates_overrides_of_pinned_links_against_their_snapshot(app, project, make_template):
+    template, rows, link = make_template('Bühnenbau', ['Aufbau', 'Abbau'], project)
+    overrides = [
+        ProjectGBUOverride(project_gbu_id=link.id, gefaehrdung_id=row.id,
+                           overrides={'wahrscheinlichkeit': 1, 'risikobewertung': 'niedrig'})
+        for row in rows
+    ]
+    db.session.add_all(overrides)
+    # Edited and deleted after the project pinned its version
+    rows[0].schadenschwere = 4
+    db.session.delete(rows[1])
+    template_gefaehrdungen_changed([template.id])
+    db.session.commit()
+
+    app.config['RISK_MATRIX'] = [[1, 'niedrig'], [2, 'mittel'], [None, 'hoch']]
+    list(reclassify_all())
+
+    db.session.expire_all()
+    # 2 x 1 from the snapshot row, which itself is now rated hoch
+    assert [override.overrides['risikobewertung'] for override in overrides] == ['mittel', 'mittel']
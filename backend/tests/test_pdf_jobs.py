@@ -0,0 +1,43 @@
+import os
+import socket
+import subprocess
+import sys
+from datetime import datetime, timedelta
+from unittest import mock
+from utils.pdf_jobs import JOB_STALE_GRACE_SECONDS, PDFJobQueue, _write_job
+
+
+def _queue(tmp_path):
+    return PDFJobQueue(str(tmp_path / 'jobs'), cache=None, max_workers=1, timeout=30, memory_limit=None,
+                       retention=3600)
+
+
+def _job(queue, job_id, **fields):
+    job = {'id': job_id, 'status': 'queued', 'error': None, 'started_at': None, 'finished_at': None, **fields}
+    _write_job(queue._job_path(job_id), job)
+    return job_id
+
+
+def test_jobs_without_a_process_to_finish_them_fail(tmp_path):
+    queue = _queue(tmp_path)
+    exited = subprocess.Popen([sys.executable, '-c', 'pass'])
+    exited.wait()
+    overran = (datetime.utcnow() - timedelta(seconds=30 + JOB_STALE_GRACE_SECONDS + 1)).isoformat()
+
+    # The submitting web process is gone
+    assert queue.get(_job(queue, 'a' * 32, host=socket.gethostname(), pid=exited.pid))['status'] == 'failed'
+    # Running on another host far past the timeout
+    assert queue.get(_job(queue, 'b' * 32, status='running', host='elsewhere', started_at=overran,
+                          worker_pid=1))['status'] == 'failed'
+    assert queue.get(_job(queue, 'c' * 32, host=socket.gethostname(), pid=os.getpid()))['status'] == 'queued'
+
+
+def test_broken_pool_is_shut_down_before_it_is_replaced(tmp_path):
+    queue = _queue(tmp_path)
+    broken = mock.Mock()
+    queue._executor = broken
+
+    queue._reset_executor(broken)
+
+    assert queue._executor is None
+    broken.shutdown.assert_called_once_with(wait=False, cancel_futures=True)
@@ -0,0 +1,38 @@
+from models import db, Bereich, Gefaehrdung, ProjectGBUOverride
+from utils.pdf_generator import PDFGenerator
+from utils.report_data import NO_BEREICH, load_gefaehrdungen_by_bereich
+
+
+def test_report_loads_in_fixed_number_of_queries(project, make_template, count_queries):
+    bereiche = [Bereich(name=name, sort_order=index) for index, name in enumerate(('Bühne', 'Rigging', 'Catering'))]
+    db.session.add_all(bereiche)
+    db.session.flush()
+    for bereich in bereiche:
+        db.session.add_all([
+            Gefaehrdung(project_id=project.id, bereich_id=bereich.id, tätigkeit=f'{bereich.name} {index}', sort_order=index)
+            for index in range(3)
+        ])
+    db.session.add(Gefaehrdung(project_id=project.id, tätigkeit='Ohne Bereich'))
+    db.session.commit()
+
+    _, rows, link = make_template('Bühnenbau', ['Aufbau', 'Abbau', 'Transport'], project, bereiche[0].id)
+    _, other_rows, other_link = make_template('Strom', ['Verkabelung', 'Aggregat'], project, bereiche[1].id)
+    db.session.add_all([
+        ProjectGBUOverride(project_gbu_id=link.id, gefaehrdung_id=rows[0].id, overrides={'tätigkeit': 'Aufbau Tag 1'}),
+        ProjectGBUOverride(project_gbu_id=link.id, gefaehrdung_id=rows[1].id, overrides={}, removed=True),
+        ProjectGBUOverride(project_gbu_id=other_link.id, gefaehrdung_id=other_rows[0].id,
+                           overrides={'massnahmen': 'Nur Elektrofachkräfte'}),
+    ])
+    db.session.commit()
+    project_id = project.id
+    db.session.expire_all()
+
+    with count_queries() as statements:
+        report = load_gefaehrdungen_by_bereich(project_id, PDFGenerator.GEFAEHRDUNG_COLUMNS)
+
+    # Pinned links, one query for the rows of all Bereiche and templates, one for the overrides
+    assert len(statements) == 3
+    assert list(report) == ['Bühne', 'Rigging', 'Catering', NO_BEREICH]
+    tätigkeiten = [row.tätigkeit for row in report['Bühne']]
+    assert 'Aufbau Tag 1' in tätigkeiten and 'Abbau' not in tätigkeiten and 'Transport' in tätigkeiten
+    assert [row.massnahmen for row in report['Rigging'] if row.tätigkeit == 'Verkabelung'] == ['Nur Elektrofachkräfte']
@@ -0,0 +1,82 @@
+from models import db, GBUTemplateSnapshot, Project, ProjectRiskSummary
+from routes.projects import PROJECT_MAX_PAGE_SIZE
+from utils.risk_summary import rebuild_risk_summaries
+
+
+def _summary_rows():
+    db.session.expire_all()
+    return sorted(
+        (summary.project_id, summary.bereich_id, summary.risikobewertung or '', summary.gefaehrdungen_count,
+         summary.offene_maengel_count)
+        for summary in ProjectRiskSummary.query
+    )
+
+
+def test_summary_deltas_match_a_full_recount(client, admin, admin_headers, project, make_template):
+    project_id = project.id
+    other = Project(name='Zirkus', status='aktiv', created_by=admin.id)
+    db.session.add(other)
+    db.session.commit()
+    _, rows, link = make_template('Bühnenbau', ['Aufbau', 'Abbau', 'Transport'], project)
+    legacy_template, legacy_rows, _ = make_template('Zelt', ['Zelt aufstellen', 'Zelt abbauen'], other)
+    row_ids, link_id = [row.id for row in rows], link.id
+    legacy_template_id, legacy_row_ids = legacy_template.id, [row.id for row in legacy_rows]
+    # A link from before snapshots follows the live template rows
+    GBUTemplateSnapshot.query.filter_by(gbu_template_id=legacy_template_id).delete()
+    db.session.commit()
+    rebuild_risk_summaries()
+
+    own = client.post('/api/gbu/gefaehrdungen', headers=admin_headers, json={
+        'project_id': project_id, 'tätigkeit': 'Kasse', 'schadenschwere': 3, 'wahrscheinlichkeit': 3
+    }).json
+    assert client.put(f'/api/gbu/gefaehrdungen/{own["id"]}', headers=admin_headers,
+                      json={'mängel_behoben': True, 'wahrscheinlichkeit': 1}).status_code == 200
+    assert client.put(f'/api/gbu/gefaehrdungen/{legacy_row_ids[0]}', headers=admin_headers,
+                      json={'schadenschwere': 3, 'wahrscheinlichkeit': 3}).status_code == 200
+    assert client.delete(f'/api/gbu/gefaehrdungen/{legacy_row_ids[1]}', headers=admin_headers).status_code == 200
+
+    overlay = f'/api/gbu/project-gbus/{link_id}/gefaehrdungen'
+    assert client.put(f'{overlay}/{row_ids[0]}', headers=admin_headers,
+                      json={'schadenschwere': 3, 'wahrscheinlichkeit': 3}).status_code == 200
+    assert client.put(f'{overlay}/{row_ids[2]}', headers=admin_headers,
+                      json={'mängel_behoben': True}).status_code == 200
+    assert client.delete(f'{overlay}/{row_ids[1]}', headers=admin_headers).status_code == 200
+    assert client.post(f'{overlay}/{row_ids[0]}/restore', headers=admin_headers).status_code == 200
+
+    batch = client.post('/api/gbu/gefaehrdungen/batch', headers=admin_headers, json={'operations': [
+        {'op': 'create', 'data': {'project_id': project_id, 'tätigkeit': 'Bar', 'schadenschwere': 1}},
+        {'op': 'create', 'data': {'project_id': other.id, 'tätigkeit': 'Einlass'}},
+        {'op': 'update', 'id': own['id'], 'data': {'mängel_behoben': False}},
+        {'op': 'update', 'id': legacy_row_ids[0], 'data': {'wahrscheinlichkeit': 1}},
+    ]})
+    assert batch.status_code == 200
+    assert client.post('/api/gbu/gefaehrdungen/batch', headers=admin_headers, json={'operations': [
+        {'op': 'delete', 'id': batch.json['created'][0]['id']},
+    ]}).status_code == 200
+    assert client.post(f'/api/gbu/project/{project_id}/copy-template/{legacy_template_id}',
+                       headers=admin_headers).status_code == 201
+
+    incremental = _summary_rows()
+    rebuild_risk_summaries()
+    assert incremental == _summary_rows()
+    assert {project_id, other.id} == {row[0] for row in incremental}
+
+
+def test_risk_summary_list_is_paged(client, admin, admin_headers):
+    db.session.add_all([Project(name=f'Projekt {index}', status='aktiv', created_by=admin.id) for index in range(5)])
+    db.session.commit()
+
+    ids, after = [], None
+    while True:
+        response = client.get('/api/projects/risk-summary?limit=2' + (f'&after={after}' if after else ''),
+                              headers=admin_headers)
+        assert response.status_code == 200
+        assert len(response.json) <= 2
+        ids += [summary['project_id'] for summary in response.json]
+        after = response.headers.get('X-Next-Cursor')
+        if not after:
+            break
+    assert ids == sorted(ids) and len(ids) == 5
+
+    too_many = ','.join(str(index) for index in range(1, PROJECT_MAX_PAGE_SIZE + 2))
+    assert client.get(f'/api/projects/risk-summary?ids={too_many}', headers=admin_headers).status_code == 400
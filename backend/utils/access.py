@@ -0,0 +1,136 @@
+import threading
+from collections import OrderedDict
+from functools import wraps
+from flask import current_app, jsonify
+from flask_jwt_extended import jwt_required
+from sqlalchemy import func
+from models import db, BereichAssignment, GBUTemplate, Project, ProjectAssignment, User
+from utils.auth import current_role, current_user_id
+
+# Roles that may access every project
+ALL_PROJECTS_ROLES = ('admin',)
+
+# Roles that may change the gefaehrdungen of every template, others only of templates they created
+TEMPLATE_EDITOR_ROLES = ('admin', 'technischer_leiter')
+
+
+class ProjectAccessCache:
+    """In-process cache of the project ids each user may access
+
+    A user's entry is built with two small queries and tagged with a version
+    token per user, kept in the response cache's shared version files.
+    Bumping the token after a project or Bereich assignment, a new project or
+    a role change makes every worker process rebuild that user's entry on its
+    next check.
+    """
+
+    def __init__(self, versions, max_users):
+        self.versions = versions
+        self.max_users = max_users
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _namespace(user_id):
+        return f'project-access-{user_id}'
+
+    def project_ids(self, user_id):
+        """Accessible project ids of a user, None for access to all projects"""
+        version = self.versions.version(self._namespace(user_id))
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(user_id)
+                return entry[1]
+
+        project_ids = _load_project_ids(user_id)
+        with self._lock:
+            self._entries[user_id] = (version, project_ids)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_users:
+                self._entries.popitem(last=False)
+        return project_ids
+
+    def invalidate(self, user_id):
+        self.versions.bump(self._namespace(user_id))
+
+
+def _load_project_ids(user_id):
+    """Projects a user is assigned to, leads a Bereich of or created, None for all"""
+    role = db.session.query(User.role).filter(User.id == user_id).scalar()
+    if role in ALL_PROJECTS_ROLES:
+        return None
+    assigned = db.session.query(ProjectAssignment.project_id).filter(ProjectAssignment.user_id == user_id)
+    bereiche = db.session.query(BereichAssignment.project_id).filter(BereichAssignment.bereichsleiter_id == user_id)
+    created = db.session.query(Project.id).filter(Project.created_by == user_id)
+    return frozenset(project_id for project_id, in assigned.union(bereiche, created))
+
+
+def get_project_access():
+    return current_app.extensions['project_access']
+
+
+def accessible_project_ids():
+    """Project ids the current user may access, None for all"""
+    return get_project_access().project_ids(current_user_id())
+
+
+def can_access_project(project_id):
+    project_ids = accessible_project_ids()
+    return project_ids is None or project_id in project_ids
+
+
+def project_access_denied(*project_ids):
+    """A 403 response unless the current user may access every given project, None ids are skipped"""
+    accessible = accessible_project_ids()
+    if accessible is None:
+        return None
+    if any(project_id is not None and project_id not in accessible for project_id in project_ids):
+        return jsonify({'error': 'Access denied'}), 403
+    return None
+
+
+def template_write_denied(*template_ids):
+    """A 403 response unless the current user may change the rows of every given template, None ids are skipped
+
+    Projects change the template rows they overlay through their overrides,
+    never the shared rows themselves.
+    """
+    template_ids = {template_id for template_id in template_ids if template_id is not None}
+    if not template_ids or current_role() in TEMPLATE_EDITOR_ROLES:
+        return None
+    own = db.session.query(func.count(GBUTemplate.id)) \
+        .filter(GBUTemplate.id.in_(template_ids), GBUTemplate.created_by == current_user_id()).scalar()
+    if own == len(template_ids):
+        return None
+    return jsonify({
+        'error': 'Template gefaehrdungen can only be changed by template editors, '
+                 'change them for a project through /api/gbu/project-gbus/<project_gbu_id>/gefaehrdungen/<id>'
+    }), 403
+
+
+def accessible_projects_filter(column):
+    """SQL filter restricting column to the current user's projects, None if unrestricted"""
+    project_ids = accessible_project_ids()
+    if project_ids is None:
+        return None
+    return column.in_(project_ids)
+
+
+def invalidate_project_access(*user_ids):
+    """Rebuild the access sets of these users on their next request, call after the commit"""
+    access = get_project_access()
+    for user_id in user_ids:
+        access.invalidate(int(user_id))
+
+
+def project_access_required(fn):
+    """Decorator for views with a project_id argument, requires access to that project"""
+    @wraps(fn)
+    @jwt_required()
+    def wrapper(*args, **kwargs):
+        denied = project_access_denied(kwargs['project_id'])
+        if denied:
+            return denied
+        return fn(*args, **kwargs)
+    return wrapper
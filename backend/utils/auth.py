@@ -0,0 +1,161 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from flask import current_app, g
+from flask_jwt_extended import get_jwt, get_jwt_identity
+from models import db, User
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows
+    fcntl = None
+
+try:
+    import msvcrt
+except ImportError:
+    msvcrt = None
+
+# Shared version of the revocation file
+REVOCATIONS_NAMESPACE = 'token-revocations'
+
+
+@contextmanager
+def exclusive_file_lock(path):
+    """Hold an exclusive lock on the file at path across processes
+
+    flock where available, a lock on the first byte with msvcrt on Windows.
+    """
+    with open(path, 'a+') as lock:
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        elif msvcrt is not None:
+            lock.seek(0)
+            while True:
+                try:
+                    # LK_LOCK itself gives up after ten seconds
+                    msvcrt.locking(lock.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    continue
+        try:
+            yield
+        finally:
+            # Closing the file releases flock, msvcrt locks must be released explicitly
+            if fcntl is None and msvcrt is not None:
+                lock.seek(0)
+                msvcrt.locking(lock.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class TokenRevocations:
+    """Users whose tokens issued up to a point in time are no longer accepted
+
+    A deactivated user loses all tokens, a user with a changed role only the
+    access tokens carrying the old role, so a refresh yields a valid token
+    with the new one. The set lives in one small JSON file next to the
+    response cache's version files and is tagged with a shared version, so a
+    worker process re-reads it only after another process changed it. Entries
+    are dropped once they are older than the longest token lifetime.
+    """
+
+    def __init__(self, versions, max_age):
+        self.versions = versions
+        self.max_age = int(max_age.total_seconds())
+        self.path = os.path.join(versions.directory, f'{REVOCATIONS_NAMESPACE}.json')
+        self._entries = (None, {})
+        self._lock = threading.Lock()
+
+    def _read(self):
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def entries(self):
+        """user_id -> {'all': timestamp, 'role': [timestamp, current role]}"""
+        version = self.versions.version(REVOCATIONS_NAMESPACE)
+        with self._lock:
+            if self._entries[0] == version:
+                return self._entries[1]
+
+        entries = {int(user_id): entry for user_id, entry in self._read().items()}
+        with self._lock:
+            self._entries = (version, entries)
+        return entries
+
+    def is_revoked(self, payload):
+        if payload.get('active') is False:
+            return True
+        entry = self.entries().get(int(payload['sub']))
+        if not entry:
+            return False
+        if 'all' in entry and payload['iat'] <= entry['all']:
+            return True
+        if 'role' in entry and payload.get('type') == 'access':
+            changed_at, role = entry['role']
+            return payload['iat'] <= changed_at and payload.get('role') != role
+        return False
+
+    def _update(self, user_id, key, value):
+        now = int(time.time())
+        with exclusive_file_lock(f'{self.path}.lock'):
+            entries = {
+                user: entry for user, entry in self._read().items()
+                if max(entry.get('all', 0), entry.get('role', [0])[0]) > now - self.max_age
+            }
+            entries.setdefault(str(user_id), {})[key] = value(now)
+
+            temp_path = f'{self.path}.{os.getpid()}.{threading.get_ident()}.tmp'
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(entries, f)
+            os.replace(temp_path, self.path)
+        self.versions.bump(REVOCATIONS_NAMESPACE)
+
+    def revoke(self, user_id):
+        """Reject all tokens of the user issued until now, in every worker process"""
+        self._update(user_id, 'all', lambda now: now)
+
+    def role_changed(self, user_id, role):
+        """Reject access tokens issued until now that carry another role"""
+        self._update(user_id, 'role', lambda now: [now, role])
+
+
+def token_claims(user):
+    """Claims embedded in a user's tokens, so requests can check the role without a query"""
+    return {'role': user.role, 'active': user.active}
+
+
+def current_user_id():
+    return int(get_jwt_identity())
+
+
+def current_user():
+    """The User row of the current request, loaded at most once per request"""
+    if '_current_user' not in g:
+        g._current_user = db.session.get(User, current_user_id())
+    return g._current_user
+
+
+def current_role():
+    """Role of the current user from the token, tokens without the claim fall back to the row"""
+    role = get_jwt().get('role')
+    if role is None:
+        user = current_user()
+        role = user.role if user else None
+    return role
+
+
+def get_token_revocations():
+    return current_app.extensions['token_revocations']
+
+
+def revoke_user_tokens(user_id):
+    """Reject a deactivated user's current tokens, call after the commit"""
+    get_token_revocations().revoke(user_id)
+
+
+def revoke_stale_role(user_id, role):
+    """Reject access tokens with the user's old role, call after the commit"""
+    get_token_revocations().role_changed(user_id, role)
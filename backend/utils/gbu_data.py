@@ -0,0 +1,610 @@
+import bisect
+from datetime import datetime
+from sqlalchemy import case, func, insert, literal, select, tuple_, update
+from sqlalchemy.orm import selectinload
+from models import (
+    db, Project, GBUTemplate, GBUTemplateSnapshot, Gefaehrdung, GefaehrdungChange, ProjectGBU, ProjectGBUOverride
+)
+from utils.risk import calculate_risikobewertung, risk_case
+
+# Columns copied from template gefaehrdungen into a project
+COPIED_COLUMNS = (
+    'bereich_id', 'tätigkeit', 'gefährdung', 'gefährdungsfaktoren', 'belastungsfaktoren',
+    'schadenschwere', 'wahrscheinlichkeit', 'risikobewertung', 's_substitution', 't_technisch',
+    'o_organisatorisch', 'p_persoenlich', 'massnahmen', 's_massnahmen', 't_massnahmen',
+    'o_massnahmen', 'p_massnahmen', 'überprüfung_wirksamkeit', 'überprüfung_meldung',
+    'sonstige_bemerkungen', 'gesetzliche_regelungen', 'sort_order'
+)
+
+# Template gefaehrdung columns a project may override, Bereich and order stay with the template
+OVERRIDABLE_COLUMNS = (
+    'tätigkeit', 'gefährdung', 'gefährdungsfaktoren', 'belastungsfaktoren',
+    'schadenschwere', 'wahrscheinlichkeit', 's_substitution', 't_technisch',
+    'o_organisatorisch', 'p_persoenlich', 'massnahmen', 's_massnahmen', 't_massnahmen',
+    'o_massnahmen', 'p_massnahmen', 'überprüfung_wirksamkeit', 'überprüfung_meldung',
+    'sonstige_bemerkungen', 'gesetzliche_regelungen', 'mängel_behoben'
+)
+
+# Columns a gefaehrdung listing can project with ?fields=
+LISTABLE_COLUMNS = tuple(column.name for column in Gefaehrdung.__table__.columns)
+
+# Distance between sort_order values assigned by a reorder, leaves room for later moves
+REORDER_GAP = 1024
+
+# Rows per page of a gefaehrdung listing, default and maximum
+LIST_PAGE_SIZE = 200
+LIST_MAX_PAGE_SIZE = 1000
+
+
+def load_overrides(project_gbu_ids):
+    """Overrides of the given template links in one query, keyed by (project_gbu_id, gefaehrdung_id)"""
+    if not project_gbu_ids:
+        return {}
+    overrides = ProjectGBUOverride.query.filter(ProjectGBUOverride.project_gbu_id.in_(project_gbu_ids))
+    return {(override.project_gbu_id, override.gefaehrdung_id): override for override in overrides}
+
+
+def apply_override(values, override):
+    """Merge the overridden fields into a dict of template row values"""
+    for column, value in (override.overrides or {}).items():
+        if column in values:
+            values[column] = value
+    return values
+
+
+def merged_gefaehrdung_dict(row, project_gbu_id, override=None):
+    """Serialize a template row, given as Gefaehrdung.to_dict, as the project sees it"""
+    gefaehrdung_dict = dict(row)
+    gefaehrdung_dict['project_gbu_id'] = project_gbu_id
+    gefaehrdung_dict['overridden'] = sorted((override.overrides or {}) if override else [])
+    gefaehrdung_dict['removed'] = bool(override and override.removed)
+    if override:
+        apply_override(gefaehrdung_dict, override)
+    return gefaehrdung_dict
+
+
+def save_override(project_gbu_id, row, fields, user_id, removed=None):
+    """Record a project's changes to a template row, given as Gefaehrdung.to_dict
+
+    row is the template row as the link sees it, of the pinned version. Only
+    fields that differ from it are stored. An override left without changes
+    is deleted. Returns the override, or None.
+    """
+    override = ProjectGBUOverride.query.filter_by(
+        project_gbu_id=project_gbu_id, gefaehrdung_id=row['id']
+    ).first()
+    values = dict(override.overrides or {}) if override else {}
+
+    for column in OVERRIDABLE_COLUMNS:
+        if column in fields:
+            if fields[column] == row[column]:
+                values.pop(column, None)
+            else:
+                values[column] = fields[column]
+
+    # Risk follows overridden schadenschwere and wahrscheinlichkeit
+    values.pop('risikobewertung', None)
+    if 'schadenschwere' in values or 'wahrscheinlichkeit' in values:
+        risikobewertung = calculate_risikobewertung(
+            values.get('schadenschwere', row['schadenschwere']),
+            values.get('wahrscheinlichkeit', row['wahrscheinlichkeit'])
+        )
+        if risikobewertung and risikobewertung != row['risikobewertung']:
+            values['risikobewertung'] = risikobewertung
+
+    if removed is None:
+        removed = bool(override and override.removed)
+
+    if not values and not removed:
+        if override:
+            db.session.delete(override)
+        return None
+
+    if override is None:
+        override = ProjectGBUOverride(project_gbu_id=project_gbu_id, gefaehrdung_id=row['id'])
+        db.session.add(override)
+    override.overrides = values
+    override.removed = removed
+    override.updated_by = user_id
+    return override
+
+
+def template_gefaehrdungen_changed(template_ids):
+    """Bump the version of templates whose gefaehrdungen changed
+
+    Projects keep seeing the version they pinned, so only links from before
+    snapshots, which follow the live rows, see the change. Returns the ids of
+    their projects. Call before writing the rows or recording sync changes:
+    the UPDATE locks the templates, and snapshot_template takes the template
+    lock before the rows and the sync sequence too.
+    """
+    template_ids = {template_id for template_id in template_ids if template_id is not None}
+    if not template_ids:
+        return set()
+
+    db.session.execute(
+        update(GBUTemplate).where(GBUTemplate.id.in_(template_ids)).values(version=GBUTemplate.version + 1)
+    )
+    return {link.project_id for link in live_overlay_links(template_ids)}
+
+
+def live_overlay_links(template_ids):
+    """Overlay links of the templates from before snapshots, which follow the live rows
+
+    Returns rows with id, project_id and gbu_template_id.
+    """
+    template_ids = {template_id for template_id in template_ids if template_id is not None}
+    if not template_ids:
+        return []
+    return db.session.execute(
+        select(ProjectGBU.id, ProjectGBU.project_id, ProjectGBU.gbu_template_id)
+        .outerjoin(GBUTemplateSnapshot, (GBUTemplateSnapshot.gbu_template_id == ProjectGBU.gbu_template_id)
+                   & (GBUTemplateSnapshot.version == ProjectGBU.template_version))
+        .where(ProjectGBU.gbu_template_id.in_(template_ids), ProjectGBU.template_version.isnot(None),
+               GBUTemplateSnapshot.id.is_(None))
+    ).all()
+
+
+def snapshot_template(template_id):
+    """Keep the template's current gefaehrdungen under its current version, returns that version
+
+    Every change to a template's rows bumps its version, so the rows of a
+    version never change and an existing snapshot is reused. The template row
+    is locked and the rows are read with locking reads, so an edit can neither
+    slip in between nor be hidden by an older read view.
+    """
+    version = db.session.execute(
+        select(GBUTemplate.version).where(GBUTemplate.id == template_id).with_for_update()
+    ).scalar_one()
+    existing = db.session.execute(
+        select(GBUTemplateSnapshot.id)
+        .where(GBUTemplateSnapshot.gbu_template_id == template_id, GBUTemplateSnapshot.version == version)
+        .with_for_update(read=True)
+    ).first()
+    if existing is None:
+        rows = Gefaehrdung.query.filter_by(gbu_template_id=template_id) \
+            .order_by(Gefaehrdung.sort_order, Gefaehrdung.id) \
+            .with_for_update(read=True).populate_existing().all()
+        db.session.add(GBUTemplateSnapshot(gbu_template_id=template_id, version=version,
+                                           gefaehrdungen=[g.to_dict() for g in rows]))
+    return version
+
+
+def link_is_pinned(link, template):
+    """Whether an overlay link sees an older version of the template than the current one"""
+    return link.template_version is not None and link.template_version != template.version
+
+
+def load_snapshot_rows(links):
+    """Template rows of the links pinned to an older version, keyed by link id
+
+    links are (ProjectGBU, GBUTemplate) pairs. Runs one query, only if a link
+    is pinned. Links from before snapshots have none and are left out, they
+    see the live template rows.
+    """
+    pinned = {}
+    for link, template in links:
+        if link_is_pinned(link, template):
+            pinned.setdefault((template.id, link.template_version), []).append(link.id)
+    if not pinned:
+        return {}
+
+    snapshots = db.session.query(
+        GBUTemplateSnapshot.gbu_template_id, GBUTemplateSnapshot.version, GBUTemplateSnapshot.gefaehrdungen
+    ).filter(tuple_(GBUTemplateSnapshot.gbu_template_id, GBUTemplateSnapshot.version).in_(list(pinned)))
+    return {
+        link_id: rows
+        for template_id, version, rows in snapshots
+        for link_id in pinned[(template_id, version)]
+    }
+
+
+def load_pinned_links(project_ids):
+    """Overlay links of the given projects that see a snapshot rather than the live rows
+
+    Returns link id -> (link, template rows). One query for the links, one
+    more for the snapshots only if a link is pinned to an older version.
+    """
+    links = db.session.query(ProjectGBU, GBUTemplate) \
+        .join(GBUTemplate, ProjectGBU.gbu_template_id == GBUTemplate.id) \
+        .filter(ProjectGBU.project_id.in_(project_ids), ProjectGBU.template_version.isnot(None),
+                ProjectGBU.template_version != GBUTemplate.version) \
+        .all()
+    rows = load_snapshot_rows(links)
+    return {link.id: (link, rows[link.id]) for link, _ in links if link.id in rows}
+
+
+def overlaid_gefaehrdung_ids(project_id, ids):
+    """Those of ids that the project sees as template rows through its overlay links"""
+    if not ids:
+        return set()
+    pinned = load_pinned_links([project_id])
+    found = {row['id'] for _, rows in pinned.values() for row in rows if row['id'] in ids}
+    live_template_ids = select(ProjectGBU.gbu_template_id).where(
+        ProjectGBU.project_id == project_id, ProjectGBU.template_version.isnot(None), ProjectGBU.id.notin_(pinned)
+    )
+    found.update(db.session.scalars(
+        select(Gefaehrdung.id).where(Gefaehrdung.id.in_(ids), Gefaehrdung.gbu_template_id.in_(live_template_ids))
+    ))
+    return found
+
+
+def _template_link_dict(link, template):
+    """Serialize a template as attached to a project, without its gefaehrdungen"""
+    template_dict = template.to_dict()
+    template_dict['project_gbu_id'] = link.id
+    template_dict['template_version'] = link.template_version
+    template_dict['overlay'] = link.template_version is not None
+    template_dict['outdated'] = template_dict['overlay'] and link.template_version != template.version
+    return template_dict
+
+
+def load_project_gbus(project_id, include_removed=False):
+    """Load a project's templates with their gefaehrdungen and its own gefaehrdungen
+
+    Overlay links show the template rows of the version they pinned, merged
+    with the project's overrides; removed rows are left out unless
+    include_removed is set. Runs a fixed number of queries however many
+    templates are attached: the project check, the links with their
+    templates, one IN query for all template gefaehrdungen, one for the
+    snapshots of links pinned to an older version if there are any, one for
+    the overrides and one for the project gefaehrdungen. Returns None if the
+    project does not exist.
+    """
+    if not db.session.query(Project.id).filter(Project.id == project_id).first():
+        return None
+
+    links = db.session.query(ProjectGBU, GBUTemplate) \
+        .join(GBUTemplate, ProjectGBU.gbu_template_id == GBUTemplate.id) \
+        .filter(ProjectGBU.project_id == project_id) \
+        .order_by(ProjectGBU.id) \
+        .options(selectinload(GBUTemplate.gefaehrdungen)) \
+        .all()
+
+    snapshot_rows = load_snapshot_rows(links)
+    overrides = load_overrides([link.id for link, _ in links if link.template_version is not None])
+
+    project_gefaehrdungen = Gefaehrdung.query.filter_by(project_id=project_id) \
+        .order_by(Gefaehrdung.sort_order, Gefaehrdung.id).all()
+
+    template_dicts = []
+    for link, template in links:
+        template_dict = _template_link_dict(link, template)
+        if template_dict['overlay']:
+            rows = snapshot_rows.get(link.id)
+            if rows is None:
+                rows = [g.to_dict() for g in template.gefaehrdungen]
+            gefaehrdungen = []
+            for row in rows:
+                gefaehrdung_dict = merged_gefaehrdung_dict(row, link.id, overrides.get((link.id, row['id'])))
+                if include_removed or not gefaehrdung_dict['removed']:
+                    gefaehrdungen.append(gefaehrdung_dict)
+            template_dict['gefaehrdungen'] = gefaehrdungen
+        else:
+            template_dict['gefaehrdungen'] = [g.to_dict() for g in template.gefaehrdungen]
+        template_dicts.append(template_dict)
+
+    return {
+        'templates': template_dicts,
+        'project_gefaehrdungen': [g.to_dict() for g in project_gefaehrdungen]
+    }
+
+def load_project_gbu_changes(project_id, since, until, include_removed=False):
+    """Load what changed in a project's GBU view after watermark since, up to until
+
+    Returns the attached templates without their gefaehrdungen, the changed
+    rows as load_project_gbus serializes them and the ids of rows deleted or
+    removed from the project. Template rows of overlay links carry the
+    project's overrides. Reads the change log through its (project_id, seq)
+    and (gbu_template_id, seq) indexes, so the cost follows the number of
+    changes rather than the project size. Changes to templates the project
+    pinned at an older version do not show, it keeps that version's rows.
+    Returns None if the project does not exist.
+    """
+    if not db.session.query(Project.id).filter(Project.id == project_id).first():
+        return None
+
+    links = db.session.query(ProjectGBU, GBUTemplate) \
+        .join(GBUTemplate, ProjectGBU.gbu_template_id == GBUTemplate.id) \
+        .filter(ProjectGBU.project_id == project_id) \
+        .order_by(ProjectGBU.id) \
+        .all()
+    snapshot_rows = load_snapshot_rows(links)
+    live_links = {
+        template.id: link for link, template in links
+        if link.template_version is not None and link.id not in snapshot_rows
+    }
+    # gefaehrdung_id -> (link, row) of the rows pinned links show
+    pinned_rows = {
+        row['id']: (link, row) for link, _ in links if link.id in snapshot_rows for row in snapshot_rows[link.id]
+    }
+
+    scope = GefaehrdungChange.project_id == project_id
+    if live_links:
+        scope = scope | GefaehrdungChange.gbu_template_id.in_(live_links)
+    changes = db.session.query(GefaehrdungChange.gefaehrdung_id, GefaehrdungChange.deleted) \
+        .filter(scope, GefaehrdungChange.seq > since, GefaehrdungChange.seq <= until,
+                GefaehrdungChange.gefaehrdung_id.isnot(None)) \
+        .order_by(GefaehrdungChange.seq, GefaehrdungChange.id)
+    # The last change of a row decides whether it was deleted
+    latest = {}
+    for gefaehrdung_id, deleted in changes:
+        latest[gefaehrdung_id] = deleted
+
+    changed_ids = [gefaehrdung_id for gefaehrdung_id, deleted in latest.items() if not deleted]
+    live_ids = [gefaehrdung_id for gefaehrdung_id in changed_ids if gefaehrdung_id not in pinned_rows]
+    rows = Gefaehrdung.query.filter(Gefaehrdung.id.in_(live_ids)) \
+        .order_by(Gefaehrdung.sort_order, Gefaehrdung.id).all() if live_ids else []
+    # Overrides of the changed rows only, not of the whole project
+    overrides = {}
+    overlay_link_ids = [link.id for link, _ in links if link.template_version is not None]
+    if changed_ids and overlay_link_ids:
+        overrides = {
+            (override.project_gbu_id, override.gefaehrdung_id): override
+            for override in ProjectGBUOverride.query.filter(
+                ProjectGBUOverride.project_gbu_id.in_(overlay_link_ids),
+                ProjectGBUOverride.gefaehrdung_id.in_(changed_ids)
+            )
+        }
+
+    gefaehrdungen = []
+    deleted_ids = {gefaehrdung_id for gefaehrdung_id, deleted in latest.items() if deleted}
+
+    def add_overlay_row(link, row):
+        gefaehrdung_dict = merged_gefaehrdung_dict(row, link.id, overrides.get((link.id, row['id'])))
+        if include_removed or not gefaehrdung_dict['removed']:
+            gefaehrdungen.append(gefaehrdung_dict)
+        else:
+            deleted_ids.add(row['id'])
+
+    for g in rows:
+        if g.project_id == project_id:
+            gefaehrdungen.append(g.to_dict())
+        elif g.gbu_template_id in live_links:
+            add_overlay_row(live_links[g.gbu_template_id], g.to_dict())
+        else:
+            # Moved out of the project's view, e.g. its template is no longer overlaid
+            deleted_ids.add(g.id)
+    for gefaehrdung_id in changed_ids:
+        if gefaehrdung_id in pinned_rows:
+            add_overlay_row(*pinned_rows[gefaehrdung_id])
+    # Rows logged as changed that no longer exist were deleted after the change
+    deleted_ids |= set(live_ids) - {g.id for g in rows}
+    gefaehrdungen.sort(key=lambda row: (row['sort_order'] or 0, row['id']))
+
+    return {
+        'templates': [_template_link_dict(link, template) for link, template in links],
+        'gefaehrdungen': gefaehrdungen,
+        'deleted': sorted(deleted_ids)
+    }
+
+def _insert_returning():
+    return db.session.get_bind().dialect.insert_returning
+
+
+def lock_projects_for_insert(project_ids):
+    """Hold the rows of these projects until the commit before inserting their gefaehrdungen
+
+    Without INSERT ... RETURNING, copy_template_gefaehrdungen finds its rows
+    by id range, so every insert of project rows takes this lock to keep
+    others out of that range. Rows are locked in id order against deadlocks.
+    A no-op where RETURNING exists.
+    """
+    project_ids = sorted({project_id for project_id in project_ids if project_id is not None})
+    if not project_ids or _insert_returning():
+        return
+    db.session.execute(
+        select(Project.id).where(Project.id.in_(project_ids)).order_by(Project.id).with_for_update()
+    )
+
+
+def copy_template_gefaehrdungen(project_id, template_ids):
+    """Copy the gefaehrdungen of templates into a project with one INSERT ... SELECT
+
+    Rows are inserted in template order, then by sort_order. Returns the ids of
+    the new rows, from RETURNING where the database supports it. Otherwise they
+    are the project's rows above its highest id before the copy, which the
+    project lock keeps exact.
+    """
+    now = datetime.utcnow()
+    template_order = case({template_id: index for index, template_id in enumerate(template_ids)},
+                          value=Gefaehrdung.gbu_template_id)
+    # Ratings are recomputed so copies follow the current risk matrix
+    copied = [getattr(Gefaehrdung, column) for column in COPIED_COLUMNS]
+    copied[COPIED_COLUMNS.index('risikobewertung')] = risk_case(
+        Gefaehrdung.schadenschwere, Gefaehrdung.wahrscheinlichkeit, Gefaehrdung.risikobewertung
+    )
+    source = select(
+        literal(project_id),
+        *copied,
+        literal(now),
+        literal(now)
+    ).where(Gefaehrdung.gbu_template_id.in_(template_ids)) \
+        .order_by(template_order, Gefaehrdung.sort_order, Gefaehrdung.id)
+    statement = insert(Gefaehrdung).from_select(['project_id', *COPIED_COLUMNS, 'created_at', 'updated_at'], source)
+
+    if _insert_returning():
+        return sorted(db.session.scalars(statement.returning(Gefaehrdung.id)).all())
+
+    lock_projects_for_insert([project_id])
+    last_id = db.session.query(func.max(Gefaehrdung.id)) \
+        .filter(Gefaehrdung.project_id == project_id).scalar() or 0
+    db.session.execute(statement)
+    return db.session.scalars(
+        select(Gefaehrdung.id)
+        .where(Gefaehrdung.project_id == project_id, Gefaehrdung.id > last_id)
+        .order_by(Gefaehrdung.id)
+    ).all()
+
+
+def _listing_value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def _after_key(after):
+    """Rows following the listing key after = (bereich_id, sort_order, id)
+
+    Spelled out on the raw columns so the (…, bereich_id, sort_order, id)
+    indexes serve it. Rows without a Bereich sort first, as NULL does in
+    ascending order in MySQL and SQLite.
+    """
+    bereich_id, sort_order, gefaehrdung_id = after
+    within_bereich = (Gefaehrdung.sort_order > sort_order) \
+        | ((Gefaehrdung.sort_order == sort_order) & (Gefaehrdung.id > gefaehrdung_id))
+    if bereich_id is None:
+        return (Gefaehrdung.bereich_id.is_(None) & within_bereich) | Gefaehrdung.bereich_id.isnot(None)
+    return (Gefaehrdung.bereich_id > bereich_id) \
+        | ((Gefaehrdung.bereich_id == bereich_id) & within_bereich)
+
+
+def _listing_order(key):
+    bereich_id, sort_order, gefaehrdung_id = key
+    return bereich_id is not None, bereich_id or 0, sort_order, gefaehrdung_id
+
+
+def _pinned_listing(pinned, fields, limit, after):
+    """Listing entries of the rows pinned links show, the first limit + 1 after the key"""
+    overrides = load_overrides(list(pinned))
+    entries = []
+    for link_id, (_, rows) in pinned.items():
+        for row in rows:
+            key = (row['bereich_id'], row['sort_order'] or 0, row['id'])
+            override = overrides.get((link_id, row['id']))
+            if (override and override.removed) or (after is not None and _listing_order(key) <= _listing_order(after)):
+                continue
+            values = {'id': row['id'], 'project_gbu_id': link_id, **{name: row[name] for name in fields if name != 'id'}}
+            entries.append((key, apply_override(values, override) if override else values))
+    return sorted(entries, key=lambda entry: _listing_order(entry[0]))[:limit + 1]
+
+
+def load_gefaehrdungen_page(fields, limit, after=None, project_id=None, template_id=None):
+    """Load one page of a project's or a template's gefaehrdungen with only the given columns
+
+    Pages follow (bereich_id, sort_order, id) with rows without a Bereich
+    first, after is the key of the last row of the previous page. A project's
+    page includes the rows of templates it overlays in the version it pinned,
+    merged with its overrides and without the rows it removed; those rows
+    carry their project_gbu_id. The project's own rows and the overlaid live
+    rows are paged by separate queries on the raw columns, so each can use an
+    index, and merged with the rows of pinned links read from their
+    snapshots. Returns the rows and the key of the last row if more follow,
+    else None.
+    """
+    columns = [getattr(Gefaehrdung, name) for name in fields if name != 'id']
+    keys = (Gefaehrdung.id, Gefaehrdung.bereich_id.label('_bereich_key'), Gefaehrdung.sort_order.label('_sort_key'))
+
+    def page_of(query):
+        if after is not None:
+            query = query.filter(_after_key(after))
+        rows = query.order_by(Gefaehrdung.bereich_id, Gefaehrdung.sort_order, Gefaehrdung.id) \
+            .limit(limit + 1).all()
+        entries = []
+        for row in rows:
+            values = row._asdict()
+            key = (values.pop('_bereich_key'), values.pop('_sort_key'), row.id)
+            for column, value in (values.pop('_overrides', None) or {}).items():
+                if column in values:
+                    values[column] = value
+            entries.append((key, values))
+        return entries
+
+    if project_id is not None:
+        pinned = load_pinned_links([project_id])
+        own = page_of(db.session.query(*keys, *columns).filter(Gefaehrdung.project_id == project_id))
+        link_filter = (ProjectGBU.gbu_template_id == Gefaehrdung.gbu_template_id) \
+            & (ProjectGBU.project_id == project_id) & ProjectGBU.template_version.isnot(None)
+        if pinned:
+            link_filter = link_filter & ProjectGBU.id.notin_(pinned)
+        overlaid = page_of(
+            db.session.query(
+                *keys, ProjectGBU.id.label('project_gbu_id'), ProjectGBUOverride.overrides.label('_overrides'),
+                *columns
+            )
+            .join(ProjectGBU, link_filter)
+            .outerjoin(ProjectGBUOverride, (ProjectGBUOverride.project_gbu_id == ProjectGBU.id)
+                       & (ProjectGBUOverride.gefaehrdung_id == Gefaehrdung.id))
+            .filter(ProjectGBUOverride.removed.is_(None) | ProjectGBUOverride.removed.is_(False))
+        )
+        entries = own + overlaid
+        if pinned:
+            entries += _pinned_listing(pinned, fields, limit, after)
+        for _, values in entries:
+            values.setdefault('project_gbu_id', None)
+        entries = sorted(entries, key=lambda entry: _listing_order(entry[0]))[:limit + 1]
+    else:
+        entries = page_of(db.session.query(*keys, *columns).filter(Gefaehrdung.gbu_template_id == template_id))
+
+    page = [{name: _listing_value(value) for name, value in values.items()} for _, values in entries[:limit]]
+    if len(entries) <= limit:
+        return page, None
+    return page, entries[limit - 1][0]
+
+
+def _kept_positions(values):
+    """Positions of a longest strictly ascending run of values, None never kept"""
+    tails, tail_positions, previous = [], [], [None] * len(values)
+    for position, value in enumerate(values):
+        if value is None:
+            continue
+        index = bisect.bisect_left(tails, value)
+        previous[position] = tail_positions[index - 1] if index else None
+        if index == len(tails):
+            tails.append(value)
+            tail_positions.append(position)
+        else:
+            tails[index] = value
+            tail_positions[index] = position
+
+    kept = set()
+    position = tail_positions[-1] if tail_positions else None
+    while position is not None:
+        kept.add(position)
+        position = previous[position]
+    return kept
+
+
+def reorder_sort_orders(current, ids, gap=REORDER_GAP):
+    """New sort_order values that put ids in the given order, only for rows that move
+
+    current maps every id to its sort_order. Rows forming the longest run that
+    is already in order keep their values, the others get values spaced within
+    the gaps around them, so moving one row changes one value. Falls back to
+    renumbering all rows gap apart when a gap is too small.
+    """
+    values = [current[gefaehrdung_id] for gefaehrdung_id in ids]
+    kept = _kept_positions(values)
+
+    new_values = {}
+    position = 0
+    while position < len(ids):
+        if position in kept:
+            position += 1
+            continue
+        end = position
+        while end < len(ids) and end not in kept:
+            end += 1
+        lower = values[position - 1] if position else None
+        upper = values[end] if end < len(ids) else None
+        count = end - position
+
+        if lower is None and upper is None:
+            moved = [gap * (index + 1) for index in range(count)]
+        elif lower is None:
+            moved = [upper - gap * (count - index) for index in range(count)]
+        elif upper is None:
+            moved = [lower + gap * (index + 1) for index in range(count)]
+        else:
+            step = (upper - lower) // (count + 1)
+            if step < 1:
+                return {
+                    gefaehrdung_id: gap * (index + 1)
+                    for index, gefaehrdung_id in enumerate(ids) if current[gefaehrdung_id] != gap * (index + 1)
+                }
+            moved = [lower + step * (index + 1) for index in range(count)]
+
+        for index, value in enumerate(moved):
+            new_values[ids[position + index]] = value
+            values[position + index] = value
+        position = end
+
+    return {gefaehrdung_id: value for gefaehrdung_id, value in new_values.items() if current[gefaehrdung_id] != value}
@@ -0,0 +1,114 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+from flask import current_app
+
+
+def cache_key(kind, *parts):
+    """Build a content-addressed cache key from the values that go into a document"""
+    payload = json.dumps([kind, parts], sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def row_values(obj, columns):
+    """Return the given column values of a row, in column order"""
+    return [getattr(obj, column) for column in columns]
+
+
+class PDFCache:
+    """On-disk LRU cache of rendered PDFs with a size quota"""
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+
+    def path_for(self, key):
+        return os.path.join(self.directory, f'{key}.pdf')
+
+    def get(self, key):
+        """Return the cached file path for key, or None on a miss"""
+        path = self.path_for(key)
+        try:
+            # The modification time doubles as the LRU timestamp
+            os.utime(path)
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+        return path
+
+    def put(self, key, source_path):
+        """Move a rendered file into the cache and return its cached path"""
+        path = self.path_for(key)
+        temp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        shutil.move(source_path, temp_path)
+        os.replace(temp_path, path)
+        self.evict()
+        return path
+
+    def put_stream(self, key, fileobj):
+        """Copy a rendered file object into the cache and return its cached path"""
+        path = self.path_for(key)
+        temp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(temp_path, 'wb') as f:
+            shutil.copyfileobj(fileobj, f)
+        os.replace(temp_path, path)
+        self.evict()
+        return path
+
+    def entries(self):
+        """List cached files as (mtime, size, path), least recently used first"""
+        result = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if not entry.name.endswith('.pdf'):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                result.append((stat.st_mtime, stat.st_size, entry.path))
+        result.sort()
+        return result
+
+    def evict(self):
+        """Remove least recently used files until the cache fits its quota"""
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                continue
+            total -= size
+            with self._lock:
+                self.evictions += 1
+
+    def stats(self):
+        entries = self.entries()
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(entries),
+                'bytes': sum(size for _, size, _ in entries),
+                'max_bytes': self.max_bytes,
+            }
+
+
+def get_pdf_cache():
+    """Return the PDF cache of the current app"""
+    return current_app.extensions['pdf_cache']
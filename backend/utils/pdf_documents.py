@@ -0,0 +1,148 @@
+from collections import namedtuple
+from datetime import datetime
+from types import SimpleNamespace
+from flask import current_app
+from sqlalchemy.orm import defer
+from models import Project, Participant, Unterweisung, UnterweisungItem
+from utils.pdf_generator import PDFGenerator
+from utils.pdf_cache import get_pdf_cache, cache_key
+from utils.report_data import load_project, load_gefaehrdungen_by_bereich
+from utils.signature_cache import get_thumbnail, build_thumbnail
+
+DOCUMENT_KINDS = ('gbu', 'participants', 'unterweisung')
+
+# A document ready to render: plain, picklable arguments for PDFGenerator
+PDFDocument = namedtuple('PDFDocument', ['kind', 'key', 'filename', 'args'])
+
+
+def snapshot(obj, columns):
+    """Copy the given columns of a row into a plain, picklable object"""
+    return SimpleNamespace(**{column: getattr(obj, column) for column in columns})
+
+
+def _fingerprint(value):
+    """Turn document arguments into JSON-serializable data, keeping order"""
+    if isinstance(value, SimpleNamespace):
+        return sorted((k, _fingerprint(v)) for k, v in vars(value).items())
+    if isinstance(value, dict):
+        return [[k, _fingerprint(v)] for k, v in value.items()]
+    if isinstance(value, (list, tuple)):
+        return [_fingerprint(v) for v in value]
+    return value
+
+
+def _document(kind, filename, *args):
+    key = cache_key(kind, PDFGenerator.LAYOUT_VERSION, _fingerprint(args))
+    return PDFDocument(kind, key, filename, args)
+
+
+def load_document(kind, object_id):
+    """Load everything needed to render a document, or None if it does not exist"""
+    if kind == 'gbu':
+        return _load_gbu(object_id)
+    if kind == 'participants':
+        return _load_participants(object_id)
+    if kind == 'unterweisung':
+        return _load_unterweisung(object_id)
+    raise ValueError(f'Unknown document kind: {kind}')
+
+
+def _load_gbu(project_id):
+    project = load_project(project_id, PDFGenerator.PROJECT_COLUMNS)
+    if not project:
+        return None
+
+    return _document(
+        'gbu',
+        f'GBU_{project.name}.pdf',
+        project,
+        load_gefaehrdungen_by_bereich(project_id, PDFGenerator.GEFAEHRDUNG_COLUMNS)
+    )
+
+
+def _load_participants(project_id):
+    project = Project.query.get(project_id)
+    if not project:
+        return None
+
+    # Signatures are printed from cached thumbnails, only decode the ones missing
+    participants = Participant.query.filter_by(project_id=project_id) \
+        .options(defer(Participant.signature_data)).all()
+
+    snapshots = []
+    for participant in participants:
+        data = snapshot(participant, PDFGenerator.PARTICIPANT_COLUMNS)
+        data.signature_image = None
+        if participant.signature_type == 'digital' and participant.signed_at:
+            data.signature_image = get_thumbnail(participant.id, participant.signed_at)
+            if not data.signature_image and participant.signature_data:
+                data.signature_image = build_thumbnail(participant.id, participant.signed_at,
+                                                       participant.signature_data)
+        snapshots.append(data)
+
+    return _document(
+        'participants',
+        f'Teilnehmerliste_{project.name}.pdf',
+        snapshot(project, PDFGenerator.PROJECT_COLUMNS),
+        snapshots
+    )
+
+
+def _load_unterweisung(unterweisung_id):
+    unterweisung = Unterweisung.query.get(unterweisung_id)
+    if not unterweisung:
+        return None
+
+    project = Project.query.get(unterweisung.project_id)
+
+    data = snapshot(unterweisung, PDFGenerator.UNTERWEISUNG_COLUMNS)
+    items = UnterweisungItem.query.filter_by(unterweisung_id=unterweisung_id) \
+        .order_by(UnterweisungItem.sort_order, UnterweisungItem.id).all()
+    data.items = [snapshot(item, PDFGenerator.UNTERWEISUNG_ITEM_COLUMNS) for item in items]
+
+    return _document(
+        'unterweisung',
+        # A project can have several Unterweisungen, the id keeps their files apart
+        f'Unterweisung_{project.name}_{unterweisung_id}.pdf' if project else f'Unterweisung_{unterweisung_id}.pdf',
+        data,
+        snapshot(project, PDFGenerator.PROJECT_COLUMNS) if project else None,
+        # The footer prints the render date
+        datetime.now().strftime('%d.%m.%Y')
+    )
+
+
+def render_document(kind, args, output=None, executor=None, **kwargs):
+    """Render a document into output, or into a spooled buffer that is returned"""
+    pdf_gen = PDFGenerator(**kwargs)
+    if kind == 'gbu':
+        return pdf_gen.generate_gbu_overview(*args, output=output, executor=executor)
+    if kind == 'participants':
+        return pdf_gen.generate_participants_list(*args, output=output)
+    if kind == 'unterweisung':
+        unterweisung, project, _ = args
+        return pdf_gen.generate_unterweisung(unterweisung, project, output=output)
+    raise ValueError(f'Unknown document kind: {kind}')
+
+
+def render_cached(document):
+    """Return an open file with the document, rendering and caching it on a miss"""
+    cache = get_pdf_cache()
+    pdf_path = cache.get(document.key)
+    if pdf_path:
+        return open(pdf_path, 'rb')
+
+    # Large GBU overviews render their Bereiche in the PDF process pool
+    parallel_min_rows = current_app.config['PDF_PARALLEL_MIN_ROWS']
+    executor = None
+    if document.kind == 'gbu' and sum(len(rows) for rows in document.args[1].values()) >= parallel_min_rows:
+        executor = current_app.extensions['pdf_jobs'].executor
+
+    buffer = render_document(
+        document.kind, document.args,
+        executor=executor,
+        spool_max_bytes=current_app.config['PDF_SPOOL_MAX_BYTES'],
+        parallel_min_rows=parallel_min_rows
+    )
+    cache.put_stream(document.key, buffer)
+    buffer.seek(0)
+    return buffer
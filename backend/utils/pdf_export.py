@@ -0,0 +1,79 @@
+import io
+import re
+import zipfile
+
+CHUNK_SIZE = 64 * 1024
+
+
+class _ZipStream(io.RawIOBase):
+    """Write-only, unseekable buffer that zipfile writes into and we drain into the response"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _safe_name(name):
+    return re.sub(r'[\\/:*?"<>|]+', '_', name or '').strip() or 'unbenannt'
+
+
+def _unique_name(names, folder, filename):
+    """filename, numbered if the folder already has an entry of that name"""
+    stem, dot, extension = filename.rpartition('.')
+    if not dot:
+        stem, extension = filename, ''
+    candidate, number = filename, 1
+    while f'{folder}/{candidate}'.lower() in names:
+        number += 1
+        candidate = f'{stem}_{number}{dot}{extension}'
+    names.add(f'{folder}/{candidate}'.lower())
+    return candidate
+
+
+def stream_zip(entries):
+    """Stream a ZIP archive of (folder, document, path, error) entries as they arrive
+
+    PDFs are stored uncompressed since they are already compressed internally.
+    Failed documents are added as a text file so one error does not abort the archive.
+    """
+    stream = _ZipStream()
+    names = set()
+    with zipfile.ZipFile(stream, 'w', compression=zipfile.ZIP_STORED, allowZip64=True) as archive:
+        for folder, document, pdf_path, error in entries:
+            folder = _safe_name(folder)
+            filename = _unique_name(names, folder, _safe_name(document.filename))
+
+            if error is None:
+                try:
+                    source = open(pdf_path, 'rb')
+                except FileNotFoundError:
+                    error = 'PDF was evicted from the cache during export'
+
+            if error is not None:
+                archive.writestr(f'{folder}/FEHLER_{filename}.txt', error)
+                yield stream.drain()
+                continue
+
+            with source, archive.open(f'{folder}/{filename}', 'w', force_zip64=True) as target:
+                while True:
+                    chunk = source.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    target.write(chunk)
+                    yield stream.drain()
+
+            yield stream.drain()
+
+    # Central directory
+    yield stream.drain()
@@ -1,56 +1,225 @@
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import A4, landscape
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import cm
 from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak, Image
-from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT
+from reportlab.pdfgen import canvas
+from utils.pdf_icons import Icon
+from utils.pdf_styles import get_registry
+from contextlib import contextmanager
 from datetime import datetime
-import os
+import io
+import logging
 import tempfile
+import threading
+import time
+import tracemalloc
+
+try:
+    from pypdf import PdfReader, PdfWriter
+except ImportError:  # parallel GBU rendering needs pypdf
+    PdfReader = PdfWriter = None
+
+logger = logging.getLogger(__name__)
+
+# Held by the render whose allocations tracemalloc is tracing
+_tracing_lock = threading.Lock()
+
+# Renders larger than this spill from memory to an anonymous temp file
+SPOOL_MAX_BYTES = 8 * 1024 * 1024
+
+# GBU overviews with at least this many rows render their sections in parallel
+PARALLEL_MIN_ROWS = 1000
+
+# Maximum number of rows in a single GBU table
+TABLE_CHUNK_ROWS = 200
+
+# Text columns of an Unterweisung in print order, with their headings
+UNTERWEISUNG_SECTIONS = (
+    ('organisation', 'Organisation'),
+    ('allgemeine_hinweise', 'Allgemeine Hinweise'),
+    ('notfaelle_raeumung', 'Notfälle, Räumung'),
+    ('zusaetzliche_regeln', 'Zusätzliche Regeln'),
+    ('weitere_hinweise', 'Weitere Hinweise'),
+)
+
+# UnterweisungItem.section values and the text column they are printed under
+UNTERWEISUNG_ITEM_SECTIONS = {
+    'organisation': 'organisation',
+    'allgemeine_hinweise': 'allgemeine_hinweise',
+    'notfaelle': 'notfaelle_raeumung',
+    'notfaelle_raeumung': 'notfaelle_raeumung',
+    'zusaetzliche_regeln': 'zusaetzliche_regeln',
+}
+
+GBU_PAGE = dict(pagesize=landscape(A4),
+                rightMargin=1*cm, leftMargin=1*cm,
+                topMargin=1*cm, bottomMargin=1*cm)
+
+
+@contextmanager
+def _traced_peak():
+    """Trace the Python allocations of the block, the yielded dict gets their peak in bytes
+
+    The peak stays None while another render is traced, whose allocations
+    would be mixed in, or when tracemalloc was already started elsewhere.
+    Allocations in executor processes of a parallel render are not included.
+    """
+    memory = {'peak': None}
+    if not _tracing_lock.acquire(blocking=False):
+        yield memory
+        return
+    try:
+        if tracemalloc.is_tracing():
+            yield memory
+            return
+        tracemalloc.start()
+        try:
+            yield memory
+            memory['peak'] = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    finally:
+        _tracing_lock.release()
+
+
+def _draw_page_number(pdf_canvas, page, total, pagesize):
+    pdf_canvas.setFont(get_registry().font, 8)
+    pdf_canvas.setFillColor(colors.grey)
+    pdf_canvas.drawRightString(pagesize[0] - 1*cm, 0.5*cm, f'Seite {page} von {total}')
+
+
+class NumberedCanvas(canvas.Canvas):
+    """Canvas that holds back pages until the total page count is known"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._saved_page_states = []
+
+    def showPage(self):
+        self._saved_page_states.append(dict(self.__dict__))
+        self._startPage()
+
+    def save(self):
+        total = len(self._saved_page_states)
+        for number, state in enumerate(self._saved_page_states, start=1):
+            self.__dict__.update(state)
+            _draw_page_number(self, number, total, self._pagesize)
+            super().showPage()
+        super().save()
+
+
+def _page_number_overlay(total, pagesize):
+    """Render a PDF holding only the page numbers, to be stamped onto merged pages"""
+    buffer = io.BytesIO()
+    overlay = canvas.Canvas(buffer, pagesize=pagesize)
+    for number in range(1, total + 1):
+        _draw_page_number(overlay, number, total, pagesize)
+        overlay.showPage()
+    overlay.save()
+    return buffer.getvalue()
+
+
+def _gbu_sections(project, gefaehrdungen_by_bereich):
+    """Split a GBU overview into independently renderable sections"""
+    bereich_counts = [(name, len(rows)) for name, rows in gefaehrdungen_by_bereich.items()]
+    sections = [('cover', project, bereich_counts)]
+    for bereich_name, gefaehrdungen in gefaehrdungen_by_bereich.items():
+        sections.append(('bereich', bereich_name, gefaehrdungen))
+    sections.append(('legend',))
+    return sections
+
+
+def render_gbu_section(section):
+    """Render one GBU overview section to PDF bytes, runs in a pool worker"""
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer, **GBU_PAGE)
+    doc.build(PDFGenerator().gbu_section_elements(section))
+    return buffer.getvalue()
+
 
 class PDFGenerator:
-    def __init__(self):
-        self.styles = getSampleStyleSheet()
-        self.setup_custom_styles()
-
-    def setup_custom_styles(self):
-        """Setup custom paragraph styles"""
-        self.styles.add(ParagraphStyle(
-            name='CustomTitle',
-            parent=self.styles['Heading1'],
-            fontSize=16,
-            textColor=colors.HexColor('#1a237e'),
-            spaceAfter=30,
-            alignment=TA_CENTER
-        ))
-
-        self.styles.add(ParagraphStyle(
-            name='CustomHeading',
-            parent=self.styles['Heading2'],
-            fontSize=12,
-            textColor=colors.HexColor('#1a237e'),
-            spaceAfter=12,
-            spaceBefore=12
-        ))
-
-        self.styles.add(ParagraphStyle(
-            name='CustomBody',
-            parent=self.styles['BodyText'],
-            fontSize=9,
-            alignment=TA_LEFT
-        ))
-
-    def generate_gbu_overview(self, project, gefaehrdungen_by_bereich):
-        """Generate GBU overview PDF"""
-        # Create temp file
-        fd, temp_path = tempfile.mkstemp(suffix='.pdf')
-        os.close(fd)
+    # Bump when the layout changes so cached renders are rebuilt
+    LAYOUT_VERSION = 4
+
+    # Columns read from each row, used to key the render cache
+    PROJECT_COLUMNS = ('name', 'location', 'start_date', 'season', 'indoor_outdoor')
+    GEFAEHRDUNG_COLUMNS = (
+        'tätigkeit', 'gefährdung', 'schadenschwere', 'wahrscheinlichkeit', 'risikobewertung',
+        's_substitution', 't_technisch', 'o_organisatorisch', 'p_persoenlich', 'massnahmen'
+    )
+    PARTICIPANT_COLUMNS = ('last_name', 'first_name', 'company', 'position', 'signature_type', 'signed_at')
+    UNTERWEISUNG_COLUMNS = (
+        'title', 'veranstaltung', 'datum_ort', 'organisation',
+        'allgemeine_hinweise', 'notfaelle_raeumung', 'zusaetzliche_regeln'
+    )
+    UNTERWEISUNG_ITEM_COLUMNS = ('section', 'icon_type', 'content')
+
+    def __init__(self, spool_max_bytes=SPOOL_MAX_BYTES, parallel_min_rows=PARALLEL_MIN_ROWS):
+        self.spool_max_bytes = spool_max_bytes
+        self.parallel_min_rows = parallel_min_rows
+        registry = get_registry()
+        self.registry = registry
+        self.styles = registry.styles
+
+    def _open_output(self, output):
+        """Return the file to render into, by default a spooled in-memory buffer"""
+        if output is None:
+            output = tempfile.SpooledTemporaryFile(max_size=self.spool_max_bytes, suffix='.pdf')
+        return output
+
+    def _build(self, doc, elements, output, **build_kwargs):
+        """Build the document into output, log render cost and rewind the buffer"""
+        started = time.perf_counter()
+
+        with _traced_peak() as memory:
+            doc.build(elements, **build_kwargs)
+        self._log_render(output.tell(), started, memory['peak'])
+
+        output.seek(0)
+        return output
+
+    def _log_render(self, size, started, peak):
+        if peak is not None:
+            logger.info('Rendered %d byte PDF in %.2fs, peak Python allocations %.1f MB',
+                        size, time.perf_counter() - started, peak / 1024 / 1024)
+        else:
+            logger.info('Rendered %d byte PDF in %.2fs', size, time.perf_counter() - started)
+
+    def generate_gbu_overview(self, project, gefaehrdungen_by_bereich, output=None, executor=None):
+        """Generate GBU overview PDF
+
+        The overview consists of a cover page, one section per Bereich and the STOP legend.
+        With an executor and pypdf installed, large overviews render their sections in
+        parallel and are merged afterwards.
+        """
+        output = self._open_output(output)
+
+        row_count = sum(len(rows) for rows in gefaehrdungen_by_bereich.values())
+        if executor is not None and PdfWriter is not None and row_count >= self.parallel_min_rows:
+            return self._build_merged(executor, _gbu_sections(project, gefaehrdungen_by_bereich), output)
 
         # Create PDF
-        doc = SimpleDocTemplate(temp_path, pagesize=landscape(A4),
-                              rightMargin=1*cm, leftMargin=1*cm,
-                              topMargin=1*cm, bottomMargin=1*cm)
+        doc = SimpleDocTemplate(output, **GBU_PAGE)
+
+        elements = []
+        for section in _gbu_sections(project, gefaehrdungen_by_bereich):
+            if elements:
+                elements.append(PageBreak())
+            elements.extend(self.gbu_section_elements(section))
 
+        # Build PDF
+        return self._build(doc, elements, output, canvasmaker=NumberedCanvas)
+
+    def gbu_section_elements(self, section):
+        """Return the flowables of one GBU overview section"""
+        kind = section[0]
+        if kind == 'cover':
+            return self._gbu_cover_elements(*section[1:])
+        if kind == 'bereich':
+            return self._gbu_bereich_elements(*section[1:])
+        return self._gbu_legend_elements()
+
+    def _gbu_cover_elements(self, project, bereich_counts):
         elements = []
 
         # Title
@@ -67,45 +236,53 @@ class PDFGenerator:
         elements.append(info)
         elements.append(Spacer(1, 0.5*cm))
 
-        # Create table for each bereich
-        for bereich_name, gefaehrdungen in gefaehrdungen_by_bereich.items():
-            # Bereich heading
-            bereich_heading = Paragraph(f"Bereich: {bereich_name}", self.styles['CustomHeading'])
-            elements.append(bereich_heading)
-            elements.append(Spacer(1, 0.2*cm))
+        # Overview of the Bereiche that follow
+        if bereich_counts:
+            overview_data = [['Bereich', 'Gefährdungen']] + [[name, str(count)] for name, count in bereich_counts]
+            overview = Table(overview_data, colWidths=[10*cm, 3*cm], hAlign='LEFT')
+            overview.setStyle(self.registry.overview_table)
+            elements.append(overview)
 
-            # Table headers
-            table_data = [[
-                'Tätigkeit',
-                'Gefährdung',
-                'Schaden\nschwere',
-                'Wahr\nschein\nlichkeit',
-                'Risiko',
-                'S', 'T', 'O', 'P',
-                'Maßnahmen'
-            ]]
+        return elements
 
-            # Add data rows
-            for gef in gefaehrdungen:
-                # Determine color based on risk
-                risk_color = colors.white
-                if gef.risikobewertung == 'hoch':
-                    risk_color = colors.HexColor('#ff0000')
-                elif gef.risikobewertung == 'mittel':
-                    risk_color = colors.HexColor('#ffff00')
-                elif gef.risikobewertung == 'niedrig':
-                    risk_color = colors.HexColor('#00ff00')
+    def _gbu_bereich_elements(self, bereich_name, gefaehrdungen):
+        elements = []
+
+        # Bereich heading
+        bereich_heading = Paragraph(f"Bereich: {bereich_name}", self.styles['CustomHeading'])
+        elements.append(bereich_heading)
+        elements.append(Spacer(1, 0.2*cm))
+
+        # Table headers
+        header = [
+            'Tätigkeit',
+            'Gefährdung',
+            'Schaden\nschwere',
+            'Wahr\nschein\nlichkeit',
+            'Risiko',
+            'S', 'T', 'O', 'P',
+            'Maßnahmen'
+        ]
+
+        checkmark = self.registry.checkmark
+
+        # Split large Bereiche into several tables, layout cost of a single
+        # table grows superlinearly with its row count
+        for start in range(0, len(gefaehrdungen), TABLE_CHUNK_ROWS):
+            table_data = [header]
 
+            # Add data rows
+            for gef in gefaehrdungen[start:start + TABLE_CHUNK_ROWS]:
                 row = [
                     Paragraph(gef.tätigkeit or '', self.styles['CustomBody']),
                     Paragraph(gef.gefährdung or '', self.styles['CustomBody']),
                     str(gef.schadenschwere) if gef.schadenschwere else '',
                     str(gef.wahrscheinlichkeit) if gef.wahrscheinlichkeit else '',
                     Paragraph(gef.risikobewertung or '', self.styles['CustomBody']),
-                    '✓' if gef.s_substitution == 'WAHR' else '',
-                    '✓' if gef.t_technisch == 'WAHR' else '',
-                    '✓' if gef.o_organisatorisch == 'WAHR' else '',
-                    '✓' if gef.p_persoenlich == 'WAHR' else '',
+                    checkmark if gef.s_substitution == 'WAHR' else '',
+                    checkmark if gef.t_technisch == 'WAHR' else '',
+                    checkmark if gef.o_organisatorisch == 'WAHR' else '',
+                    checkmark if gef.p_persoenlich == 'WAHR' else '',
                     Paragraph(gef.massnahmen or '', self.styles['CustomBody'])
                 ]
                 table_data.append(row)
@@ -114,27 +291,16 @@ class PDFGenerator:
             col_widths = [3.5*cm, 4*cm, 1.2*cm, 1.2*cm, 1.5*cm, 0.7*cm, 0.7*cm, 0.7*cm, 0.7*cm, 5*cm]
             table = Table(table_data, colWidths=col_widths, repeatRows=1)
 
-            # Table style
-            table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#1a237e')),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-                ('ALIGN', (2, 0), (4, -1), 'CENTER'),
-                ('ALIGN', (5, 0), (8, -1), 'CENTER'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, 0), 8),
-                ('FONTSIZE', (0, 1), (-1, -1), 8),
-                ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
-                ('TOPPADDING', (0, 0), (-1, 0), 8),
-                ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-                ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-            ]))
+            table.setStyle(self.registry.gbu_table)
 
             elements.append(table)
-            elements.append(Spacer(1, 0.5*cm))
 
+        elements.append(Spacer(1, 0.5*cm))
+        return elements
+
+    def _gbu_legend_elements(self):
         # Add STOP principle legend
-        elements.append(PageBreak())
+        elements = []
         legend_title = Paragraph("STOP-Prinzip", self.styles['CustomHeading'])
         elements.append(legend_title)
         legend_text = """
@@ -145,20 +311,38 @@ class PDFGenerator:
         """
         legend = Paragraph(legend_text, self.styles['CustomBody'])
         elements.append(legend)
+        return elements
 
-        # Build PDF
-        doc.build(elements)
+    def _build_merged(self, executor, sections, output):
+        """Render sections in parallel, merge them and stamp page numbers"""
+        started = time.perf_counter()
+
+        with _traced_peak() as memory:
+            readers = [PdfReader(io.BytesIO(section_pdf))
+                       for section_pdf in executor.map(render_gbu_section, sections)]
+            page_count = sum(len(reader.pages) for reader in readers)
+            numbers = PdfReader(io.BytesIO(_page_number_overlay(page_count, GBU_PAGE['pagesize'])))
+
+            # Stamp pages before adding them, so the writer holds no orphaned content streams
+            writer = PdfWriter()
+            number_pages = iter(numbers.pages)
+            for reader in readers:
+                for page in reader.pages:
+                    page.merge_page(next(number_pages))
+                    writer.add_page(page).compress_content_streams()
 
-        return temp_path
+            writer.write(output)
+        self._log_render(output.tell(), started, memory['peak'])
 
-    def generate_participants_list(self, project, participants):
+        output.seek(0)
+        return output
+
+    def generate_participants_list(self, project, participants, output=None):
         """Generate participants list PDF with signature spaces"""
-        # Create temp file
-        fd, temp_path = tempfile.mkstemp(suffix='.pdf')
-        os.close(fd)
+        output = self._open_output(output)
 
         # Create PDF
-        doc = SimpleDocTemplate(temp_path, pagesize=A4,
+        doc = SimpleDocTemplate(output, pagesize=A4,
                               rightMargin=2*cm, leftMargin=2*cm,
                               topMargin=2*cm, bottomMargin=2*cm)
 
@@ -190,14 +374,20 @@ class PDFGenerator:
 
         # Add participant rows
         for idx, participant in enumerate(participants, start=1):
+            signature = ''  # Signature space
+            signed_date = ''  # Date space
+            if getattr(participant, 'signature_image', None):
+                signature = Image(participant.signature_image, width=2.8*cm, height=0.9*cm, kind='bound')
+                signed_date = participant.signed_at.strftime('%d.%m.%Y')
+
             row = [
                 str(idx),
                 participant.last_name or '',
                 participant.first_name or '',
                 participant.company or '',
                 participant.position or '',
-                '',  # Signature space
-                ''   # Date space
+                signature,
+                signed_date
             ]
             table_data.append(row)
 
@@ -209,36 +399,34 @@ class PDFGenerator:
         col_widths = [1*cm, 3.5*cm, 3.5*cm, 3.5*cm, 3*cm, 3*cm, 2*cm]
         table = Table(table_data, colWidths=col_widths, repeatRows=1)
 
-        # Table style
-        table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#1a237e')),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (0, -1), 'CENTER'),
-            ('ALIGN', (1, 0), (-1, -1), 'LEFT'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 10),
-            ('FONTSIZE', (0, 1), (-1, -1), 9),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-            ('TOPPADDING', (0, 0), (-1, -1), 8),
-            ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-        ]))
+        table.setStyle(self.registry.participants_table)
 
         elements.append(table)
 
         # Build PDF
-        doc.build(elements)
-
-        return temp_path
-
-    def generate_unterweisung(self, unterweisung, project):
+        return self._build(doc, elements, output)
+
+    def _icon_list(self, items, width):
+        """Table of items, each with its pictogram next to the text"""
+        icon_size = 0.9*cm
+        rows = []
+        for item in items:
+            reader = self.registry.icons.get(item.icon_type)
+            rows.append([
+                Icon(reader, icon_size) if reader else '',
+                Paragraph((item.content or '').replace('\n', '<br/>'), self.styles['CustomBody'])
+            ])
+
+        table = Table(rows, colWidths=[icon_size + 0.4*cm, width - icon_size - 0.4*cm])
+        table.setStyle(self.registry.icon_list_table)
+        return table
+
+    def generate_unterweisung(self, unterweisung, project, output=None):
         """Generate unterweisung PDF"""
-        # Create temp file
-        fd, temp_path = tempfile.mkstemp(suffix='.pdf')
-        os.close(fd)
+        output = self._open_output(output)
 
         # Create PDF
-        doc = SimpleDocTemplate(temp_path, pagesize=A4,
+        doc = SimpleDocTemplate(output, pagesize=A4,
                               rightMargin=2*cm, leftMargin=2*cm,
                               topMargin=2*cm, bottomMargin=2*cm)
 
@@ -260,36 +448,25 @@ class PDFGenerator:
             elements.append(Paragraph(datum_ort_text, self.styles['CustomBody']))
             elements.append(Spacer(1, 0.5*cm))
 
-        # Organisation section
-        if unterweisung.organisation:
-            org_heading = Paragraph("Organisation", self.styles['CustomHeading'])
-            elements.append(org_heading)
-            org_text = unterweisung.organisation.replace('\n', '<br/>')
-            elements.append(Paragraph(org_text, self.styles['CustomBody']))
-            elements.append(Spacer(1, 0.5*cm))
-
-        # Allgemeine Hinweise section
-        if unterweisung.allgemeine_hinweise:
-            hints_heading = Paragraph("Allgemeine Hinweise", self.styles['CustomHeading'])
-            elements.append(hints_heading)
-            hints_text = unterweisung.allgemeine_hinweise.replace('\n', '<br/>')
-            elements.append(Paragraph(hints_text, self.styles['CustomBody']))
-            elements.append(Spacer(1, 0.5*cm))
-
-        # Notfälle und Räumung section
-        if unterweisung.notfaelle_raeumung:
-            notfall_heading = Paragraph("Notfälle, Räumung", self.styles['CustomHeading'])
-            elements.append(notfall_heading)
-            notfall_text = unterweisung.notfaelle_raeumung.replace('\n', '<br/>')
-            elements.append(Paragraph(notfall_text, self.styles['CustomBody']))
-            elements.append(Spacer(1, 0.5*cm))
-
-        # Additional rules
-        if unterweisung.zusaetzliche_regeln:
-            rules_heading = Paragraph("Zusätzliche Regeln", self.styles['CustomHeading'])
-            elements.append(rules_heading)
-            rules_text = unterweisung.zusaetzliche_regeln.replace('\n', '<br/>')
-            elements.append(Paragraph(rules_text, self.styles['CustomBody']))
+        # Group icon items by the section they belong to
+        items_by_section = {}
+        for item in getattr(unterweisung, 'items', None) or []:
+            section = UNTERWEISUNG_ITEM_SECTIONS.get(item.section, 'weitere_hinweise')
+            items_by_section.setdefault(section, []).append(item)
+
+        for column, heading in UNTERWEISUNG_SECTIONS:
+            text = getattr(unterweisung, column, None)
+            items = items_by_section.get(column)
+            if not text and not items:
+                continue
+
+            elements.append(Paragraph(heading, self.styles['CustomHeading']))
+            if text:
+                elements.append(Paragraph(text.replace('\n', '<br/>'), self.styles['CustomBody']))
+            if items:
+                if text:
+                    elements.append(Spacer(1, 0.3*cm))
+                elements.append(self._icon_list(items, doc.width))
             elements.append(Spacer(1, 0.5*cm))
 
         # Footer
@@ -299,6 +476,4 @@ class PDFGenerator:
         elements.append(footer)
 
         # Build PDF
-        doc.build(elements)
-
-        return temp_path
+        return self._build(doc, elements, output)
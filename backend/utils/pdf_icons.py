@@ -0,0 +1,160 @@
+from PIL import Image, ImageDraw
+from reportlab.lib.utils import ImageReader
+from reportlab.platypus import Flowable
+
+# Safety pictograms used by UnterweisungItem.icon_type, in atlas order
+ICON_TYPES = ('info', 'prohibited', 'no_smoking', 'fire', 'exit', 'assembly', 'phone', 'no_blocking')
+
+# Pixel size of one atlas cell, enough for a 1cm icon at 240 dpi
+ICON_PIXELS = 96
+
+# Icons are drawn at this multiple of ICON_PIXELS and downscaled for smooth edges
+_SUPERSAMPLE = 4
+
+RED = (200, 30, 40)
+BLUE = (20, 80, 160)
+GREEN = (0, 130, 70)
+WHITE = (255, 255, 255)
+BLACK = (0, 0, 0)
+
+
+def _prohibition(draw, size):
+    """Red ring with a diagonal bar, the obstacle is drawn before the bar"""
+    ring = size // 10
+    draw.ellipse((ring // 2, ring // 2, size - ring // 2, size - ring // 2), fill=WHITE, outline=RED, width=ring)
+
+
+def _prohibition_bar(draw, size):
+    ring = size // 10
+    inset = size * 0.2
+    draw.line((inset, inset, size - inset, size - inset), fill=RED, width=ring)
+
+
+def _draw_info(draw, size):
+    draw.ellipse((0, 0, size, size), fill=BLUE)
+    stroke = size // 8
+    draw.ellipse((size / 2 - stroke * 0.7, size * 0.18, size / 2 + stroke * 0.7, size * 0.18 + stroke * 1.4), fill=WHITE)
+    draw.rectangle((size / 2 - stroke / 2, size * 0.4, size / 2 + stroke / 2, size * 0.8), fill=WHITE)
+
+
+def _draw_prohibited(draw, size):
+    _prohibition(draw, size)
+    _prohibition_bar(draw, size)
+
+
+def _draw_no_smoking(draw, size):
+    _prohibition(draw, size)
+    draw.rectangle((size * 0.22, size * 0.48, size * 0.68, size * 0.58), fill=BLACK)
+    draw.rectangle((size * 0.7, size * 0.48, size * 0.76, size * 0.58), fill=BLACK)
+    draw.line((size * 0.73, size * 0.45, size * 0.7, size * 0.3), fill=BLACK, width=size // 30)
+    _prohibition_bar(draw, size)
+
+
+def _draw_no_blocking(draw, size):
+    _prohibition(draw, size)
+    draw.rectangle((size * 0.3, size * 0.38, size * 0.7, size * 0.72), fill=BLACK)
+    draw.line((size * 0.3, size * 0.38, size * 0.7, size * 0.72), fill=WHITE, width=size // 40)
+    draw.line((size * 0.7, size * 0.38, size * 0.3, size * 0.72), fill=WHITE, width=size // 40)
+    _prohibition_bar(draw, size)
+
+
+def _draw_fire(draw, size):
+    draw.rectangle((0, 0, size, size), fill=RED)
+    draw.polygon([
+        (size * 0.5, size * 0.12), (size * 0.72, size * 0.45), (size * 0.66, size * 0.3),
+        (size * 0.8, size * 0.62), (size * 0.7, size * 0.85), (size * 0.3, size * 0.85),
+        (size * 0.2, size * 0.62), (size * 0.34, size * 0.36), (size * 0.38, size * 0.5),
+    ], fill=WHITE)
+
+
+def _draw_exit(draw, size):
+    draw.rectangle((0, 0, size, size), fill=GREEN)
+    # Door frame with a figure heading out
+    draw.rectangle((size * 0.55, size * 0.15, size * 0.85, size * 0.85), outline=WHITE, width=size // 25)
+    draw.ellipse((size * 0.3, size * 0.18, size * 0.42, size * 0.3), fill=WHITE)
+    draw.line((size * 0.34, size * 0.32, size * 0.3, size * 0.58), fill=WHITE, width=size // 12)
+    draw.line((size * 0.3, size * 0.58, size * 0.42, size * 0.82), fill=WHITE, width=size // 14)
+    draw.line((size * 0.3, size * 0.58, size * 0.16, size * 0.78), fill=WHITE, width=size // 14)
+    draw.line((size * 0.33, size * 0.4, size * 0.5, size * 0.48), fill=WHITE, width=size // 16)
+    draw.polygon([(size * 0.58, size * 0.5), (size * 0.72, size * 0.4), (size * 0.72, size * 0.6)], fill=WHITE)
+
+
+def _draw_assembly(draw, size):
+    draw.rectangle((0, 0, size, size), fill=GREEN)
+    # Four arrows pointing at a group of people
+    arrow = size * 0.1
+    for x, y, dx, dy in ((0.12, 0.12, 1, 1), (0.88, 0.12, -1, 1), (0.12, 0.88, 1, -1), (0.88, 0.88, -1, -1)):
+        tip = (size * x + dx * arrow * 1.6, size * y + dy * arrow * 1.6)
+        draw.polygon([tip, (tip[0] - dx * arrow, tip[1]), (tip[0], tip[1] - dy * arrow)], fill=WHITE)
+        draw.line((size * x, size * y, tip[0] - dx * arrow * 0.4, tip[1] - dy * arrow * 0.4), fill=WHITE, width=size // 30)
+    for x in (0.38, 0.5, 0.62):
+        draw.ellipse((size * (x - 0.05), size * 0.36, size * (x + 0.05), size * 0.46), fill=WHITE)
+        draw.rectangle((size * (x - 0.045), size * 0.48, size * (x + 0.045), size * 0.66), fill=WHITE)
+
+
+def _draw_phone(draw, size):
+    draw.rectangle((0, 0, size, size), fill=GREEN)
+    # Handset: two ear pieces joined by an arc
+    draw.arc((size * 0.18, size * 0.2, size * 0.82, size * 0.9), 200, 340, fill=WHITE, width=size // 10)
+    draw.rounded_rectangle((size * 0.14, size * 0.42, size * 0.34, size * 0.58), radius=size // 30, fill=WHITE)
+    draw.rounded_rectangle((size * 0.66, size * 0.42, size * 0.86, size * 0.58), radius=size // 30, fill=WHITE)
+    draw.rectangle((size * 0.3, size * 0.66, size * 0.7, size * 0.82), fill=WHITE)
+
+
+_DRAWERS = {
+    'info': _draw_info,
+    'prohibited': _draw_prohibited,
+    'no_smoking': _draw_no_smoking,
+    'fire': _draw_fire,
+    'exit': _draw_exit,
+    'assembly': _draw_assembly,
+    'phone': _draw_phone,
+    'no_blocking': _draw_no_blocking,
+}
+
+
+def build_atlas():
+    """Rasterize all pictograms side by side into one RGB image"""
+    size = ICON_PIXELS * _SUPERSAMPLE
+    atlas = Image.new('RGB', (ICON_PIXELS * len(ICON_TYPES), ICON_PIXELS), WHITE)
+    for index, icon_type in enumerate(ICON_TYPES):
+        cell = Image.new('RGB', (size, size), WHITE)
+        _DRAWERS[icon_type](ImageDraw.Draw(cell), size)
+        atlas.paste(cell.resize((ICON_PIXELS, ICON_PIXELS), Image.LANCZOS), (index * ICON_PIXELS, 0))
+    return atlas
+
+
+class IconAtlas:
+    """Pictograms rasterized once per process, one ImageReader per icon type
+
+    Reportlab keys image XObjects by their pixel data, so every use of an icon
+    within a document references the same embedded image.
+    """
+
+    def __init__(self):
+        atlas = build_atlas()
+        self._readers = {}
+        for index, icon_type in enumerate(ICON_TYPES):
+            cell = atlas.crop((index * ICON_PIXELS, 0, (index + 1) * ICON_PIXELS, ICON_PIXELS))
+            reader = ImageReader(cell)
+            reader.getRGBData()  # decode now instead of on every draw
+            self._readers[icon_type] = reader
+
+    def get(self, icon_type):
+        """Return the ImageReader of an icon, or None for unknown icon types"""
+        return self._readers.get(icon_type)
+
+
+class Icon(Flowable):
+    """A square pictogram drawn from the icon atlas"""
+
+    def __init__(self, reader, size):
+        super().__init__()
+        self.reader = reader
+        self.size = size
+
+    def wrap(self, available_width, available_height):
+        return self.size, self.size
+
+    def draw(self):
+        self.canv.drawImage(self.reader, 0, 0, width=self.size, height=self.size)
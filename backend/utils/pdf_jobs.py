@@ -0,0 +1,298 @@
+import json
+import multiprocessing
+import os
+import signal
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from flask import current_app
+from utils.pdf_cache import PDFCache
+from utils.pdf_documents import render_document
+from utils.pdf_styles import init_registry
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+# Seconds past the timeout after which a running job whose worker never reported back is failed
+JOB_STALE_GRACE_SECONDS = 60
+
+
+def _init_worker(memory_limit, font_path):
+    """Apply the memory cap and load fonts and styles in a freshly started worker process"""
+    if resource and memory_limit:
+        resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+    init_registry(font_path)
+
+
+def _raise_timeout(signum, frame):
+    raise TimeoutError('PDF job timed out')
+
+
+def _run_job(job_path, pdf_path, kind, args, key, timeout, cache_directory, cache_max_bytes):
+    """Render a document into the cache inside a worker process and record the outcome in the job
+
+    The worker writes the final state itself, so a job still finishes when
+    the web process that submitted it was restarted in the meantime.
+    """
+    _update_job(job_path, status='running', started_at=datetime.utcnow().isoformat(), worker_pid=os.getpid())
+    try:
+        _render_file(pdf_path, kind, args, timeout)
+    except MemoryError:
+        _update_job(job_path, status='failed', error='PDF job exceeded memory limit',
+                    finished_at=datetime.utcnow().isoformat())
+        raise
+    except Exception as e:
+        _update_job(job_path, status='failed', error=str(e) or type(e).__name__,
+                    finished_at=datetime.utcnow().isoformat())
+        raise
+    PDFCache(cache_directory, cache_max_bytes).put(key, pdf_path)
+    _update_job(job_path, status='done', finished_at=datetime.utcnow().isoformat())
+
+
+def _render_file(pdf_path, kind, args, timeout):
+    """Render a document to pdf_path, aborting after timeout seconds"""
+    use_alarm = timeout and hasattr(signal, 'SIGALRM')
+    if use_alarm:
+        signal.signal(signal.SIGALRM, _raise_timeout)
+        signal.alarm(timeout)
+    try:
+        with open(pdf_path, 'wb') as output:
+            render_document(kind, args, output=output)
+    except BaseException:
+        if os.path.exists(pdf_path):
+            os.remove(pdf_path)
+        raise
+    finally:
+        if use_alarm:
+            signal.alarm(0)
+
+
+def _process_alive(pid):
+    """Whether a process with this pid runs on this host, assumed where it can't be checked"""
+    if os.name != 'posix' or not pid:
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _read_job(job_path):
+    try:
+        with open(job_path, encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def _write_job(job_path, job):
+    temp_path = f'{job_path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(job, f)
+    os.replace(temp_path, job_path)
+
+
+def _update_job(job_path, **changes):
+    job = _read_job(job_path)
+    if job is not None:
+        job.update(changes)
+        _write_job(job_path, job)
+
+
+class PDFJobQueue:
+    """Renders PDFs in a bounded process pool, tracking jobs as files on disk"""
+
+    def __init__(self, directory, cache, max_workers, timeout, memory_limit, retention, font_path=None):
+        self.directory = directory
+        self.cache = cache
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.memory_limit = memory_limit
+        self.font_path = font_path
+        self.retention = retention
+        self._executor = None
+        self._lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+
+    @property
+    def executor(self):
+        """The process pool, started on first use so it is never forked into other workers"""
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_init_worker,
+                    initargs=(self.memory_limit, self.font_path)
+                )
+            return self._executor
+
+    def _reset_executor(self, broken):
+        """Replace a broken pool (e.g. a worker was killed for memory), a new one starts on next use
+
+        The broken pool is shut down so its remaining worker processes exit.
+        """
+        with self._lock:
+            if self._executor is broken:
+                self._executor = None
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    def _job_path(self, job_id):
+        return os.path.join(self.directory, f'{job_id}.json')
+
+    def _pdf_path(self, job_id):
+        return os.path.join(self.directory, f'{job_id}.pdf')
+
+    def get(self, job_id):
+        """Return the job with the given id, or None"""
+        try:
+            job_id = uuid.UUID(job_id).hex
+        except ValueError:
+            return None
+        job_path = self._job_path(job_id)
+        job = _read_job(job_path)
+        if job is not None and self._abandoned(job):
+            job.update(status='failed', error='PDF job was abandoned, please submit it again',
+                       finished_at=datetime.utcnow().isoformat())
+            _write_job(job_path, job)
+        return job
+
+    def _abandoned(self, job):
+        """Whether an unfinished job has nobody left to finish it
+
+        A queued job is lost with the process that submitted it, a running job
+        with its worker. A running job is also given up once it overran the
+        timeout, which covers other hosts and platforms without a pid check.
+        """
+        if job['status'] not in ('queued', 'running'):
+            return False
+        if job['status'] == 'running':
+            if self.timeout and job.get('started_at'):
+                running = (datetime.utcnow() - datetime.fromisoformat(job['started_at'])).total_seconds()
+                if running > self.timeout + JOB_STALE_GRACE_SECONDS:
+                    return True
+            pid = job.get('worker_pid')
+        else:
+            pid = job.get('pid')
+        return job.get('host') == socket.gethostname() and not _process_alive(pid)
+
+    def submit(self, document, user_id):
+        """Queue a document for rendering and return the new job"""
+        self.cleanup()
+
+        job = {
+            'id': uuid.uuid4().hex,
+            'kind': document.kind,
+            'key': document.key,
+            'filename': document.filename,
+            'user_id': user_id,
+            'host': socket.gethostname(),
+            'pid': os.getpid(),
+            'status': 'queued',
+            'error': None,
+            'created_at': datetime.utcnow().isoformat(),
+            'started_at': None,
+            'finished_at': None,
+        }
+        job_path = self._job_path(job['id'])
+
+        # Nothing to render if the document is already cached
+        if self.cache.get(document.key):
+            job.update(status='done', finished_at=datetime.utcnow().isoformat())
+            _write_job(job_path, job)
+            return job
+
+        _write_job(job_path, job)
+        pdf_path = self._pdf_path(job['id'])
+        executor = self.executor
+        future = executor.submit(_run_job, job_path, pdf_path, document.kind, document.args, document.key,
+                                 self.timeout, self.cache.directory, self.cache.max_bytes)
+        future.add_done_callback(lambda f: self._finish(job_path, executor, f))
+        return job
+
+    def render_many(self, items, window=None):
+        """Render (tag, document) items in parallel, yielding (tag, document, path, error) as each finishes
+
+        items may be a lazy iterable. It is only consumed while fewer than
+        window renders are in flight (twice the pool size by default), so
+        loading, rendering and sending overlap and memory stays bounded however
+        many documents there are. Cached documents are yielded as they come up.
+        """
+        window = window or 2 * self.max_workers
+        items = iter(items)
+        futures = {}
+        try:
+            exhausted = False
+            while True:
+                while not exhausted and len(futures) < window:
+                    item = next(items, None)
+                    if item is None:
+                        exhausted = True
+                        break
+                    tag, document = item
+                    pdf_path = self.cache.get(document.key)
+                    if pdf_path:
+                        yield tag, document, pdf_path, None
+                        continue
+                    pdf_path = self._pdf_path(uuid.uuid4().hex)
+                    executor = self.executor
+                    future = executor.submit(_render_file, pdf_path, document.kind, document.args, self.timeout)
+                    futures[future] = (tag, document, pdf_path, executor)
+
+                if not futures:
+                    return
+
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    tag, document, pdf_path, executor = futures.pop(future)
+                    try:
+                        future.result()
+                    except Exception as e:
+                        if isinstance(e, BrokenProcessPool):
+                            self._reset_executor(executor)
+                        yield tag, document, None, str(e) or type(e).__name__
+                        continue
+                    yield tag, document, self.cache.put(document.key, pdf_path), None
+        finally:
+            # Stop pending renders if the consumer goes away early
+            for future in futures:
+                future.cancel()
+
+    def _finish(self, job_path, executor, future):
+        """Record jobs whose worker could not, the worker writes every other outcome itself"""
+        if future.cancelled():
+            _update_job(job_path, status='failed', error='PDF job was cancelled', finished_at=datetime.utcnow().isoformat())
+        elif isinstance(future.exception(), BrokenProcessPool):
+            self._reset_executor(executor)
+            _update_job(job_path, status='failed', error='PDF worker crashed', finished_at=datetime.utcnow().isoformat())
+
+    def cleanup(self):
+        """Remove job records older than the retention period"""
+        cutoff = time.time() - self.retention
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                try:
+                    if entry.stat().st_mtime < cutoff:
+                        os.remove(entry.path)
+                except FileNotFoundError:
+                    continue
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+
+def get_pdf_jobs():
+    """Return the PDF job queue of the current app"""
+    return current_app.extensions['pdf_jobs']
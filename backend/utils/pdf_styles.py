@@ -0,0 +1,160 @@
+import logging
+import os
+from reportlab.lib import colors
+from reportlab.lib.enums import TA_CENTER, TA_LEFT
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.platypus import TableStyle
+from utils.pdf_icons import IconAtlas
+
+logger = logging.getLogger(__name__)
+
+# Unicode fonts tried in order when no PDF_FONT_PATH is configured
+FONT_CANDIDATES = (
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf',
+    '/usr/share/fonts/dejavu/DejaVuSans.ttf',
+    '/usr/share/fonts/TTF/DejaVuSans.ttf',
+    '/usr/local/share/fonts/DejaVuSans.ttf',
+    '/Library/Fonts/DejaVuSans.ttf',
+    'C:\\Windows\\Fonts\\DejaVuSans.ttf',
+)
+
+HEADER_COLOR = colors.HexColor('#1a237e')
+
+
+class StyleRegistry:
+    """Fonts, paragraph styles and table styles shared by every PDF of the process"""
+
+    def __init__(self, font_path=None):
+        self.font, self.bold_font = self._register_fonts(font_path)
+
+        # Helvetica cannot render '✓', fall back to the check glyph of ZapfDingbats
+        if self.font == 'Helvetica':
+            self.checkmark, self.checkmark_font = '4', 'ZapfDingbats'
+        else:
+            self.checkmark, self.checkmark_font = '✓', self.font
+
+        self.styles = self._build_styles()
+        self.gbu_table = self._build_gbu_table_style()
+        self.overview_table = self._build_overview_table_style()
+        self.participants_table = self._build_participants_table_style()
+        self.icon_list_table = self._build_icon_list_table_style()
+        self.icons = IconAtlas()
+
+    def _register_fonts(self, font_path):
+        """Register a Unicode TTF font family, reportlab embeds only the used glyphs"""
+        candidates = (font_path,) if font_path else FONT_CANDIDATES
+        for path in candidates:
+            if not os.path.exists(path):
+                continue
+            bold_path = path.replace('.ttf', '-Bold.ttf')
+            pdfmetrics.registerFont(TTFont('GBUSans', path))
+            pdfmetrics.registerFont(TTFont('GBUSans-Bold', bold_path if os.path.exists(bold_path) else path))
+            pdfmetrics.registerFontFamily('GBUSans', normal='GBUSans', bold='GBUSans-Bold',
+                                          italic='GBUSans', boldItalic='GBUSans-Bold')
+            return 'GBUSans', 'GBUSans-Bold'
+
+        logger.warning('No Unicode TTF font found, PDFs fall back to Helvetica')
+        return 'Helvetica', 'Helvetica-Bold'
+
+    def _build_styles(self):
+        styles = getSampleStyleSheet()
+        for name in ('Heading1', 'Heading2', 'BodyText'):
+            styles[name].fontName = self.bold_font if name.startswith('Heading') else self.font
+
+        styles.add(ParagraphStyle(
+            name='CustomTitle',
+            parent=styles['Heading1'],
+            fontSize=16,
+            textColor=HEADER_COLOR,
+            spaceAfter=30,
+            alignment=TA_CENTER
+        ))
+
+        styles.add(ParagraphStyle(
+            name='CustomHeading',
+            parent=styles['Heading2'],
+            fontSize=12,
+            textColor=HEADER_COLOR,
+            spaceAfter=12,
+            spaceBefore=12
+        ))
+
+        styles.add(ParagraphStyle(
+            name='CustomBody',
+            parent=styles['BodyText'],
+            fontSize=9,
+            alignment=TA_LEFT
+        ))
+
+        return styles
+
+    def _build_gbu_table_style(self):
+        return TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), HEADER_COLOR),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+            ('ALIGN', (2, 0), (4, -1), 'CENTER'),
+            ('ALIGN', (5, 0), (8, -1), 'CENTER'),
+            ('FONTNAME', (0, 0), (-1, 0), self.bold_font),
+            ('FONTNAME', (0, 1), (-1, -1), self.font),
+            ('FONTNAME', (5, 1), (8, -1), self.checkmark_font),
+            ('FONTSIZE', (0, 0), (-1, 0), 8),
+            ('FONTSIZE', (0, 1), (-1, -1), 8),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
+            ('TOPPADDING', (0, 0), (-1, 0), 8),
+            ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ])
+
+    def _build_overview_table_style(self):
+        return TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), HEADER_COLOR),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('FONTNAME', (0, 0), (-1, 0), self.bold_font),
+            ('FONTNAME', (0, 1), (-1, -1), self.font),
+            ('FONTSIZE', (0, 0), (-1, -1), 9),
+            ('ALIGN', (1, 0), (1, -1), 'CENTER'),
+            ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+        ])
+
+    def _build_participants_table_style(self):
+        return TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), HEADER_COLOR),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('ALIGN', (0, 0), (0, -1), 'CENTER'),
+            ('ALIGN', (1, 0), (-1, -1), 'LEFT'),
+            ('FONTNAME', (0, 0), (-1, 0), self.bold_font),
+            ('FONTNAME', (0, 1), (-1, -1), self.font),
+            ('FONTSIZE', (0, 0), (-1, 0), 10),
+            ('FONTSIZE', (0, 1), (-1, -1), 9),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
+            ('TOPPADDING', (0, 0), (-1, -1), 8),
+            ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ])
+
+    def _build_icon_list_table_style(self):
+        return TableStyle([
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+            ('LEFTPADDING', (0, 0), (0, -1), 0),
+            ('TOPPADDING', (0, 0), (-1, -1), 3),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 3),
+        ])
+
+
+_registry = None
+
+
+def init_registry(font_path=None):
+    """Build the process-wide registry, called once at app and PDF worker startup"""
+    global _registry
+    if _registry is None:
+        _registry = StyleRegistry(font_path)
+    return _registry
+
+
+def get_registry():
+    """Return the process-wide registry, building it with defaults if needed"""
+    return _registry or init_registry()
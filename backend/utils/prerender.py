@@ -0,0 +1,65 @@
+import logging
+import threading
+from models import db, Project, Unterweisung
+from utils.pdf_documents import load_document
+
+logger = logging.getLogger(__name__)
+
+
+class PrerenderScheduler:
+    """Re-renders the PDFs of active projects shortly after their data settles
+
+    Every change restarts the project's timer, so a burst of edits leads to a
+    single render once no change arrived for `delay` seconds.
+    """
+
+    def __init__(self, app, delay):
+        self.app = app
+        self.delay = delay
+        self._timers = {}
+        self._lock = threading.Lock()
+
+    def schedule(self, project_id):
+        with self._lock:
+            timer = self._timers.pop(project_id, None)
+            if timer is not None:
+                timer.cancel()
+            timer = threading.Timer(self.delay, self._run, args=(project_id,))
+            timer.daemon = True
+            self._timers[project_id] = timer
+            timer.start()
+
+    def on_project_content_changed(self, sender, project_id):
+        if project_id is not None:
+            self.schedule(project_id)
+
+    def _run(self, project_id):
+        with self._lock:
+            self._timers.pop(project_id, None)
+
+        with self.app.app_context():
+            try:
+                self.render_project(project_id)
+            except Exception:
+                logger.exception('Pre-rendering PDFs of project %s failed', project_id)
+            finally:
+                db.session.remove()
+
+    def render_project(self, project_id):
+        """Render all PDFs of an active project into the cache"""
+        project = db.session.query(Project.status).filter(Project.id == project_id).first()
+        if not project or project.status != 'aktiv':
+            return
+
+        items = [('gbu', load_document('gbu', project_id)),
+                 ('participants', load_document('participants', project_id))]
+        for (unterweisung_id,) in db.session.query(Unterweisung.id).filter_by(project_id=project_id):
+            items.append(('unterweisung', load_document('unterweisung', unterweisung_id)))
+        # Sources deleted since the change was queued have nothing to render
+        items = [(kind, document) for kind, document in items if document is not None]
+
+        for kind, document, pdf_path, error in self.app.extensions['pdf_jobs'].render_many(items):
+            if error:
+                logger.warning('Pre-rendering %s PDF of project %s failed: %s', kind, project_id, error)
+            else:
+                logger.info('Pre-rendered %s PDF of project %s', kind, project_id)
@@ -0,0 +1,101 @@
+from types import SimpleNamespace
+from models import db, Project, Gefaehrdung, Bereich, ProjectGBU
+from utils.gbu_data import load_overrides, load_pinned_links, apply_override
+
+# Group name for gefaehrdungen without a Bereich, listed last
+NO_BEREICH = 'Sonstige'
+
+
+def _columns(model, names):
+    return [getattr(model, name) for name in names]
+
+
+def load_project(project_id, columns):
+    """Load only the given project columns, or None if the project does not exist"""
+    row = db.session.query(*_columns(Project, columns)).filter(Project.id == project_id).first()
+    if row is None:
+        return None
+    return SimpleNamespace(**row._asdict())
+
+
+def load_gefaehrdungen_by_bereich(project_id, columns):
+    """Load a project's gefaehrdungen grouped by Bereich name
+
+    Includes the rows of templates the project overlays, in the version it
+    pinned and merged with the project's overrides. Groups follow
+    Bereich.sort_order with rows lacking a Bereich last, rows within a group
+    follow Gefaehrdung.sort_order. Only the given columns are selected, the
+    large Text columns a report does not print stay in the database. Runs one
+    query for the links pinned to an older template version, one for the
+    rows, plus one for overrides if the project overlays templates and two
+    for the snapshots and their Bereiche if a link is pinned.
+    """
+    pinned = load_pinned_links([project_id])
+    link_filter = (ProjectGBU.gbu_template_id == Gefaehrdung.gbu_template_id) \
+        & (ProjectGBU.project_id == project_id) & ProjectGBU.template_version.isnot(None)
+    if pinned:
+        link_filter = link_filter & ProjectGBU.id.notin_(pinned)
+    query = db.session.query(
+        Bereich.id.label('_bereich_id'),
+        Bereich.name.label('_bereich_name'),
+        Bereich.sort_order.label('_bereich_sort_order'),
+        Gefaehrdung.id.label('_gefaehrdung_id'),
+        Gefaehrdung.sort_order.label('_sort_order'),
+        ProjectGBU.id.label('_project_gbu_id'),
+        *_columns(Gefaehrdung, columns)
+    ) \
+        .outerjoin(Bereich, Gefaehrdung.bereich_id == Bereich.id) \
+        .outerjoin(ProjectGBU, link_filter) \
+        .filter((Gefaehrdung.project_id == project_id) | ProjectGBU.id.isnot(None)) \
+        .order_by(Bereich.id.is_(None), Bereich.sort_order, Bereich.id,
+                  Gefaehrdung.sort_order, Gefaehrdung.id)
+
+    rows = [row._asdict() for row in query]
+    if pinned:
+        rows = sorted(rows + _pinned_rows(pinned, columns), key=_report_order)
+    overrides = load_overrides({values['_project_gbu_id'] for values in rows if values['_project_gbu_id']})
+
+    gefaehrdungen_by_bereich = {}
+    for values in rows:
+        bereich_name = values.pop('_bereich_name') or NO_BEREICH
+        override = overrides.get((values.pop('_project_gbu_id'), values.pop('_gefaehrdung_id')))
+        del values['_bereich_id'], values['_bereich_sort_order'], values['_sort_order']
+        if override:
+            if override.removed:
+                continue
+            apply_override(values, override)
+        gefaehrdungen_by_bereich.setdefault(bereich_name, []).append(SimpleNamespace(**values))
+
+    return gefaehrdungen_by_bereich
+
+
+def _report_order(values):
+    """The report query's ORDER BY, with NULL sorting first as in the database"""
+    bereich_sort_order = values['_bereich_sort_order']
+    return (values['_bereich_id'] is None, bereich_sort_order is not None, bereich_sort_order or 0,
+            values['_bereich_id'] or 0, values['_sort_order'] or 0, values['_gefaehrdung_id'])
+
+
+def _pinned_rows(pinned, columns):
+    """Rows of pinned links from their snapshots, shaped like the rows of the report query"""
+    bereich_ids = {row['bereich_id'] for _, rows in pinned.values() for row in rows} - {None}
+    bereiche = {
+        bereich.id: bereich
+        for bereich in db.session.query(Bereich.id, Bereich.name, Bereich.sort_order).filter(Bereich.id.in_(bereich_ids))
+    } if bereich_ids else {}
+
+    report_rows = []
+    for link_id, (_, rows) in pinned.items():
+        for row in rows:
+            # A Bereich deleted since the snapshot counts as none, as for live rows
+            bereich = bereiche.get(row['bereich_id'])
+            report_rows.append({
+                '_bereich_id': bereich.id if bereich else None,
+                '_bereich_name': bereich.name if bereich else None,
+                '_bereich_sort_order': bereich.sort_order if bereich else None,
+                '_gefaehrdung_id': row['id'],
+                '_sort_order': row['sort_order'],
+                '_project_gbu_id': link_id,
+                **{column: row[column] for column in columns},
+            })
+    return report_rows
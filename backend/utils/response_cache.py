@@ -0,0 +1,112 @@
+import hashlib
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from functools import wraps
+from flask import current_app, request, make_response
+
+# Response headers stored with a cached body
+CACHED_HEADERS = ('X-Total-Count',)
+
+
+class ResponseCache:
+    """In-process cache of JSON responses, invalidated through per-namespace versions
+
+    A namespace's version is a token in a small file shared by all worker
+    processes, so a write in one worker invalidates the caches of all others
+    without any database access.
+    """
+
+    def __init__(self, directory, max_entries):
+        self.directory = directory
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _version_path(self, namespace):
+        return os.path.join(self.directory, f'{namespace}.version')
+
+    def version(self, namespace):
+        """Return the current version token of a namespace"""
+        try:
+            with open(self._version_path(namespace), encoding='ascii') as f:
+                return f.read()
+        except FileNotFoundError:
+            return self.bump(namespace)
+
+    def bump(self, namespace):
+        """Give a namespace a new version, dropping its cached responses in every process"""
+        token = uuid.uuid4().hex
+        path = self._version_path(namespace)
+        temp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(temp_path, 'w', encoding='ascii') as f:
+            f.write(token)
+        os.replace(temp_path, path)
+        return token
+
+    def get(self, etag):
+        with self._lock:
+            entry = self._entries.get(etag)
+            if entry is not None:
+                self._entries.move_to_end(etag)
+            return entry
+
+    def put(self, etag, body, headers):
+        with self._lock:
+            self._entries[etag] = (body, headers)
+            self._entries.move_to_end(etag)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+def get_response_cache():
+    return current_app.extensions['response_cache']
+
+
+def invalidate_cached_responses(*namespaces):
+    """Invalidate cached responses, call after the change is committed"""
+    cache = get_response_cache()
+    for namespace in namespaces:
+        cache.bump(namespace)
+
+
+def cached_response(namespace):
+    """Cache a GET view's 200 responses per query string until the namespace is invalidated
+
+    Responses carry a strong ETag made of the namespace version and the query
+    string, so a matching If-None-Match is answered with 304 before the view runs.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            cache = get_response_cache()
+            version = cache.version(namespace)
+            query = sorted(request.args.items(multi=True))
+            digest = hashlib.sha256(repr((request.path, query)).encode('utf-8')).hexdigest()[:16]
+            etag = f'{namespace}-{version}-{digest}'
+
+            if etag in request.if_none_match:
+                response = make_response('', 304)
+                response.set_etag(etag)
+                return response
+
+            entry = cache.get(etag)
+            if entry is None:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+                headers = {name: response.headers[name] for name in CACHED_HEADERS if name in response.headers}
+                entry = (response.get_data(), headers)
+                cache.put(etag, *entry)
+
+            body, headers = entry
+            response = make_response(body, 200, headers)
+            response.mimetype = 'application/json'
+            response.set_etag(etag)
+            # Clients may keep the response but must revalidate it on every use
+            response.headers['Cache-Control'] = 'no-cache'
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,201 @@
+import logging
+import time
+from flask import current_app
+from sqlalchemy import case, func, select, update, or_
+from models import db, GBUTemplate, GBUTemplateSnapshot, Gefaehrdung, ProjectGBU, ProjectGBUOverride
+from utils.sync import record_full_resync
+
+logger = logging.getLogger(__name__)
+
+# Rows updated per transaction when reclassifying
+RECLASSIFY_BATCH_SIZE = 5000
+
+# Template snapshots updated per transaction when reclassifying, each holds a template's rows
+RECLASSIFY_SNAPSHOT_BATCH_SIZE = 100
+
+
+def risk_matrix():
+    """The configured matrix: [upper bound of schadenschwere x wahrscheinlichkeit, rating] pairs"""
+    return current_app.config['RISK_MATRIX']
+
+
+def validate_risk_matrix(matrix):
+    """Raise ValueError unless bounds ascend and only the last entry is open-ended"""
+    if not matrix or matrix[-1][0] is not None:
+        raise ValueError('RISK_MATRIX must end with an entry without upper bound')
+    bounds = [bound for bound, _ in matrix[:-1]]
+    if any(bound is None for bound in bounds) or bounds != sorted(set(bounds)):
+        raise ValueError('RISK_MATRIX upper bounds must be ascending numbers')
+
+
+def calculate_risikobewertung(schadenschwere, wahrscheinlichkeit, matrix=None):
+    """Classify schadenschwere x wahrscheinlichkeit, None if either is missing"""
+    if not schadenschwere or not wahrscheinlichkeit:
+        return None
+
+    risk_value = schadenschwere * wahrscheinlichkeit
+    for upper_bound, rating in matrix or risk_matrix():
+        if upper_bound is None or risk_value <= upper_bound:
+            return rating
+
+
+def risk_case(schadenschwere, wahrscheinlichkeit, current=None, matrix=None):
+    """SQL expression of calculate_risikobewertung, rows missing a factor keep current"""
+    matrix = matrix or risk_matrix()
+    risk_value = schadenschwere * wahrscheinlichkeit
+    missing = or_(schadenschwere.is_(None), wahrscheinlichkeit.is_(None),
+                  schadenschwere == 0, wahrscheinlichkeit == 0)
+    whens = [(missing, current)]
+    whens += [(risk_value <= upper_bound, rating) for upper_bound, rating in matrix[:-1]]
+    return case(*whens, else_=matrix[-1][1])
+
+
+def reclassify_all(batch_size=RECLASSIFY_BATCH_SIZE):
+    """Recompute every stored risikobewertung with the configured matrix
+
+    Walks the table in primary key ranges of batch_size rows and updates each
+    range with one set-based UPDATE in its own short transaction, touching
+    only rows whose rating changes. Yields a progress dict after every batch.
+    """
+    matrix = risk_matrix()
+    validate_risk_matrix(matrix)
+
+    total = db.session.query(func.count(Gefaehrdung.id)).scalar()
+    new_rating = risk_case(Gefaehrdung.schadenschwere, Gefaehrdung.wahrscheinlichkeit,
+                           Gefaehrdung.risikobewertung, matrix)
+    processed = changed = 0
+    last_id = 0
+    started = time.monotonic()
+
+    while True:
+        # Upper id of the next batch, found through the primary key index
+        batch_ids = select(Gefaehrdung.id).where(Gefaehrdung.id > last_id) \
+            .order_by(Gefaehrdung.id).limit(batch_size).subquery()
+        upper_id, count = db.session.execute(
+            select(func.max(batch_ids.c.id), func.count(batch_ids.c.id))
+        ).one()
+        if not count:
+            break
+
+        result = db.session.execute(
+            update(Gefaehrdung)
+            .where(Gefaehrdung.id > last_id, Gefaehrdung.id <= upper_id,
+                   Gefaehrdung.risikobewertung.is_distinct_from(new_rating))
+            .values(risikobewertung=new_rating)
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+
+        last_id = upper_id
+        processed += count
+        changed += result.rowcount
+        elapsed = time.monotonic() - started
+        yield {
+            'processed': processed,
+            'changed': changed,
+            'total': total,
+            'elapsed': round(elapsed, 2),
+            'rows_per_second': round(processed / elapsed) if elapsed else None,
+        }
+
+    snapshots_changed = _reclassify_snapshots(matrix)
+    overrides_changed = _reclassify_overrides(matrix)
+    if changed or overrides_changed or snapshots_changed:
+        # Too many rows to log one by one, editors reload instead
+        record_full_resync()
+        db.session.commit()
+    elapsed = time.monotonic() - started
+    logger.info('Reclassified %d gefaehrdungen (%d changed, %d overrides) in %.1fs',
+                processed, changed, overrides_changed, elapsed)
+    yield {
+        'processed': processed,
+        'changed': changed,
+        'overrides_changed': overrides_changed,
+        'total': total,
+        'elapsed': round(elapsed, 2),
+        'rows_per_second': round(processed / elapsed) if elapsed else None,
+        'done': True,
+    }
+
+
+def _reclassify_overrides(matrix, batch_size=RECLASSIFY_BATCH_SIZE):
+    """Recompute ratings stored in project overrides of schadenschwere or wahrscheinlichkeit
+
+    The base values are those of the row the link sees: the snapshot row for
+    a link pinned to an older version, else the live template row. Run after
+    the rows and snapshots are reclassified. Overrides whose row the link no
+    longer sees are skipped.
+    """
+    # gbu_data imports this module for the rating itself
+    from utils.gbu_data import load_snapshot_rows
+
+    changed = 0
+    last_id = 0
+    while True:
+        rows = db.session.query(ProjectGBUOverride, ProjectGBU, GBUTemplate, Gefaehrdung.id, Gefaehrdung.schadenschwere,
+                                Gefaehrdung.wahrscheinlichkeit, Gefaehrdung.risikobewertung) \
+            .join(ProjectGBU, ProjectGBUOverride.project_gbu_id == ProjectGBU.id) \
+            .join(GBUTemplate, ProjectGBU.gbu_template_id == GBUTemplate.id) \
+            .outerjoin(Gefaehrdung, ProjectGBUOverride.gefaehrdung_id == Gefaehrdung.id) \
+            .filter(ProjectGBUOverride.id > last_id) \
+            .order_by(ProjectGBUOverride.id) \
+            .limit(batch_size) \
+            .all()
+        if not rows:
+            return changed
+
+        snapshot_rows = {
+            link_id: {row['id']: row for row in link_rows}
+            for link_id, link_rows in load_snapshot_rows({(link, template) for _, link, template, *_ in rows}).items()
+        }
+        for override, link, _, live_id, schadenschwere, wahrscheinlichkeit, template_rating in rows:
+            last_id = override.id
+            values = dict(override.overrides or {})
+            if 'schadenschwere' not in values and 'wahrscheinlichkeit' not in values:
+                continue
+            if link.id in snapshot_rows:
+                row = snapshot_rows[link.id].get(override.gefaehrdung_id)
+                if row is None:
+                    continue
+                schadenschwere, wahrscheinlichkeit, template_rating = \
+                    row['schadenschwere'], row['wahrscheinlichkeit'], row['risikobewertung']
+            elif live_id is None:
+                # The live row is gone, rebase drops the override
+                continue
+            rating = calculate_risikobewertung(values.get('schadenschwere', schadenschwere),
+                                               values.get('wahrscheinlichkeit', wahrscheinlichkeit), matrix)
+            if rating and rating != template_rating:
+                values['risikobewertung'] = rating
+            else:
+                values.pop('risikobewertung', None)
+            if values != override.overrides:
+                override.overrides = values
+                changed += 1
+
+        db.session.commit()
+
+
+def _reclassify_snapshots(matrix, batch_size=RECLASSIFY_SNAPSHOT_BATCH_SIZE):
+    """Recompute the ratings of the template rows kept for pinned versions, returns the snapshots changed"""
+    changed = 0
+    last_id = 0
+    while True:
+        snapshots = GBUTemplateSnapshot.query.filter(GBUTemplateSnapshot.id > last_id) \
+            .order_by(GBUTemplateSnapshot.id) \
+            .limit(batch_size) \
+            .all()
+        if not snapshots:
+            return changed
+
+        for snapshot in snapshots:
+            last_id = snapshot.id
+            rows = [dict(row) for row in snapshot.gefaehrdungen]
+            for row in rows:
+                rating = calculate_risikobewertung(row['schadenschwere'], row['wahrscheinlichkeit'], matrix)
+                if rating:
+                    row['risikobewertung'] = rating
+            if rows != snapshot.gefaehrdungen:
+                snapshot.gefaehrdungen = rows
+                changed += 1
+
+        db.session.commit()
@@ -0,0 +1,272 @@
+from collections import defaultdict
+from datetime import datetime
+from sqlalchemy import case, delete, func, insert, select
+from models import db, Project, Gefaehrdung, ProjectGBU, ProjectGBUOverride, ProjectRiskSummary
+from utils.gbu_data import apply_override, live_overlay_links, load_overrides, load_pinned_links
+from utils.risk import risk_matrix
+
+# Projects refreshed per transaction by a full rebuild
+REBUILD_BATCH_SIZE = 500
+
+# Key of gefaehrdungen without risikobewertung in summary responses
+UNRATED = 'unbewertet'
+
+
+def _value(row, key):
+    return row.get(key) if isinstance(row, dict) else getattr(row, key, None)
+
+
+def lock_summary_projects(project_ids):
+    """Lock the project rows, in id order, before their summary rows are written
+
+    Every writer of a project's summary holds this lock, so two transactions
+    can neither both add the same new bucket nor lose each other's counts.
+    """
+    db.session.execute(
+        select(Project.id).where(Project.id.in_(project_ids)).order_by(Project.id).with_for_update()
+    ).all()
+
+
+class RiskSummaryDelta:
+    """Changes to the summary rows of a write, applied with apply() before the commit
+
+    Writers pass the old and new values of each row they change, instead of
+    recomputing the projects, and only the touched (project, Bereich,
+    risikobewertung) buckets are updated. Rows are dicts or objects with
+    bereich_id, risikobewertung and mängel_behoben, rows of a project's view
+    flagged removed count as absent. Apply before recording sync changes, so
+    the project locks are always taken before the sync sequence lock.
+    """
+
+    def __init__(self):
+        # (project_id, bereich_id, risikobewertung) -> [gefaehrdungen, offene mängel]
+        self.counts = defaultdict(lambda: [0, 0])
+
+    def add(self, project_id, row, sign=1):
+        if project_id is None or row is None or _value(row, 'removed'):
+            return
+        totals = self.counts[(project_id, _value(row, 'bereich_id'), _value(row, 'risikobewertung'))]
+        totals[0] += sign
+        totals[1] += 0 if _value(row, 'mängel_behoben') else sign
+
+    def row_changed(self, project_id, before=None, after=None):
+        """Move a row of a project's view from its old to its new values, None for a created or deleted row"""
+        self.add(project_id, before, -1)
+        self.add(project_id, after)
+
+    def add_rows(self, project_id, condition):
+        """Count the gefaehrdungen matching condition into the project's buckets in one grouped query"""
+        offen = case((Gefaehrdung.mängel_behoben.is_(True), 0), else_=1)
+        rows = db.session.query(
+            Gefaehrdung.bereich_id, Gefaehrdung.risikobewertung, func.count(Gefaehrdung.id), func.sum(offen)
+        ).filter(condition).group_by(Gefaehrdung.bereich_id, Gefaehrdung.risikobewertung)
+        for bereich_id, risikobewertung, count, offene_maengel in rows:
+            totals = self.counts[(project_id, bereich_id, risikobewertung)]
+            totals[0] += count
+            totals[1] += int(offene_maengel or 0)
+
+    def template_rows_changed(self, before=(), after=()):
+        """Count changed template rows in the projects that follow the live rows of their templates
+
+        Links pinned to a snapshot don't see template edits, so only links
+        from before snapshots are looked up, with their overrides of the
+        changed rows.
+        """
+        before = [row for row in before if _value(row, 'gbu_template_id') is not None]
+        after = [row for row in after if _value(row, 'gbu_template_id') is not None]
+        links = live_overlay_links({_value(row, 'gbu_template_id') for row in before + after})
+        if not links:
+            return
+
+        links_by_template = defaultdict(list)
+        for link in links:
+            links_by_template[link.gbu_template_id].append(link)
+        overrides = load_overrides([link.id for link in links])
+        for rows, sign in ((before, -1), (after, 1)):
+            for row in rows:
+                values = {key: _value(row, key) for key in ('bereich_id', 'risikobewertung', 'mängel_behoben')}
+                for link in links_by_template[_value(row, 'gbu_template_id')]:
+                    override = overrides.get((link.id, _value(row, 'id')))
+                    if override is None:
+                        self.add(link.project_id, values, sign)
+                    elif not override.removed:
+                        self.add(link.project_id, apply_override(dict(values), override), sign)
+
+    def apply(self):
+        """Add the collected counts to the summary rows in the current transaction"""
+        changes = {key: totals for key, totals in self.counts.items() if totals != [0, 0]}
+        self.counts.clear()
+        if not changes:
+            return
+
+        project_ids = {project_id for project_id, _, _ in changes}
+        lock_summary_projects(project_ids)
+        summaries = {}
+        for summary in ProjectRiskSummary.query.filter(ProjectRiskSummary.project_id.in_(project_ids)) \
+                .order_by(ProjectRiskSummary.id).with_for_update().populate_existing():
+            # Deleting a Bereich can leave two rows under the NULL Bereich, the first takes the counts
+            summaries.setdefault((summary.project_id, summary.bereich_id, summary.risikobewertung), summary)
+
+        now = datetime.utcnow()
+        for (project_id, bereich_id, risikobewertung), (count, offene_maengel) in changes.items():
+            summary = summaries.get((project_id, bereich_id, risikobewertung))
+            if summary is None:
+                summary = ProjectRiskSummary(project_id=project_id, bereich_id=bereich_id,
+                                             risikobewertung=risikobewertung,
+                                             gefaehrdungen_count=0, offene_maengel_count=0)
+                db.session.add(summary)
+            summary.gefaehrdungen_count += count
+            summary.offene_maengel_count += offene_maengel
+            summary.updated_at = now
+            if summary.gefaehrdungen_count <= 0:
+                if summary.id is None:
+                    db.session.expunge(summary)
+                else:
+                    db.session.delete(summary)
+
+
+def refresh_risk_summaries(project_ids):
+    """Recompute the summary rows of the given projects in the current transaction
+
+    Counts per (project, Bereich, risikobewertung) come from one grouped query
+    over the projects' own rows and one query over the live template rows
+    they overlay, merged with the projects' overrides, plus the snapshot rows
+    of links pinned to an older template version. Only the given projects are
+    read, through the project and template indexes. Writes that change
+    single rows use RiskSummaryDelta instead. The caller commits.
+    """
+    project_ids = {project_id for project_id in project_ids if project_id is not None}
+    if not project_ids:
+        return
+
+    # (project_id, bereich_id, risikobewertung) -> [gefaehrdungen, offene mängel]
+    counts = defaultdict(lambda: [0, 0])
+
+    offen = case((Gefaehrdung.mängel_behoben.is_(True), 0), else_=1)
+    own_rows = db.session.query(
+        Gefaehrdung.project_id, Gefaehrdung.bereich_id, Gefaehrdung.risikobewertung,
+        func.count(Gefaehrdung.id), func.sum(offen)
+    ).filter(Gefaehrdung.project_id.in_(project_ids)) \
+        .group_by(Gefaehrdung.project_id, Gefaehrdung.bereich_id, Gefaehrdung.risikobewertung)
+    for project_id, bereich_id, risikobewertung, count, offene_maengel in own_rows:
+        totals = counts[(project_id, bereich_id, risikobewertung)]
+        totals[0] += count
+        totals[1] += int(offene_maengel or 0)
+
+    pinned = load_pinned_links(project_ids)
+    overlay_rows = db.session.query(
+        ProjectGBU.project_id, Gefaehrdung.bereich_id, Gefaehrdung.risikobewertung, Gefaehrdung.mängel_behoben,
+        ProjectGBUOverride.overrides, ProjectGBUOverride.removed
+    ).join(Gefaehrdung, Gefaehrdung.gbu_template_id == ProjectGBU.gbu_template_id) \
+        .outerjoin(ProjectGBUOverride, (ProjectGBUOverride.project_gbu_id == ProjectGBU.id)
+                   & (ProjectGBUOverride.gefaehrdung_id == Gefaehrdung.id)) \
+        .filter(ProjectGBU.project_id.in_(project_ids), ProjectGBU.template_version.isnot(None))
+    if pinned:
+        overlay_rows = overlay_rows.filter(ProjectGBU.id.notin_(pinned))
+    overlay_rows = overlay_rows.all() + _pinned_summary_rows(pinned)
+    for project_id, bereich_id, risikobewertung, maengel_behoben, overrides, removed in overlay_rows:
+        if removed:
+            continue
+        overrides = overrides or {}
+        risikobewertung = overrides.get('risikobewertung', risikobewertung)
+        maengel_behoben = overrides.get('mängel_behoben', maengel_behoben)
+        totals = counts[(project_id, bereich_id, risikobewertung)]
+        totals[0] += 1
+        totals[1] += 0 if maengel_behoben else 1
+
+    lock_summary_projects(project_ids)
+    db.session.execute(delete(ProjectRiskSummary).where(ProjectRiskSummary.project_id.in_(project_ids)))
+    now = datetime.utcnow()
+    rows = [
+        {
+            'project_id': project_id,
+            'bereich_id': bereich_id,
+            'risikobewertung': risikobewertung,
+            'gefaehrdungen_count': count,
+            'offene_maengel_count': offene_maengel,
+            'updated_at': now,
+        }
+        for (project_id, bereich_id, risikobewertung), (count, offene_maengel) in counts.items()
+    ]
+    if rows:
+        db.session.execute(insert(ProjectRiskSummary), rows)
+
+
+def _pinned_summary_rows(pinned):
+    """Rows of pinned links from their snapshots, shaped like the overlay rows of the summary query"""
+    if not pinned:
+        return []
+    overrides = load_overrides(list(pinned))
+    summary_rows = []
+    for link_id, (link, rows) in pinned.items():
+        for row in rows:
+            override = overrides.get((link_id, row['id']))
+            summary_rows.append((link.project_id, row['bereich_id'], row['risikobewertung'], row['mängel_behoben'],
+                                 override.overrides if override else None, override.removed if override else None))
+    return summary_rows
+
+
+def rebuild_risk_summaries(batch_size=REBUILD_BATCH_SIZE):
+    """Recompute the summaries of all projects, batch_size projects per transaction
+
+    Returns the number of projects processed.
+    """
+    processed = 0
+    last_id = 0
+    while True:
+        project_ids = db.session.scalars(
+            select(Project.id).where(Project.id > last_id).order_by(Project.id).limit(batch_size)
+        ).all()
+        if not project_ids:
+            return processed
+
+        refresh_risk_summaries(project_ids)
+        db.session.commit()
+        last_id = project_ids[-1]
+        processed += len(project_ids)
+
+
+def _empty_counts(ratings):
+    return {
+        'gefaehrdungen': 0,
+        'offene_maengel': 0,
+        'risikobewertung': {**{rating: 0 for rating in ratings}, UNRATED: 0},
+    }
+
+
+def _add_counts(totals, summary):
+    totals['gefaehrdungen'] += summary.gefaehrdungen_count
+    totals['offene_maengel'] += summary.offene_maengel_count
+    rating = summary.risikobewertung or UNRATED
+    totals['risikobewertung'][rating] = totals['risikobewertung'].get(rating, 0) + summary.gefaehrdungen_count
+
+
+def load_risk_summaries(project_ids):
+    """Summaries of the given projects from the summary table in one query
+
+    Returns a dict of project_id to its totals and per-Bereich counts. Every
+    rating of the risk matrix is listed, ratings outside it only if rows have
+    them.
+    """
+    ratings = [rating for _, rating in risk_matrix()]
+    summaries = {
+        project_id: {'project_id': project_id, 'totals': _empty_counts(ratings), 'bereiche': {}}
+        for project_id in project_ids
+    }
+    if not summaries:
+        return summaries
+
+    rows = ProjectRiskSummary.query.filter(ProjectRiskSummary.project_id.in_(summaries)) \
+        .order_by(ProjectRiskSummary.project_id, ProjectRiskSummary.bereich_id)
+    for summary in rows:
+        project_summary = summaries[summary.project_id]
+        _add_counts(project_summary['totals'], summary)
+        bereich = project_summary['bereiche'].get(summary.bereich_id)
+        if bereich is None:
+            bereich = project_summary['bereiche'][summary.bereich_id] = {'bereich_id': summary.bereich_id,
+                                                                         **_empty_counts(ratings)}
+        _add_counts(bereich, summary)
+
+    for project_summary in summaries.values():
+        project_summary['bereiche'] = list(project_summary['bereiche'].values())
+    return summaries
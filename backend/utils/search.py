@@ -0,0 +1,148 @@
+import logging
+import re
+from sqlalchemy import and_, column, func, literal, literal_column, or_, table, text
+from sqlalchemy.dialects.mysql import match
+from models import db, Gefaehrdung
+
+logger = logging.getLogger(__name__)
+
+# Text columns of a gefaehrdung covered by the search index, with their rank weight
+SEARCH_COLUMNS = (
+    ('tätigkeit', 3.0),
+    ('gefährdung', 2.0),
+    ('massnahmen', 1.0),
+    ('s_massnahmen', 1.0),
+    ('t_massnahmen', 1.0),
+    ('o_massnahmen', 1.0),
+    ('p_massnahmen', 1.0),
+)
+
+# Name of the FULLTEXT index on MySQL/MariaDB and of the FTS5 table on SQLite
+FULLTEXT_INDEX = 'ft_search'
+FTS_TABLE = 'gefaehrdungen_fts'
+
+# Words of a query beyond this are ignored
+MAX_TERMS = 10
+
+
+def search_terms(query):
+    """Split a user query into words, dropping all search syntax"""
+    return re.findall(r'\w+', query or '')[:MAX_TERMS]
+
+
+def search_backend():
+    """'fulltext' on MySQL/MariaDB, 'fts5' on SQLite, 'like' on anything else"""
+    dialect = db.engine.dialect.name
+    if dialect in ('mysql', 'mariadb'):
+        return 'fulltext'
+    if dialect == 'sqlite':
+        return 'fts5'
+    return 'like'
+
+
+def _column_list(quote='"'):
+    return ', '.join(f'{quote}{name}{quote}' for name, _ in SEARCH_COLUMNS)
+
+
+def _sqlite_index_exists():
+    return db.session.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"), {'name': FTS_TABLE}
+    ).first() is not None
+
+
+def _create_sqlite_index():
+    """Create the FTS5 table over gefaehrdungen and the triggers that keep it current
+
+    The table is an external content index, so it stores only the inverted
+    index. Triggers update it on every write path, including the set-based
+    copies and batch updates that bypass the ORM.
+    """
+    columns = _column_list()
+    new_values = ', '.join(f'new."{name}"' for name, _ in SEARCH_COLUMNS)
+    old_values = ', '.join(f'old."{name}"' for name, _ in SEARCH_COLUMNS)
+    statements = (
+        f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5({columns}, content='gefaehrdungen', "
+        f"content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+        f"CREATE TRIGGER {FTS_TABLE}_ai AFTER INSERT ON gefaehrdungen BEGIN "
+        f"INSERT INTO {FTS_TABLE}(rowid, {columns}) VALUES (new.id, {new_values}); END",
+        f"CREATE TRIGGER {FTS_TABLE}_ad AFTER DELETE ON gefaehrdungen BEGIN "
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {columns}) VALUES ('delete', old.id, {old_values}); END",
+        # Only changes of indexed columns touch the index, not ratings or sort orders
+        f"CREATE TRIGGER {FTS_TABLE}_au AFTER UPDATE OF {columns} ON gefaehrdungen BEGIN "
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {columns}) VALUES ('delete', old.id, {old_values}); "
+        f"INSERT INTO {FTS_TABLE}(rowid, {columns}) VALUES (new.id, {new_values}); END",
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+    )
+    for statement in statements:
+        db.session.execute(text(statement))
+    db.session.commit()
+    logger.info('Created search index %s', FTS_TABLE)
+
+
+def _mysql_index_exists():
+    return db.session.execute(
+        text("SELECT 1 FROM information_schema.statistics WHERE table_schema = DATABASE() "
+             "AND table_name = 'gefaehrdungen' AND index_name = :name LIMIT 1"),
+        {'name': FULLTEXT_INDEX}
+    ).first() is not None
+
+
+def ensure_search_index():
+    """Create the search index if the database does not have it yet"""
+    backend = search_backend()
+    if backend == 'fts5' and not _sqlite_index_exists():
+        _create_sqlite_index()
+    elif backend == 'fulltext' and not _mysql_index_exists():
+        db.session.execute(text(f'ALTER TABLE gefaehrdungen ADD FULLTEXT INDEX {FULLTEXT_INDEX} ({_column_list("`")})'))
+        db.session.commit()
+        logger.info('Created search index %s', FULLTEXT_INDEX)
+
+
+def rebuild_search_index():
+    """Rebuild the search index from the gefaehrdungen table, returns the backend used"""
+    backend = search_backend()
+    if backend == 'fts5':
+        if _sqlite_index_exists():
+            db.session.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+            db.session.commit()
+        else:
+            _create_sqlite_index()
+    elif backend == 'fulltext':
+        if _mysql_index_exists():
+            # With innodb_optimize_fulltext_only set this merges only the FULLTEXT index
+            db.session.execute(text('OPTIMIZE TABLE gefaehrdungen'))
+            db.session.commit()
+        else:
+            ensure_search_index()
+    return backend
+
+
+def search_gefaehrdungen(terms, filters=()):
+    """Build a query of (Gefaehrdung, score) rows matching every word as a prefix
+
+    Returns the unordered query and its score expression, higher scores rank
+    better. The LIKE fallback matches substrings and scores every row 0.
+    """
+    backend = search_backend()
+    columns = [getattr(Gefaehrdung, name) for name, _ in SEARCH_COLUMNS]
+
+    if backend == 'fts5':
+        ensure_search_index()
+        fts = table(FTS_TABLE, column('rowid'))
+        fts_query = ' '.join(f'"{term}"*' for term in terms)
+        # bm25 is lower for better matches
+        score = -func.bm25(literal_column(FTS_TABLE), *(weight for _, weight in SEARCH_COLUMNS))
+        search = db.session.query(Gefaehrdung, score.label('score')) \
+            .select_from(fts) \
+            .join(Gefaehrdung, Gefaehrdung.id == fts.c.rowid) \
+            .filter(literal_column(FTS_TABLE).op('MATCH')(fts_query))
+    elif backend == 'fulltext':
+        score = match(*columns, against=' '.join(f'+{term}*' for term in terms)).in_boolean_mode()
+        search = db.session.query(Gefaehrdung, score.label('score')).filter(score > 0)
+    else:
+        score = literal(0.0)
+        search = db.session.query(Gefaehrdung, score.label('score')).filter(and_(*(
+            or_(*(column_.icontains(term, autoescape=True) for column_ in columns)) for term in terms
+        )))
+
+    return search.filter(*filters), score
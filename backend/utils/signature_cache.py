@@ -0,0 +1,67 @@
+import base64
+import binascii
+import glob
+import io
+import logging
+import os
+from flask import current_app
+from PIL import Image, UnidentifiedImageError
+
+logger = logging.getLogger(__name__)
+
+# Signatures are downscaled to fit this box, enough for a 3cm wide PDF cell
+THUMBNAIL_SIZE = (300, 100)
+
+
+def signature_folder():
+    return os.path.join(current_app.config['PDF_FOLDER'], 'signatures')
+
+
+def thumbnail_path(participant_id, signed_at):
+    """Path of the thumbnail for one signature, keyed by participant and signing time"""
+    return os.path.join(signature_folder(), f'{participant_id}_{signed_at.strftime("%Y%m%d%H%M%S%f")}.png')
+
+
+def get_thumbnail(participant_id, signed_at):
+    """Return the cached thumbnail path, or None if it has not been built"""
+    path = thumbnail_path(participant_id, signed_at)
+    return path if os.path.exists(path) else None
+
+
+def build_thumbnail(participant_id, signed_at, signature_data):
+    """Decode a base64 signature, downscale it and cache it as a PNG
+
+    Returns the thumbnail path, or None if the signature cannot be decoded.
+    """
+    # Signature pads send data URLs like "data:image/png;base64,..."
+    if signature_data.startswith('data:'):
+        signature_data = signature_data.partition(',')[2]
+
+    try:
+        image = Image.open(io.BytesIO(base64.b64decode(signature_data)))
+        image.load()
+    except (binascii.Error, UnidentifiedImageError, OSError, ValueError) as e:
+        logger.warning('Could not decode signature of participant %s: %s', participant_id, e)
+        return None
+
+    # Flatten transparent strokes onto white and store as grayscale
+    image = image.convert('RGBA')
+    flattened = Image.new('RGBA', image.size, 'white')
+    flattened.alpha_composite(image)
+    thumbnail = flattened.convert('L')
+    thumbnail.thumbnail(THUMBNAIL_SIZE)
+
+    os.makedirs(signature_folder(), exist_ok=True)
+
+    # Drop thumbnails of earlier signatures of this participant
+    for old_path in glob.glob(os.path.join(signature_folder(), f'{participant_id}_*.png')):
+        try:
+            os.remove(old_path)
+        except FileNotFoundError:
+            pass
+
+    path = thumbnail_path(participant_id, signed_at)
+    temp_path = f'{path}.{os.getpid()}.tmp'
+    thumbnail.save(temp_path, format='PNG', optimize=True)
+    os.replace(temp_path, path)
+    return path
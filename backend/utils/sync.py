@@ -0,0 +1,114 @@
+import logging
+from datetime import datetime, timedelta
+from sqlalchemy import delete, func, insert, literal, select, update
+from models import db, Gefaehrdung, GefaehrdungChange, SyncSequence
+
+logger = logging.getLogger(__name__)
+
+# The single row of sync_sequence
+SEQUENCE_ID = 1
+
+
+def current_sync_seq():
+    """The highest watermark committed so far"""
+    return db.session.execute(
+        select(SyncSequence.value).where(SyncSequence.id == SEQUENCE_ID)
+    ).scalar() or 0
+
+
+def next_sync_seq():
+    """Hand out the next watermark
+
+    Incrementing the sequence row locks it until the transaction ends, so
+    writers commit their changes in watermark order and a client that synced
+    up to a watermark cannot miss a lower one committed later. Callers record
+    their changes as the last statements before the commit, so the lock is
+    held only briefly. The row is created with the table.
+    """
+    result = db.session.execute(
+        update(SyncSequence).where(SyncSequence.id == SEQUENCE_ID).values(value=SyncSequence.value + 1)
+    )
+    if not result.rowcount:
+        raise RuntimeError('sync_sequence has no row, create it as in database/schema.sql')
+    return current_sync_seq()
+
+
+def record_gefaehrdung_changes(rows, deleted=False):
+    """Log changed or deleted gefaehrdungen for the delta sync
+
+    rows are gefaehrdungen or any rows with id, project_id and gbu_template_id.
+    Call after a flush so new rows have their ids.
+    """
+    changes = [
+        {'gefaehrdung_id': row.id, 'project_id': row.project_id, 'gbu_template_id': row.gbu_template_id}
+        for row in rows
+    ]
+    if not changes:
+        return
+    seq = next_sync_seq()
+    now = datetime.utcnow()
+    db.session.execute(insert(GefaehrdungChange), [
+        {**change, 'seq': seq, 'deleted': deleted, 'changed_at': now} for change in changes
+    ])
+
+
+def record_project_changes(project_id, gefaehrdung_ids):
+    """Log rows that changed in one project's view: its own rows or template rows it overrides"""
+    gefaehrdung_ids = list(gefaehrdung_ids)
+    if not gefaehrdung_ids:
+        return
+    seq = next_sync_seq()
+    now = datetime.utcnow()
+    db.session.execute(insert(GefaehrdungChange), [
+        {'seq': seq, 'gefaehrdung_id': gefaehrdung_id, 'project_id': project_id, 'deleted': False, 'changed_at': now}
+        for gefaehrdung_id in gefaehrdung_ids
+    ])
+
+
+def record_template_added(project_id, template_id):
+    """Log every row of a template that now shows in a project, with one INSERT ... SELECT"""
+    seq = next_sync_seq()
+    source = select(
+        literal(seq), Gefaehrdung.id, literal(project_id), literal(False), literal(datetime.utcnow())
+    ).where(Gefaehrdung.gbu_template_id == template_id)
+    db.session.execute(insert(GefaehrdungChange).from_select(
+        ['seq', 'gefaehrdung_id', 'project_id', 'deleted', 'changed_at'], source
+    ))
+
+
+def record_full_resync():
+    """Ask every client to reload, for set-based changes too large to log row by row"""
+    db.session.add(GefaehrdungChange(seq=next_sync_seq(), deleted=False))
+
+
+def needs_full_resync(since):
+    """Whether changes after since can no longer be answered from the log"""
+    pruned_seq = db.session.execute(
+        select(SyncSequence.pruned_seq).where(SyncSequence.id == SEQUENCE_ID)
+    ).scalar() or 0
+    if since < pruned_seq:
+        return True
+    return db.session.query(GefaehrdungChange.id).filter(
+        GefaehrdungChange.seq > since, GefaehrdungChange.gefaehrdung_id.is_(None)
+    ).first() is not None
+
+
+def prune_changes(retention_days):
+    """Delete changes older than retention_days, returns the number deleted
+
+    Clients whose watermark is older than the pruned changes get a full reload.
+    """
+    cutoff = datetime.utcnow() - timedelta(days=retention_days)
+    max_seq = db.session.query(func.max(GefaehrdungChange.seq)) \
+        .filter(GefaehrdungChange.changed_at < cutoff).scalar()
+    if max_seq is None:
+        return 0
+
+    db.session.execute(
+        update(SyncSequence).where(SyncSequence.id == SEQUENCE_ID, SyncSequence.pruned_seq < max_seq)
+        .values(pruned_seq=max_seq)
+    )
+    result = db.session.execute(delete(GefaehrdungChange).where(GefaehrdungChange.seq <= max_seq))
+    db.session.commit()
+    logger.info('Pruned %d gefaehrdung changes up to watermark %d', result.rowcount, max_seq)
+    return result.rowcount
@@ -38,7 +38,8 @@ CREATE TABLE projects (
     FOREIGN KEY (created_by) REFERENCES users(id) ON DELETE RESTRICT,
     INDEX idx_status (status),
     INDEX idx_season (season),
-    INDEX idx_dates (start_date, end_date)
+    INDEX idx_dates (start_date, end_date),
+    INDEX idx_name (name)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
 
 -- Projektzuweisungen
@@ -92,6 +93,7 @@ CREATE TABLE gbu_templates (
     season ENUM('fruehling', 'sommer', 'herbst', 'winter', 'alle') DEFAULT 'alle',
     indoor_outdoor ENUM('indoor', 'outdoor', 'both', 'alle') DEFAULT 'alle',
     is_global BOOLEAN DEFAULT TRUE,
+    version INT NOT NULL DEFAULT 1,
     created_by INT NOT NULL,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
@@ -134,16 +136,19 @@ CREATE TABLE gefaehrdungen (
     gesetzliche_regelungen TEXT,
     -- Mängel behoben
     mängel_behoben BOOLEAN DEFAULT FALSE,
-    sort_order INT DEFAULT 0,
+    sort_order INT NOT NULL DEFAULT 0,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
     FOREIGN KEY (gbu_template_id) REFERENCES gbu_templates(id) ON DELETE CASCADE,
     FOREIGN KEY (project_id) REFERENCES projects(id) ON DELETE CASCADE,
     FOREIGN KEY (bereich_id) REFERENCES bereiche(id) ON DELETE SET NULL,
-    INDEX idx_template (gbu_template_id),
-    INDEX idx_project (project_id),
+    INDEX idx_template (gbu_template_id, sort_order),
+    INDEX idx_project (project_id, sort_order),
+    INDEX idx_template_listing (gbu_template_id, bereich_id, sort_order, id),
+    INDEX idx_project_listing (project_id, bereich_id, sort_order, id),
     INDEX idx_bereich (bereich_id),
-    INDEX idx_risiko (risikobewertung)
+    INDEX idx_risiko (risikobewertung),
+    FULLTEXT INDEX ft_search (tätigkeit, gefährdung, massnahmen, s_massnahmen, t_massnahmen, o_massnahmen, p_massnahmen)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
 
 -- Projekt-GBU Zuordnung (welche Templates werden in welchem Projekt verwendet)
@@ -153,6 +158,7 @@ CREATE TABLE project_gbus (
     gbu_template_id INT NOT NULL,
     added_by INT NOT NULL,
     added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    template_version INT NULL,
     FOREIGN KEY (project_id) REFERENCES projects(id) ON DELETE CASCADE,
     FOREIGN KEY (gbu_template_id) REFERENCES gbu_templates(id) ON DELETE CASCADE,
     FOREIGN KEY (added_by) REFERENCES users(id) ON DELETE RESTRICT,
@@ -160,6 +166,68 @@ CREATE TABLE project_gbus (
     INDEX idx_project (project_id)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
 
+-- Stand der Vorlagen-Gefährdungen je Vorlagenversion, die ein Projekt festhält
+CREATE TABLE gbu_template_snapshots (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    gbu_template_id INT NOT NULL,
+    version INT NOT NULL,
+    gefaehrdungen JSON NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (gbu_template_id) REFERENCES gbu_templates(id) ON DELETE CASCADE,
+    UNIQUE KEY unique_template_version (gbu_template_id, version)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- Projekt-Abweichungen von Vorlagen-Gefährdungen (nur geänderte Felder bzw. entfernte Zeilen)
+CREATE TABLE project_gbu_overrides (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    project_gbu_id INT NOT NULL,
+    gefaehrdung_id INT NOT NULL,
+    overrides JSON,
+    removed BOOLEAN DEFAULT FALSE,
+    updated_by INT,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    FOREIGN KEY (project_gbu_id) REFERENCES project_gbus(id) ON DELETE CASCADE,
+    FOREIGN KEY (updated_by) REFERENCES users(id) ON DELETE SET NULL,
+    UNIQUE KEY unique_override (project_gbu_id, gefaehrdung_id),
+    INDEX idx_gefaehrdung (gefaehrdung_id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- Änderungsprotokoll der Gefährdungen für die Delta-Synchronisation des Editors
+CREATE TABLE gefaehrdung_changes (
+    id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    seq BIGINT NOT NULL,
+    gefaehrdung_id INT NULL,
+    project_id INT NULL,
+    gbu_template_id INT NULL,
+    deleted BOOLEAN DEFAULT FALSE,
+    changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (project_id) REFERENCES projects(id) ON DELETE CASCADE,
+    INDEX idx_project_seq (project_id, seq),
+    INDEX idx_template_seq (gbu_template_id, seq),
+    INDEX idx_seq (seq)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- Zähler für Synchronisations-Wasserstände (genau eine Zeile)
+CREATE TABLE sync_sequence (
+    id INT PRIMARY KEY,
+    value BIGINT NOT NULL DEFAULT 0,
+    pruned_seq BIGINT NOT NULL DEFAULT 0
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- Risikoübersicht je Projekt und Bereich (aus gefaehrdungen und Vorlagen-Abweichungen abgeleitet)
+CREATE TABLE project_risk_summary (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    project_id INT NOT NULL,
+    bereich_id INT NULL,
+    risikobewertung VARCHAR(50) NULL,
+    gefaehrdungen_count INT NOT NULL DEFAULT 0,
+    offene_maengel_count INT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    FOREIGN KEY (project_id) REFERENCES projects(id) ON DELETE CASCADE,
+    FOREIGN KEY (bereich_id) REFERENCES bereiche(id) ON DELETE SET NULL,
+    INDEX idx_project (project_id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
 -- Teilnehmer
 CREATE TABLE participants (
     id INT AUTO_INCREMENT PRIMARY KEY,
@@ -228,6 +296,9 @@ CREATE TABLE audit_log (
     INDEX idx_created (created_at)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
 
+-- Startwert der Synchronisations-Wasserstände
+INSERT INTO sync_sequence (id, value, pruned_seq) VALUES (1, 0, 0);
+
 -- Standard Bereiche einfügen
 INSERT INTO bereiche (name, description, sort_order) VALUES
 ('Büro & Bildschirmarbeitsplatz', 'Arbeiten am Bildschirm und im Büro', 1),
@@ -2,21 +2,32 @@ import React, { useEffect, useState } from 'react';
 import { Card, Row, Col, ListGroup, Badge } from 'react-bootstrap';
 import { Link } from 'react-router-dom';
 import { projectsAPI } from '../../services/api';
-import type { User, Project } from '../../types';
+import type { User, Project, ProjectStatusCounts } from '../../types';
 
 interface DashboardProps {
   user: User;
 }
 
+// Projects listed per status card, the counts cover all of them
+const DASHBOARD_LIST_SIZE = 10;
+
 const Dashboard: React.FC<DashboardProps> = ({ user }) => {
-  const [projects, setProjects] = useState<Project[]>([]);
+  const [counts, setCounts] = useState<ProjectStatusCounts | null>(null);
+  const [activeProjects, setActiveProjects] = useState<Project[]>([]);
+  const [planningProjects, setPlanningProjects] = useState<Project[]>([]);
   const [loading, setLoading] = useState(true);
 
   useEffect(() => {
     const fetchProjects = async () => {
       try {
-        const data = await projectsAPI.getAll();
-        setProjects(data);
+        const [statusCounts, active, planning] = await Promise.all([
+          projectsAPI.getStatusCounts(),
+          projectsAPI.getPage({ status: 'aktiv', sort: 'start_date', limit: DASHBOARD_LIST_SIZE }),
+          projectsAPI.getPage({ status: 'planung', sort: 'start_date', limit: DASHBOARD_LIST_SIZE }),
+        ]);
+        setCounts(statusCounts);
+        setActiveProjects(active.projects);
+        setPlanningProjects(planning.projects);
       } catch (error) {
         console.error('Failed to fetch projects:', error);
       } finally {
@@ -37,9 +48,6 @@ const Dashboard: React.FC<DashboardProps> = ({ user }) => {
     return <Badge bg={variants[status] || 'secondary'}>{status}</Badge>;
   };
 
-  const activeProjects = projects.filter(p => p.status === 'aktiv');
-  const planningProjects = projects.filter(p => p.status === 'planung');
-
   return (
     <div>
       <h1>Dashboard</h1>
@@ -50,7 +58,7 @@ const Dashboard: React.FC<DashboardProps> = ({ user }) => {
           <Card>
             <Card.Body>
               <Card.Title>Projekte gesamt</Card.Title>
-              <h2>{projects.length}</h2>
+              <h2>{counts?.total ?? '-'}</h2>
             </Card.Body>
           </Card>
         </Col>
@@ -58,7 +66,7 @@ const Dashboard: React.FC<DashboardProps> = ({ user }) => {
           <Card>
             <Card.Body>
               <Card.Title>Aktive Projekte</Card.Title>
-              <h2>{activeProjects.length}</h2>
+              <h2>{counts?.status.aktiv ?? '-'}</h2>
             </Card.Body>
           </Card>
         </Col>
@@ -66,7 +74,7 @@ const Dashboard: React.FC<DashboardProps> = ({ user }) => {
           <Card>
             <Card.Body>
               <Card.Title>In Planung</Card.Title>
-              <h2>{planningProjects.length}</h2>
+              <h2>{counts?.status.planung ?? '-'}</h2>
             </Card.Body>
           </Card>
         </Col>
@@ -1,14 +1,23 @@
 import React, { useEffect, useState } from 'react';
 import { useParams } from 'react-router-dom';
-import { Card, Button, Table, Form, Modal } from 'react-bootstrap';
+import { Alert, Badge, Card, Button, Table, Form, Modal } from 'react-bootstrap';
 import { gbuAPI, bereicheAPI, pdfAPI } from '../../services/api';
-import type { Gefaehrdung, Bereich, GBUTemplate } from '../../types';
+import type { Gefaehrdung, Bereich, GBUTemplate, ProjectTemplate } from '../../types';
+
+// Fields the edit dialog changes, on template rows they become project overrides
+type EditableFields = Pick<
+  Gefaehrdung, 'tätigkeit' | 'gefährdung' | 'schadenschwere' | 'wahrscheinlichkeit' | 'massnahmen' | 'mängel_behoben'
+>;
 
 const GBUEditor: React.FC = () => {
   const { projectId } = useParams<{ projectId: string }>();
   const [gefaehrdungen, setGefaehrdungen] = useState<Gefaehrdung[]>([]);
   const [bereiche, setBereiche] = useState<Bereich[]>([]);
   const [templates, setTemplates] = useState<GBUTemplate[]>([]);
+  const [projectTemplates, setProjectTemplates] = useState<ProjectTemplate[]>([]);
+  const [editing, setEditing] = useState<Gefaehrdung | null>(null);
+  const [editForm, setEditForm] = useState<Partial<EditableFields>>({});
+  const [watermark, setWatermark] = useState<number | undefined>(undefined);
   const [showAddModal, setShowAddModal] = useState(false);
   const [showTemplateModal, setShowTemplateModal] = useState(false);
 
@@ -26,7 +35,7 @@ const GBUEditor: React.FC = () => {
         gbuAPI.getTemplates(),
       ]);
 
-      setGefaehrdungen(gbuData.project_gefaehrdungen || []);
+      applyGBUData(gbuData);
       setBereiche(bereicheData);
       setTemplates(templatesData);
     } catch (error) {
@@ -34,18 +43,117 @@ const GBUEditor: React.FC = () => {
     }
   };
 
+  const applyGBUData = (gbuData: any) => {
+    setProjectTemplates(gbuData.templates || []);
+    if (gbuData.full) {
+      // Overlaid templates contribute their rows merged with the project's changes
+      const templateGefaehrdungen = (gbuData.templates || [])
+        .filter((template: any) => template.overlay)
+        .reduce((rows: Gefaehrdung[], template: any) => rows.concat(template.gefaehrdungen), []);
+      setGefaehrdungen([...templateGefaehrdungen, ...(gbuData.project_gefaehrdungen || [])]);
+    } else {
+      // A delta replaces changed rows, appends new ones and drops deleted ones
+      const deleted = new Set<number>(gbuData.deleted);
+      const changed = new Map<number, Gefaehrdung>(
+        gbuData.gefaehrdungen.map((gef: Gefaehrdung) => [gef.id, gef])
+      );
+      setGefaehrdungen(current => {
+        const rows = current
+          .filter(gef => !deleted.has(gef.id))
+          .map(gef => changed.get(gef.id) || gef);
+        const known = new Set(rows.map(gef => gef.id));
+        return [...rows, ...Array.from(changed.values()).filter(gef => !known.has(gef.id))];
+      });
+    }
+    setWatermark(gbuData.watermark);
+  };
+
+  // Fetch only what changed since the last sync
+  const syncGBUs = async () => {
+    if (!projectId) return;
+
+    try {
+      applyGBUData(await gbuAPI.getProjectGBUs(parseInt(projectId), watermark));
+    } catch (error) {
+      console.error('Failed to sync data:', error);
+    }
+  };
+
   const handleAddTemplate = async (templateId: number) => {
     if (!projectId) return;
 
     try {
-      await gbuAPI.copyTemplateToProject(parseInt(projectId), templateId);
-      fetchData();
+      await gbuAPI.addTemplateToProject(parseInt(projectId), templateId);
+      syncGBUs();
       setShowTemplateModal(false);
     } catch (error) {
       console.error('Failed to add template:', error);
     }
   };
 
+  // Accept the current version of a template the project pinned an older version of
+  const handleRebase = async (template: ProjectTemplate) => {
+    try {
+      await gbuAPI.rebaseProjectGBU(template.project_gbu_id);
+      syncGBUs();
+    } catch (error) {
+      console.error('Failed to update template:', error);
+    }
+  };
+
+  const openEdit = (gef: Gefaehrdung) => {
+    setEditing(gef);
+    setEditForm({
+      tätigkeit: gef.tätigkeit,
+      gefährdung: gef.gefährdung,
+      schadenschwere: gef.schadenschwere,
+      wahrscheinlichkeit: gef.wahrscheinlichkeit,
+      massnahmen: gef.massnahmen,
+      mängel_behoben: gef.mängel_behoben,
+    });
+  };
+
+  // Template rows are changed for this project only, the shared template stays as it is
+  const handleSave = async () => {
+    if (!editing) return;
+
+    try {
+      if (editing.project_gbu_id) {
+        await gbuAPI.overrideTemplateGefaehrdung(editing.project_gbu_id, editing.id, editForm);
+      } else {
+        await gbuAPI.updateGefaehrdung(editing.id, editForm);
+      }
+      setEditing(null);
+      syncGBUs();
+    } catch (error) {
+      console.error('Failed to save gefaehrdung:', error);
+    }
+  };
+
+  const handleRemove = async (gef: Gefaehrdung) => {
+    try {
+      if (gef.project_gbu_id) {
+        await gbuAPI.removeTemplateGefaehrdung(gef.project_gbu_id, gef.id);
+      } else {
+        await gbuAPI.deleteGefaehrdung(gef.id);
+      }
+      syncGBUs();
+    } catch (error) {
+      console.error('Failed to remove gefaehrdung:', error);
+    }
+  };
+
+  const handleRestore = async (gef: Gefaehrdung) => {
+    if (!gef.project_gbu_id) return;
+
+    try {
+      await gbuAPI.restoreTemplateGefaehrdung(gef.project_gbu_id, gef.id);
+      syncGBUs();
+    } catch (error) {
+      console.error('Failed to restore gefaehrdung:', error);
+    }
+  };
+
   const downloadPDF = async () => {
     if (!projectId) return;
 
@@ -85,6 +193,15 @@ const GBUEditor: React.FC = () => {
         </div>
       </div>
 
+      {projectTemplates.filter(template => template.outdated).map(template => (
+        <Alert key={template.project_gbu_id} variant="warning" className="d-flex justify-content-between align-items-center">
+          <span>Die Vorlage „{template.name}“ wurde geändert, das Projekt verwendet noch die vorherige Fassung.</span>
+          <Button variant="outline-dark" size="sm" onClick={() => handleRebase(template)}>
+            Neue Fassung übernehmen
+          </Button>
+        </Alert>
+      ))}
+
       {/* STOP Principle Legend */}
       <Card className="mb-4">
         <Card.Header>
@@ -129,7 +246,11 @@ const GBUEditor: React.FC = () => {
               return (
                 <tr key={gef.id}>
                   <td>{bereich?.name || '-'}</td>
-                  <td>{gef.tätigkeit}</td>
+                  <td>
+                    {gef.tätigkeit}
+                    {gef.project_gbu_id && <Badge bg="secondary" className="ms-1">Vorlage</Badge>}
+                    {!!gef.overridden?.length && <Badge bg="warning" text="dark" className="ms-1">angepasst</Badge>}
+                  </td>
                   <td>{gef.gefährdung}</td>
                   <td className="text-center">{gef.schadenschwere || '-'}</td>
                   <td className="text-center">{gef.wahrscheinlichkeit || '-'}</td>
@@ -142,7 +263,17 @@ const GBUEditor: React.FC = () => {
                   <td className="text-center">{gef.p_persoenlich === 'WAHR' ? '✓' : ''}</td>
                   <td>{gef.massnahmen}</td>
                   <td>
-                    <Button variant="sm" size="sm">Bearbeiten</Button>
+                    <div className="d-flex gap-1">
+                      <Button variant="sm" size="sm" onClick={() => openEdit(gef)}>Bearbeiten</Button>
+                      {!!gef.overridden?.length && (
+                        <Button variant="outline-secondary" size="sm" onClick={() => handleRestore(gef)}>
+                          Zurücksetzen
+                        </Button>
+                      )}
+                      <Button variant="outline-danger" size="sm" onClick={() => handleRemove(gef)}>
+                        {gef.project_gbu_id ? 'Entfernen' : 'Löschen'}
+                      </Button>
+                    </div>
                   </td>
                 </tr>
               );
@@ -151,6 +282,74 @@ const GBUEditor: React.FC = () => {
         </tbody>
       </Table>
 
+      {/* Edit Modal */}
+      <Modal show={!!editing} onHide={() => setEditing(null)}>
+        <Modal.Header closeButton>
+          <Modal.Title>Gefährdung bearbeiten</Modal.Title>
+        </Modal.Header>
+        <Modal.Body>
+          {editing?.project_gbu_id && (
+            <Alert variant="info">Änderungen gelten nur für dieses Projekt, die Vorlage bleibt unverändert.</Alert>
+          )}
+          <Form>
+            <Form.Group className="mb-2">
+              <Form.Label>Tätigkeit</Form.Label>
+              <Form.Control
+                value={editForm.tätigkeit || ''}
+                onChange={(e) => setEditForm({ ...editForm, tätigkeit: e.target.value })}
+              />
+            </Form.Group>
+            <Form.Group className="mb-2">
+              <Form.Label>Gefährdung</Form.Label>
+              <Form.Control
+                as="textarea"
+                value={editForm.gefährdung || ''}
+                onChange={(e) => setEditForm({ ...editForm, gefährdung: e.target.value })}
+              />
+            </Form.Group>
+            <div className="d-flex gap-2 mb-2">
+              <Form.Group>
+                <Form.Label>Schwere</Form.Label>
+                <Form.Select
+                  value={editForm.schadenschwere || ''}
+                  onChange={(e) => setEditForm({ ...editForm, schadenschwere: Number(e.target.value) || undefined })}
+                >
+                  <option value="">-</option>
+                  {[1, 2, 3].map(value => <option key={value} value={value}>{value}</option>)}
+                </Form.Select>
+              </Form.Group>
+              <Form.Group>
+                <Form.Label>Wahrscheinlichkeit</Form.Label>
+                <Form.Select
+                  value={editForm.wahrscheinlichkeit || ''}
+                  onChange={(e) => setEditForm({ ...editForm, wahrscheinlichkeit: Number(e.target.value) || undefined })}
+                >
+                  <option value="">-</option>
+                  {[1, 2, 3].map(value => <option key={value} value={value}>{value}</option>)}
+                </Form.Select>
+              </Form.Group>
+            </div>
+            <Form.Group className="mb-2">
+              <Form.Label>Maßnahmen</Form.Label>
+              <Form.Control
+                as="textarea"
+                value={editForm.massnahmen || ''}
+                onChange={(e) => setEditForm({ ...editForm, massnahmen: e.target.value })}
+              />
+            </Form.Group>
+            <Form.Check
+              label="Mängel behoben"
+              checked={!!editForm.mängel_behoben}
+              onChange={(e) => setEditForm({ ...editForm, mängel_behoben: e.target.checked })}
+            />
+          </Form>
+        </Modal.Body>
+        <Modal.Footer>
+          <Button variant="secondary" onClick={() => setEditing(null)}>Abbrechen</Button>
+          <Button variant="primary" onClick={handleSave} disabled={!editForm.tätigkeit}>Speichern</Button>
+        </Modal.Footer>
+      </Modal>
+
       {/* Template Selection Modal */}
       <Modal show={showTemplateModal} onHide={() => setShowTemplateModal(false)} size="lg">
         <Modal.Header closeButton>
@@ -1,33 +1,60 @@
-import React, { useEffect, useState } from 'react';
-import { Table, Button, Badge } from 'react-bootstrap';
+import React, { useEffect, useRef, useState } from 'react';
+import axios from 'axios';
+import { Table, Button, Badge, Form, Row, Col } from 'react-bootstrap';
 import { Link } from 'react-router-dom';
 import { projectsAPI } from '../../services/api';
-import type { User, Project } from '../../types';
+import type { User, Project, ProjectFilters } from '../../types';
 
 interface ProjectListProps {
   user: User;
 }
 
+const PAGE_SIZE = 100;
+const NAME_FILTER_DELAY_MS = 300;
+
 const ProjectList: React.FC<ProjectListProps> = ({ user }) => {
   const [projects, setProjects] = useState<Project[]>([]);
+  const [filters, setFilters] = useState<ProjectFilters>({ sort: '-start_date' });
+  const [nameInput, setNameInput] = useState('');
+  const [total, setTotal] = useState<number | undefined>();
+  const [nextCursor, setNextCursor] = useState<string | undefined>();
   const [loading, setLoading] = useState(true);
+  const request = useRef<AbortController>();
 
   useEffect(() => {
     fetchProjects();
-  }, []);
+  }, [filters]);
+
+  useEffect(() => () => request.current?.abort(), []);
+
+  // Only filter by name once typing pauses
+  useEffect(() => {
+    const timer = setTimeout(() => setFilter('name', nameInput), NAME_FILTER_DELAY_MS);
+    return () => clearTimeout(timer);
+  }, [nameInput]);
+
+  const fetchProjects = async (after?: string) => {
+    // A newer request supersedes the running one, so its response can't overwrite newer results
+    request.current?.abort();
+    const controller = new AbortController();
+    request.current = controller;
 
-  const fetchProjects = async () => {
+    setLoading(true);
     try {
-      const data = await projectsAPI.getAll();
-      setProjects(data);
+      const page = await projectsAPI.getPage({ ...filters, limit: PAGE_SIZE }, after, controller.signal);
+      setProjects(prev => (after ? [...prev, ...page.projects] : page.projects));
+      if (!after) setTotal(page.total);
+      setNextCursor(page.nextCursor);
     } catch (error) {
+      if (axios.isCancel(error)) return;
       console.error('Failed to fetch projects:', error);
-    } finally {
-      setLoading(false);
     }
+    if (request.current === controller) setLoading(false);
   };
 
-  if (loading) return <div>Laden...</div>;
+  const setFilter = (key: keyof ProjectFilters, value: string) => {
+    setFilters(prev => (prev[key] === (value || undefined) ? prev : { ...prev, [key]: value || undefined }));
+  };
 
   return (
     <div>
@@ -40,6 +67,66 @@ const ProjectList: React.FC<ProjectListProps> = ({ user }) => {
         )}
       </div>
 
+      <Row className="mb-3 g-2">
+        <Col md={3}>
+          <Form.Control
+            placeholder="Name beginnt mit..."
+            value={nameInput}
+            onChange={(e) => setNameInput(e.target.value)}
+          />
+        </Col>
+        <Col md={2}>
+          <Form.Select value={filters.status || ''} onChange={(e) => setFilter('status', e.target.value)}>
+            <option value="">Alle Status</option>
+            <option value="planung">Planung</option>
+            <option value="aktiv">Aktiv</option>
+            <option value="abgeschlossen">Abgeschlossen</option>
+            <option value="archiviert">Archiviert</option>
+          </Form.Select>
+        </Col>
+        <Col md={2}>
+          <Form.Select value={filters.season || ''} onChange={(e) => setFilter('season', e.target.value)}>
+            <option value="">Alle Saisons</option>
+            <option value="fruehling">Frühling</option>
+            <option value="sommer">Sommer</option>
+            <option value="herbst">Herbst</option>
+            <option value="winter">Winter</option>
+          </Form.Select>
+        </Col>
+        <Col md={1}>
+          <Form.Select
+            value={filters.indoor_outdoor || ''}
+            onChange={(e) => setFilter('indoor_outdoor', e.target.value)}
+          >
+            <option value="">Alle</option>
+            <option value="indoor">Indoor</option>
+            <option value="outdoor">Outdoor</option>
+            <option value="both">Beides</option>
+          </Form.Select>
+        </Col>
+        <Col md={2}>
+          <Form.Control type="date" value={filters.from || ''} onChange={(e) => setFilter('from', e.target.value)} />
+        </Col>
+        <Col md={2}>
+          <Form.Control type="date" value={filters.to || ''} onChange={(e) => setFilter('to', e.target.value)} />
+        </Col>
+      </Row>
+
+      <div className="d-flex justify-content-between align-items-center mb-2">
+        <small className="text-muted">{total !== undefined ? `${total} Projekte` : ''}</small>
+        <Form.Select
+          size="sm"
+          style={{ width: 'auto' }}
+          value={filters.sort}
+          onChange={(e) => setFilter('sort', e.target.value)}
+        >
+          <option value="-start_date">Startdatum absteigend</option>
+          <option value="start_date">Startdatum aufsteigend</option>
+          <option value="name">Name</option>
+          <option value="-created_at">Zuletzt angelegt</option>
+        </Form.Select>
+      </div>
+
       <Table striped bordered hover>
         <thead>
           <tr>
@@ -70,6 +157,13 @@ const ProjectList: React.FC<ProjectListProps> = ({ user }) => {
           ))}
         </tbody>
       </Table>
+
+      {loading && <div>Laden...</div>}
+      {!loading && nextCursor && (
+        <Button variant="outline-secondary" onClick={() => fetchProjects(nextCursor)}>
+          Weitere laden
+        </Button>
+      )}
     </div>
   );
 };
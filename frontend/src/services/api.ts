@@ -1,5 +1,8 @@
 import axios from 'axios';
-import type { User, Project, Bereich, GBUTemplate, Gefaehrdung, Participant, Unterweisung, AuthResponse } from '../types';
+import type {
+  User, Project, ProjectFilters, ProjectPage, ProjectStatusCounts, Bereich, GBUTemplate, Gefaehrdung, ProjectGBU,
+  Participant, Unterweisung, AuthResponse
+} from '../types';
 
 const API_URL = process.env.REACT_APP_API_URL || 'http://localhost:5000/api';
 
@@ -106,8 +109,24 @@ export const usersAPI = {
 
 // Projects API
 export const projectsAPI = {
-  getAll: async (): Promise<Project[]> => {
-    const response = await api.get('/projects/');
+  // One page of the filtered list, pass the previous page's nextCursor for the next one
+  getPage: async (filters: ProjectFilters = {}, after?: string, signal?: AbortSignal): Promise<ProjectPage> => {
+    const params: Record<string, string | number> = {};
+    Object.entries(filters).forEach(([key, value]) => {
+      if (value !== undefined && value !== '') params[key] = value;
+    });
+    if (after) params.after = after;
+    const response = await api.get('/projects/', { params, signal });
+    const total = response.headers['x-total-count'];
+    return {
+      projects: response.data,
+      total: total !== undefined ? Number(total) : undefined,
+      nextCursor: response.headers['x-next-cursor'],
+    };
+  },
+
+  getStatusCounts: async (filters: ProjectFilters = {}): Promise<ProjectStatusCounts> => {
+    const response = await api.get('/projects/status-counts', { params: filters });
     return response.data;
   },
 
@@ -204,15 +223,51 @@ export const gbuAPI = {
     await api.delete(`/gbu/gefaehrdungen/${id}`);
   },
 
-  getProjectGBUs: async (projectId: number): Promise<any> => {
-    const response = await api.get(`/gbu/project/${projectId}/gbus`);
+  getProjectGBUs: async (projectId: number, since?: number): Promise<any> => {
+    const response = await api.get(`/gbu/project/${projectId}/gbus`, {
+      params: since !== undefined ? { since } : undefined,
+    });
     return response.data;
   },
 
+  reorderGefaehrdungen: async (
+    projectId: number,
+    bereichId: number | null,
+    ids: number[]
+  ): Promise<Record<string, number>> => {
+    const response = await api.post(`/gbu/project/${projectId}/reorder`, { bereich_id: bereichId, ids });
+    return response.data.sort_orders;
+  },
+
   addTemplateToProject: async (projectId: number, templateId: number): Promise<void> => {
     await api.post(`/gbu/project/${projectId}/add-template`, { template_id: templateId });
   },
 
+  // Change a template row for one project only, the template stays as it is
+  overrideTemplateGefaehrdung: async (
+    projectGbuId: number,
+    gefaehrdungId: number,
+    gefaehrdungData: Partial<Gefaehrdung>
+  ): Promise<Gefaehrdung> => {
+    const response = await api.put(`/gbu/project-gbus/${projectGbuId}/gefaehrdungen/${gefaehrdungId}`, gefaehrdungData);
+    return response.data;
+  },
+
+  removeTemplateGefaehrdung: async (projectGbuId: number, gefaehrdungId: number): Promise<void> => {
+    await api.delete(`/gbu/project-gbus/${projectGbuId}/gefaehrdungen/${gefaehrdungId}`);
+  },
+
+  restoreTemplateGefaehrdung: async (projectGbuId: number, gefaehrdungId: number): Promise<Gefaehrdung> => {
+    const response = await api.post(`/gbu/project-gbus/${projectGbuId}/gefaehrdungen/${gefaehrdungId}/restore`);
+    return response.data;
+  },
+
+  // Accept the template's current version in the project
+  rebaseProjectGBU: async (projectGbuId: number): Promise<ProjectGBU> => {
+    const response = await api.post(`/gbu/project-gbus/${projectGbuId}/rebase`);
+    return response.data;
+  },
+
   copyTemplateToProject: async (projectId: number, templateId: number): Promise<Gefaehrdung[]> => {
     const response = await api.post(`/gbu/project/${projectId}/copy-template/${templateId}`);
     return response.data;
@@ -31,6 +31,28 @@ export interface Project {
   updated_at: string;
 }
 
+export interface ProjectFilters {
+  status?: string;
+  season?: string;
+  indoor_outdoor?: string;
+  from?: string;
+  to?: string;
+  name?: string;
+  sort?: string;
+  limit?: number;
+}
+
+export interface ProjectPage {
+  projects: Project[];
+  total?: number;
+  nextCursor?: string;
+}
+
+export interface ProjectStatusCounts {
+  total: number;
+  status: Record<ProjectStatus, number>;
+}
+
 export interface ProjectAssignment {
   id: number;
   project_id: number;
@@ -88,6 +110,10 @@ export interface Gefaehrdung {
   sort_order: number;
   created_at: string;
   updated_at: string;
+  // Set on template rows as a project overlays them
+  project_gbu_id?: number;
+  overridden?: string[];
+  removed?: boolean;
 }
 
 export interface GBUTemplate {
@@ -102,6 +128,7 @@ export interface GBUTemplate {
   updated_at: string;
   gefaehrdungen?: Gefaehrdung[];
   gefaehrdungen_count?: number;
+  version?: number;
 }
 
 export interface ProjectGBU {
@@ -110,6 +137,15 @@ export interface ProjectGBU {
   gbu_template_id: number;
   added_by: number;
   added_at: string;
+  template_version?: number;
+}
+
+// A template as attached to a project, overlay templates show the version the project pinned
+export interface ProjectTemplate extends GBUTemplate {
+  project_gbu_id: number;
+  template_version?: number;
+  overlay: boolean;
+  outdated: boolean;
 }
 
 export type SignatureType = 'digital' | 'analog' | 'pending';